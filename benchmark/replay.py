@@ -0,0 +1,207 @@
+"""
+webhook 分发的事件回放基准测试
+用法 (需在仓库根目录运行, 并准备一个一次性的MySQL实例):
+    python -m benchmark.replay --mysql 127.0.0.1:3307:root:pass [--events recorded.jsonl] [--count 2000]
+                               [--save-baseline] [--check] [--threshold 0.2]
+- 启动本地 go-cqhttp HTTP API 桩服务, 所有 send_msg 等调用都发到桩服务
+- 通过 Flask test_client 把事件依次 POST 给 main.post_data
+- 统计 events/sec, 以及按 NoticeType、按插件的 p50/p99 延迟
+- --save-baseline 把结果写入 benchmark/baseline.json, --check 与基线比较, 退化超过阈值时返回码为1
+  基线与机器相关, 请在同一台机器上生成和比较
+注意: 插件会真实写入数据库, 请勿指向生产库
+"""
+import os, sys, json, time, random, argparse, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+from typing import Dict, List, Any
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'baseline.json')
+BENCH_GROUP_ID = 100000001
+BENCH_SELF_ID = 100000000
+
+class CqHttpStub(BaseHTTPRequestHandler):
+    """go-cqhttp HTTP API 桩, 对所有接口返回成功"""
+    calls: Dict[str, int] = {}
+    lock = threading.Lock()
+    def _reply(self):
+        path = urlparse(self.path).path
+        with CqHttpStub.lock:
+            CqHttpStub.calls[path] = CqHttpStub.calls.get(path, 0) + 1
+        if path == '/file':
+            body = b'0' * 1024
+        else:
+            data: Any = {}
+            if path == '/send_msg':
+                data = {'message_id': random.randint(1, 1<<30)}
+            elif path == '/get_group_list':
+                data = [{'group_id': BENCH_GROUP_ID, 'group_name': 'bench', 'member_count': 10, 'max_member_count': 200}]
+            elif path in ['/get_group_member_list', '/get_group_msg_history', '/get_essence_msg_list']:
+                data = [] if path != '/get_group_msg_history' else {'messages': []}
+            elif path == '/get_login_info':
+                data = {'user_id': BENCH_SELF_ID, 'nickname': 'bench'}
+            elif path == '/get_group_file_url':
+                data = {'url': 'http://127.0.0.1:%d/file'%self.server.server_port}
+            body = json.dumps({'status': 'ok', 'retcode': 0, 'data': data}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    do_GET = _reply
+    do_POST = _reply
+    def log_message(self, format, *args):
+        pass
+
+def startStub()->ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CqHttpStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+GROUP_TEXTS = ['哈哈哈', '今天吃什么', '有人吗', '[CQ:face,id=178]', '-test', '-mycoins', '早安', '晚安', '签到', '问答帮助']
+PRIVATE_TEXTS = ['-test', '-mycoins', '早安', 'hello']
+EVENT_MIX = [('group', 70), ('private', 10), ('poke', 8), ('recall', 8), ('upload', 4)]
+
+def syntheticEvents(count: int, seed: int=0)->List[dict]:
+    """按 EVENT_MIX 的比例生成 go-cqhttp 事件"""
+    rng = random.Random(seed)
+    kinds = [k for k, w in EVENT_MIX for _ in range(w)]
+    events = []
+    now = int(time.time())
+    for i in range(count):
+        kind = rng.choice(kinds)
+        userId = rng.randint(200000000, 200000099)
+        base = {'time': now + i, 'self_id': BENCH_SELF_ID}
+        if kind == 'group':
+            events.append(dict(base, post_type='message', message_type='group', sub_type='normal',
+                group_id=BENCH_GROUP_ID, user_id=userId, message_id=i+1, message_seq=i+1,
+                message=rng.choice(GROUP_TEXTS), raw_message='',
+                sender={'user_id': userId, 'nickname': 'u%d'%userId, 'card': ''}))
+        elif kind == 'private':
+            events.append(dict(base, post_type='message', message_type='private', sub_type='friend',
+                user_id=userId, message_id=i+1, message=rng.choice(PRIVATE_TEXTS),
+                sender={'user_id': userId, 'nickname': 'u%d'%userId}))
+        elif kind == 'poke':
+            events.append(dict(base, post_type='notice', notice_type='notify', sub_type='poke',
+                group_id=BENCH_GROUP_ID, user_id=userId, sender_id=userId, target_id=BENCH_SELF_ID))
+        elif kind == 'recall':
+            events.append(dict(base, post_type='notice', notice_type='group_recall',
+                group_id=BENCH_GROUP_ID, user_id=userId, operator_id=userId, message_id=rng.randint(1, i+1)))
+        else:
+            events.append(dict(base, post_type='notice', notice_type='group_upload', group_id=BENCH_GROUP_ID,
+                user_id=userId, file={'id': '/bench-%d'%i, 'name': 'f%d.txt'%i, 'size': 1024, 'busid': 102,
+                                      'url': '{stub}/file'}))
+    return events
+
+def loadEvents(path: str)->List[dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def percentile(values: List[float], q: float)->float:
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values)-1, int(q * len(values)))]
+
+def summarize(samples: Dict[str, List[float]])->Dict[str, dict]:
+    return {name: {'count': len(v), 'p50_ms': percentile(v, 0.5)*1000, 'p99_ms': percentile(v, 0.99)*1000}
+            for name, v in sorted(samples.items())}
+
+def run(args)->dict:
+    stub = startStub()
+    # 必须在导入 main 之前修改配置
+    import utils.basicConfigs as basicConfigs
+    basicConfigs.HTTP_URL = 'http://127.0.0.1:%d'%stub.server_port
+    basicConfigs.APPLY_GROUP_ID.append(BENCH_GROUP_ID)
+    basicConfigs.SEND_RATE_GLOBAL = (1e6, 1e6)
+    basicConfigs.SEND_RATE_PER_TARGET = (1e6, 1e6)
+    if args.mysql:
+        host, port, user, passwd = args.mysql.split(':', 3)
+        basicConfigs.sqlConfig.update({'host': host, 'port': int(port), 'user': user, 'passwd': passwd})
+    import main
+    from utils.pluginMetrics import pluginMetrics, Histogram
+    main.initialize()
+    events = loadEvents(args.events) if args.events else syntheticEvents(args.count, args.seed)
+    for event in events:
+        if isinstance(event.get('file'), dict) and isinstance(event['file'].get('url'), str):
+            event['file']['url'] = event['file']['url'].replace('{stub}', basicConfigs.HTTP_URL)
+    client = main.app.test_client()
+    for event in events[:args.warmup]:
+        client.post('/', json=event)
+    with pluginMetrics.lock:
+        pluginBefore = {name: list(stat.execute.counts) for name, stat in pluginMetrics.stats.items()}
+    perType: Dict[str, List[float]] = {}
+    startTime = time.perf_counter()
+    for event in events:
+        noticeType = main.eventClassify(event).name
+        t0 = time.perf_counter()
+        client.post('/', json=event)
+        perType.setdefault(noticeType, []).append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - startTime
+    perPlugin = {}
+    with pluginMetrics.lock:
+        for name, stat in pluginMetrics.stats.items():
+            # 插件耗时只有直方图: 扣除预热部分后按桶上界估计分位数
+            delta = Histogram()
+            before = pluginBefore.get(name, [0] * len(delta.counts))
+            delta.counts = [c - b for c, b in zip(stat.execute.counts, before)]
+            delta.count = sum(delta.counts)
+            if delta.count > 0:
+                perPlugin[name] = {'count': delta.count, 'p50_ms': delta.quantile(0.5)*1000,
+                                   'p99_ms': delta.quantile(0.99)*1000}
+    stub.shutdown()
+    return {
+        'events': len(events),
+        'events_per_sec': len(events) / elapsed if elapsed > 0 else 0.0,
+        'notice_types': summarize(perType),
+        'plugins': perPlugin,
+        'cqhttp_calls': dict(CqHttpStub.calls),
+    }
+
+def compare(result: dict, baseline: dict, threshold: float)->List[str]:
+    """返回相对基线退化超过阈值的指标"""
+    regressions = []
+    if result['events_per_sec'] < baseline['events_per_sec'] * (1 - threshold):
+        regressions.append('events_per_sec %.1f -> %.1f'%(baseline['events_per_sec'], result['events_per_sec']))
+    for section in ['notice_types', 'plugins']:
+        for name, old in baseline.get(section, {}).items():
+            new = result[section].get(name)
+            if new == None:
+                continue
+            for key in ['p50_ms', 'p99_ms']:
+                if new[key] > old[key] * (1 + threshold) and new[key] - old[key] > 0.5:
+                    regressions.append('%s.%s.%s %.2fms -> %.2fms'%(section, name, key, old[key], new[key]))
+    return regressions
+
+def formatResult(result: dict)->str:
+    lines = ['events: %d, %.1f events/sec'%(result['events'], result['events_per_sec']), '',
+             '%-36s %8s %10s %10s'%('notice type', 'count', 'p50(ms)', 'p99(ms)')]
+    lines += ['%-36s %8d %10.2f %10.2f'%(n, v['count'], v['p50_ms'], v['p99_ms']) for n, v in result['notice_types'].items()]
+    lines += ['', '%-36s %8s %10s %10s'%('plugin', 'count', 'p50(ms)', 'p99(ms)')]
+    lines += ['%-36s %8d %10.2f %10.2f'%(n, v['count'], v['p50_ms'], v['p99_ms']) for n, v in result['plugins'].items()]
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='replay go-cqhttp events against main.post_data')
+    parser.add_argument('--mysql', help='一次性MySQL实例, host:port:user:passwd')
+    parser.add_argument('--events', help='录制的事件文件, 每行一个json')
+    parser.add_argument('--count', type=int, default=2000, help='合成事件数量')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help='与基线比较, 退化时返回码为1')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+    result = run(args)
+    print(formatResult(result))
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+    elif args.check:
+        if not os.path.isfile(BASELINE_PATH):
+            print('baseline not found, run with --save-baseline first')
+            sys.exit(2)
+        with open(BASELINE_PATH, 'r') as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        for r in regressions:
+            print('[regression]', r)
+        sys.exit(1 if len(regressions) > 0 else 0)
@@ -1,17 +1,27 @@
-import os
+import os, sys
 import traceback
-from flask import Flask, request
+from utils.startupProfiler import startupProfiler
+if '--profile-startup' in sys.argv: # 启动耗时分析, 见 utils/startupProfiler.py
+    startupProfiler.enable()
+if __name__ == '__main__' and '--workers' in sys.argv: # 多进程模式, 见 utils/workerPool.py
+    from utils.workerPool import runSupervisor
+    runSupervisor(int(sys.argv[sys.argv.index('--workers') + 1]))
+from flask import Flask, request, Response
 from enum import IntEnum
 
-from utils.basicEvent import send
+startupProfiler.beginPhase('import plugins')
+from utils.basicEvent import send, cqTransport
 from utils.basicConfigs import *
 from utils.standardPlugin import StandardPlugin, PluginGroupManager
+from utils.pluginMetrics import pluginMetrics
+from utils.messageParser import parseMessage
+from utils.runtimeConfig import runtimeConfig
+from utils.asyncPlugin import AsyncDispatcher
 
 from plugins.faq_v2 import MaintainFAQ, AskFAQ, HelpFAQ, createFaqDb, createFaqTable
 from plugins.greetings import *
 from plugins.checkCoins import *
 from plugins.superEmoji import *
-from plugins.news import *
 from plugins.signIn import *
 from plugins.stocks import *
 from plugins.jile import *
@@ -22,21 +32,24 @@ from plugins.roulette import *
 # from plugins.lottery import *
 from plugins.show2cyPic import *
 from plugins.help import *
-from plugins.chatWithNLP import *
 from plugins.chatWithAnswerbook import *
-from plugins.getDekt import DektGroup, GetDektNewActivity
-from plugins.getJwc import JwcGroup, GetJwc
-from plugins.canvasSync import *
 from plugins.getPermission import GetPermission, AddPermission, DelPermission, ShowPermission
 from plugins.goBang import GoBangPlugin
 from plugins.messageRecorder import GroupMessageRecorder
 from plugins.fileRecorder import GroupFileRecorder
+from plugins.searchHistory import SearchHistory
 from plugins.dropOut import *
-from plugins.sjmcLive import SjmcLiveStatus, FduMcLiveStatus
 from plugins.sjtuHesuan import SjtuHesuan
+# 依赖较重的插件懒加载, 首次触发或后台预热时才导入
+from plugins.lazyRegistry import ChatWithNLP, ShowNews, GetCanvas, CanvasiCalBind, CanvasiCalUnbind, \
+    GetDektNewActivity, GetJwc, DektGroup, JwcGroup, LiveRoomPlugins, CanvasReminder
+from utils.lazyPlugin import warmUpLazyPlugins, loadLazyPlugins
+from utils.broadcast import broadcaster
+startupProfiler.endPhase()
 ROOT_PATH = os.path.dirname(os.path.realpath(__file__))
 RESOURCES_PATH = os.path.join(ROOT_PATH, "resources")
 
+startupProfiler.beginPhase('construct plugins')
 # 特殊插件需要复用的放在这里
 helper = ShowHelp() # 帮助插件
 groupMessageRecorder = GroupMessageRecorder() # 群聊消息记录插件
@@ -56,7 +69,7 @@ GroupPluginList:List[StandardPlugin]=[ # 指定群启用插件
     PluginGroupManager([QueryStocksHelper(), QueryStocks(), BuyStocksHelper(), BuyStocks(), QueryStocksPriceHelper(), QueryStocksPrice()],'stocks'), # 股票
     PluginGroupManager([Chai_Jile(), Yuan_Jile()],'jile'), # 柴/元神寄了
     PluginGroupManager([SjtuCanteenInfo(),SjtuLibInfo(), SjtuHesuan()],'sjtuinfo'),
-    PluginGroupManager([ShowSjmcStatus(),SjmcLiveStatus(),FduMcLiveStatus()], 'sjmc'), #MC社服务
+    PluginGroupManager([ShowSjmcStatus(), *LiveRoomPlugins()], 'sjmc'), #MC社服务, 直播间见 BILIBILI_LIVE_ROOMS
     DektGroup(),JwcGroup(), # 校园服务,dekt服务,jwc服务
     PluginGroupManager([GenshinCookieBind(), GenshinDailyNote()],'genshin'), # 原神绑定与实时便笺
     PluginGroupManager([RoulettePlugin()],'roulette'), # 轮盘赌
@@ -64,8 +77,9 @@ GroupPluginList:List[StandardPlugin]=[ # 指定群启用插件
     PluginGroupManager([GoBangPlugin()],'gobang'),
     PluginGroupManager([Show2cyPIC()], 'anime'), #ShowSePIC(), # 来点图图，来点涩涩(关闭)
     PluginGroupManager([ChatWithAnswerbook(), ChatWithNLP()], 'chat'), # 答案之书/NLP
-    PluginGroupManager([GetCanvas(), CanvasiCalBind(), CanvasiCalUnbind()], 'canvas'), # 日历馈送
+    PluginGroupManager([GetCanvas(), CanvasiCalBind(), CanvasiCalUnbind(), CanvasReminder()], 'canvas'), # 日历馈送, ddl提醒
     PluginGroupManager([DropOut()], 'dropout'), # 一键退学
+    PluginGroupManager([SearchHistory()], 'search'), # 聊天记录搜索
 ]
 PrivatePluginList:List[StandardPlugin]=[ # 私聊启用插件
     helper, 
@@ -79,12 +93,14 @@ PrivatePluginList:List[StandardPlugin]=[ # 私聊启用插件
     GenshinCookieBind(), GenshinDailyNote(),
     # LotteryPlugin(),
     Show2cyPIC(), ShowSePIC(),
-    GetCanvas(), CanvasiCalBind(), CanvasiCalUnbind()
+    GetCanvas(), CanvasiCalBind(), CanvasiCalUnbind(), CanvasReminder()
 ]
 
 helper.updatePluginList(GroupPluginList, PrivatePluginList)
+startupProfiler.endPhase()
 
 app = Flask(__name__)
+runtimeConfig.start() # 监视 data/runtimeConfig.json, 修改群白名单等配置无需重启
 class NoticeType(IntEnum):
     NoProcessRequired = 0
     GroupMessageNoProcessRequired = 1
@@ -100,15 +116,16 @@ class NoticeType(IntEnum):
 
 def eventClassify(json_data: dict)->NoticeType: 
     """事件分类"""
+    config = runtimeConfig.current() # 取一次快照, 热更新时同一事件内看到的配置一致
     if json_data['post_type'] == 'message' and json_data['message_type'] == 'group':
-        if json_data['group_id'] in APPLY_GROUP_ID:
+        if json_data['group_id'] in config.applyGroupIds:
             return NoticeType.GroupMessage
         else:
             return NoticeType.GroupMessageNoProcessRequired
     if json_data['post_type'] == 'message' and json_data['message_type'] == 'private':
         return NoticeType.PrivateMessage
     if json_data['post_type'] == 'notice' and json_data['notice_type'] == 'notify' and json_data['sub_type'] == "poke":
-        if 'group_id' in json_data.keys() and json_data['group_id'] in APPLY_GROUP_ID:
+        if 'group_id' in json_data.keys() and json_data['group_id'] in config.applyGroupIds:
             return NoticeType.GroupPoke
     if json_data['post_type'] == 'notice' and json_data['notice_type'] == 'group_recall':
         return NoticeType.GroupRecall
@@ -121,17 +138,24 @@ def eventClassify(json_data: dict)->NoticeType:
 @app.route('/', methods=["POST"])
 def post_data():
     # 获取事件上报
-    data = request.get_json()
+    if ASYNC_DISPATCH:
+        asyncDispatcher.submit(request.get_json())
+        return "OK"
+    return dispatchEvent(request.get_json())
+
+def dispatchEvent(data: dict)->str:
+    """处理一条上报事件, HTTP 上报与 WebSocket 传输共用"""
     # 筛选并处理指定事件
     flag=eventClassify(data)
     # 群消息处理
     if flag==NoticeType.GroupMessage: 
-        msg=data['message'].strip()
+        msg=parseMessage(data['message'].strip())
         for event in GroupPluginList:
             event: StandardPlugin
             try:
-                if event.judgeTrigger(msg, data):
-                    ret = event.executeEvent(msg, data)
+                match = pluginMetrics.timedMatch(event, msg, data)
+                if match != None:
+                    ret = pluginMetrics.timedExecute(event, match, msg, data)
                     if ret != None:
                         return ret
             except TypeError as e:
@@ -144,11 +168,12 @@ def post_data():
 
     # 私聊消息处理
     elif flag==NoticeType.PrivateMessage:
-        msg=data['message'].strip()
+        msg=parseMessage(data['message'].strip())
         for event in PrivatePluginList:
             event: StandardPlugin
-            if event.judgeTrigger(msg, data):
-                ret = event.executeEvent(msg, data)
+            match = pluginMetrics.timedMatch(event, msg, data)
+            if match != None:
+                ret = pluginMetrics.timedExecute(event, match, msg, data)
                 if ret != None:
                     return ret
     elif flag == NoticeType.GroupUpload:
@@ -163,14 +188,34 @@ def post_data():
     elif flag==NoticeType.AddPrivate:
         set_friend_add_request(data['flag'], True)
     return "OK"
+
+def eventPlugins(data: dict)->Union[List[StandardPlugin], None]:
+    """异步分发时需要遍历的插件列表, 其他事件交给 dispatchEvent"""
+    flag = eventClassify(data)
+    if flag == NoticeType.GroupMessage:
+        return GroupPluginList
+    if flag == NoticeType.PrivateMessage:
+        return PrivatePluginList
+    return None
+
+asyncDispatcher = AsyncDispatcher(eventPlugins, dispatchEvent)
+
+@app.route('/metrics', methods=["GET"])
+def get_metrics():
+    # Prometheus 抓取插件耗时与异常统计
+    return Response(pluginMetrics.renderPrometheus(), mimetype='text/plain; version=0.0.4')
+
 def initialize():
     if not os.path.isdir('./data/tmp'):
         os.makedirs('./data/tmp')
-    createGlobalConfig()
-    createFaqDb()
-    for group in get_group_list():
-        groupId = group['group_id']
-        createFaqTable(str(groupId))
+    with startupProfiler.phase('create tables'):
+        createGlobalConfig()
+        createFaqDb()
+        for group in get_group_list():
+            groupId = group['group_id']
+            createFaqTable(str(groupId))
+    # 续发重启前未完成的轮询推送
+    broadcaster.resume()
     # do some check
     for p in GroupPluginList:
         infoDict = p.getPluginInfo()
@@ -187,5 +232,16 @@ def initialize():
             print("plugin [{}] can not be used in private talk!".format(infoDict['name']))
             exit(1)
 if __name__ == '__main__':
-    initialize()
+    with startupProfiler.phase('initialize'):
+        initialize()
+    if startupProfiler.enabled:
+        # 导入耗时只在主线程中统计, 分析模式下在主线程中同步加载全部懒加载插件
+        with startupProfiler.phase('load lazy plugins'):
+            loadLazyPlugins(True)
+        startupProfiler.finish(sys.argv)
+    warmUpLazyPlugins(WARM_UP_ALL_PLUGINS)
+    if CQ_TRANSPORT == 'ws':
+        # 事件从 WebSocket 接收, Flask 仅提供 /metrics
+        cqTransport.setEventHandler(asyncDispatcher.submit if ASYNC_DISPATCH else dispatchEvent)
+        cqTransport.start()
     app.run(host="127.0.0.1", port=5986)
\ No newline at end of file
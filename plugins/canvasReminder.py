@@ -0,0 +1,229 @@
+from utils.standardPlugin import StandardPlugin, Any, Union
+from utils.basicEvent import *
+from utils.basicConfigs import *
+from utils.icsFeedCache import icsFeedCache, IcsEvent
+from utils.workerPool import onInvalidate, invalidate
+from threading import Thread, Event, Lock
+from typing import Dict, List, Tuple, Callable
+import heapq, itertools
+import mysql.connector
+'''
+BOT_DATA.canvasReminderLog 已发送的ddl提醒, 用于去重
++------------+-------------+------+-----+---------+-------+
+| Field      | Type        | Null | Key | Default | Extra |
++------------+-------------+------+-----+---------+-------+
+| qq         | bigint      | NO   | PRI | NULL    |       |
+| event_uid  | varchar(255)| NO   | PRI | NULL    |       |
+| offset     | int         | NO   | PRI | NULL    |       |
+| sent_time  | timestamp   | NO   | MUL | NULL    |       |
++------------+-------------+------+-----+---------+-------+
+BOT_DATA.canvasRemindOff 关闭了ddl提醒的用户
+'''
+CANVAS_REMIND_GRACE = 600 # 提醒时间已过去超过该秒数则不再补发
+CANVAS_REMIND_RETRY_DELAY = 60 # 发送失败后重试的间隔(秒)
+CANVAS_REMIND_WORKERS = 8 # 刷新馈送的并发数
+CANVAS_REMIND_LOG_DAYS = 60
+
+def createCanvasReminderSql():
+    try:
+        mydb = mysql.connector.connect(**sqlConfig)
+        mydb.autocommit = True
+        mycursor = mydb.cursor()
+        mycursor.execute("""
+            create table if not exists `BOT_DATA`.`canvasReminderLog` (
+                `qq` bigint not null,
+                `event_uid` varchar(255) not null,
+                `offset` int not null,
+                `sent_time` timestamp not null,
+                primary key (`qq`, `event_uid`, `offset`),
+                key (`sent_time`)
+            );""")
+        mycursor.execute("""
+            create table if not exists `BOT_DATA`.`canvasRemindOff` (
+                `qq` bigint not null,
+                primary key (`qq`)
+            );""")
+    except mysql.connector.Error as e:
+        warning("mysql error in createCanvasReminderSql: {}".format(e))
+
+def loadReminderTargets()->List[Tuple[int, str]]:
+    """@return: [(qq, icsUrl)], 不含关闭提醒的用户"""
+    try:
+        mydb = mysql.connector.connect(**sqlConfig)
+        mycursor = mydb.cursor()
+        mycursor.execute("""
+            select c.`qq`, c.`icsUrl` from `BOT_DATA`.`canvasIcs` c
+            left join `BOT_DATA`.`canvasRemindOff` o on c.`qq` = o.`qq`
+            where o.`qq` is null""")
+        return [(qq, url) for qq, url in mycursor]
+    except mysql.connector.Error as e:
+        warning("mysql error in loadReminderTargets: {}".format(e))
+        return []
+
+def setRemindEnabled(qq: int, enabled: bool)->bool:
+    try:
+        mydb = mysql.connector.connect(**sqlConfig)
+        mydb.autocommit = True
+        mycursor = mydb.cursor()
+        if enabled:
+            mycursor.execute("delete from `BOT_DATA`.`canvasRemindOff` where `qq` = %s", (qq, ))
+        else:
+            mycursor.execute("replace into `BOT_DATA`.`canvasRemindOff` (`qq`) values (%s)", (qq, ))
+        return True
+    except mysql.connector.Error as e:
+        warning("mysql error in setRemindEnabled: {}".format(e))
+        return False
+
+def markReminderSent(qq: int, uid: str, offset: int)->bool:
+    """记录提醒已发送, 若之前已记录过则返回False"""
+    try:
+        mydb = mysql.connector.connect(**sqlConfig)
+        mydb.autocommit = True
+        mycursor = mydb.cursor()
+        mycursor.execute("""
+            insert ignore into `BOT_DATA`.`canvasReminderLog` (`qq`, `event_uid`, `offset`, `sent_time`)
+            values (%s, %s, %s, now())""", (qq, uid[:255], offset))
+        return mycursor.rowcount == 1
+    except mysql.connector.Error as e:
+        warning("mysql error in markReminderSent: {}".format(e))
+        return False
+
+def unmarkReminderSent(qq: int, uid: str, offset: int)->None:
+    """发送失败时撤销记录, 使提醒可以重发"""
+    try:
+        mydb = mysql.connector.connect(**sqlConfig)
+        mydb.autocommit = True
+        mycursor = mydb.cursor()
+        mycursor.execute("""
+            delete from `BOT_DATA`.`canvasReminderLog`
+            where `qq` = %s and `event_uid` = %s and `offset` = %s""", (qq, uid[:255], offset))
+    except mysql.connector.Error as e:
+        warning("mysql error in unmarkReminderSent: {}".format(e))
+
+def purgeReminderLog()->None:
+    try:
+        mydb = mysql.connector.connect(**sqlConfig)
+        mydb.autocommit = True
+        mycursor = mydb.cursor()
+        mycursor.execute("""
+            delete from `BOT_DATA`.`canvasReminderLog`
+            where `sent_time` < date_sub(now(), interval %d day)"""%CANVAS_REMIND_LOG_DAYS)
+    except mysql.connector.Error as e:
+        warning("mysql error in purgeReminderLog: {}".format(e))
+
+def formatRemaining(seconds: float)->str:
+    if seconds >= 24*3600:
+        return '%d天'%(seconds // (24*3600))
+    if seconds >= 3600:
+        return '%d小时'%(seconds // 3600)
+    return '%d分钟'%max(1, seconds // 60)
+
+class CanvasReminderService():
+    """定期批量刷新所有已绑定的馈送, 把即将到来的ddl按提醒时间放入小根堆, 到点私聊提醒"""
+    def __init__(self, offsets: List[int]=CANVAS_REMIND_OFFSETS, refreshInterval: float=CANVAS_REMIND_REFRESH) -> None:
+        self.offsets = sorted(offsets, reverse=True)
+        self.refreshInterval = refreshInterval
+        # (提醒时间, 序号, qq, event uid, offset, IcsEvent), 序号避免比较IcsEvent; 重发的提醒时间为重试时间
+        self.heap: List[Tuple[float, int, int, str, int, IcsEvent]] = []
+        self.counter = itertools.count()
+        self.lock = Lock()
+        self.wakeUp = Event()
+        self.thread: Union[Thread, None] = None
+        self.nextRefresh = 0.0
+
+    def start(self)->None:
+        with self.lock:
+            if self.thread == None or not self.thread.is_alive():
+                createCanvasReminderSql()
+                self.thread = Thread(target=self._worker, daemon=True)
+                self.thread.start()
+
+    def requestRefresh(self)->None:
+        """绑定或开关提醒后尽快重建提醒队列"""
+        self.nextRefresh = 0.0
+        self.wakeUp.set()
+
+    def rebuild(self)->None:
+        targets = loadReminderTargets()
+        icsFeedCache.refreshMany(list({url for _, url in targets}), CANVAS_REMIND_WORKERS)
+        now = time.time()
+        heap = []
+        for qq, url in targets:
+            try:
+                events = icsFeedCache.getEvents(url, after=now, countHit=False)
+            except BaseException:
+                continue
+            for event in events:
+                for offset in self.offsets:
+                    fireTime = event.deadline - offset
+                    if fireTime < now - CANVAS_REMIND_GRACE:
+                        continue
+                    heap.append((fireTime, next(self.counter), qq, event.uid or event.summary, offset, event))
+        heapq.heapify(heap)
+        with self.lock:
+            self.heap = heap
+        purgeReminderLog()
+
+    def _worker(self)->None:
+        while True:
+            now = time.time()
+            if now >= self.nextRefresh:
+                self.nextRefresh = now + self.refreshInterval
+                try:
+                    self.rebuild()
+                except BaseException as e:
+                    warning("exception in canvas reminder rebuild: {}".format(e))
+            due = []
+            with self.lock:
+                while len(self.heap) > 0 and self.heap[0][0] <= time.time():
+                    due.append(heapq.heappop(self.heap))
+                nextFire = self.heap[0][0] if len(self.heap) > 0 else self.nextRefresh
+            for _, _, qq, uid, offset, event in due:
+                if event.deadline - offset < time.time() - CANVAS_REMIND_GRACE or not markReminderSent(qq, uid, offset):
+                    continue
+                # 先占用记录避免多个 worker 重复提醒, 发送失败或被丢弃时撤销记录并稍后重发
+                send(qq, '⏰ Canvas ddl提醒\n【{}】\n截止时间：{}（还剩{}）'.format(
+                    event.summary, event.deadlineStr, formatRemaining(event.deadline - time.time())),
+                    'private', PRIORITY_BROADCAST, callback=self._onSent(qq, uid, offset, event))
+            self.wakeUp.wait(max(0, min(nextFire, self.nextRefresh) - time.time()))
+            self.wakeUp.clear()
+
+    def _onSent(self, qq: int, uid: str, offset: int, event: IcsEvent)->Callable[[bool], None]:
+        def callback(ok: bool):
+            if ok:
+                return
+            unmarkReminderSent(qq, uid, offset)
+            with self.lock:
+                heapq.heappush(self.heap, (time.time() + CANVAS_REMIND_RETRY_DELAY, next(self.counter), qq, uid, offset, event))
+            self.wakeUp.set()
+        return callback
+
+canvasReminderService = CanvasReminderService()
+# 其他 worker 中绑定/解绑馈送或开关提醒后重建提醒队列
+onInvalidate('canvasReminder', canvasReminderService.requestRefresh)
+
+class CanvasReminder(StandardPlugin):
+    def __init__(self) -> None:
+        canvasReminderService.start()
+    def judgeTrigger(self, msg:str, data:Any) -> bool:
+        return msg.strip() in ['-ics remind on', '-ics remind off']
+    def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
+        target = data['group_id'] if data['message_type']=='group' else data['user_id']
+        enabled = msg.strip() == '-ics remind on'
+        if setRemindEnabled(data['user_id'], enabled):
+            invalidate('canvasReminder')
+            send(target, 'ddl提醒已%s'%('开启' if enabled else '关闭'), data['message_type'])
+        else:
+            send(target, '设置失败', data['message_type'])
+        return "OK"
+    def getPluginInfo(self, )->Any:
+        return {
+            'name': 'CanvasReminder',
+            'description': 'canvas ddl提醒',
+            'commandDescription': '-ics remind on/off',
+            'usePlace': ['group', 'private'],
+            'showInHelp': True,
+            'pluginConfigTableNames': ['canvasReminderLog', 'canvasRemindOff'],
+            'version': '1.0.0',
+            'author': 'Unicorn',
+        }
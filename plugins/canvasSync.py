@@ -4,7 +4,9 @@ from utils.basicEvent import *
 from utils.basicConfigs import *
 from pathlib import Path
 import json
-from icalendar import Calendar
+from utils.icsFeedCache import icsFeedCache
+import plugins.canvasReminder # 注册ddl提醒队列的失效回调
+from utils.workerPool import invalidate
 from datetime import datetime, timedelta
 import re
 import mysql.connector
@@ -14,6 +16,7 @@ class CanvasiCalUnbind(StandardPlugin):
     def executeEvent(self, msg: str, data: Any) -> Union[None, str]:
         target = data['group_id'] if data['message_type']=='group' else data['user_id']
         if unbind_ics(data['user_id']):
+            invalidate('canvasReminder')
             send(target,"解绑成功", data['message_type'])
         else:
             send(target,"解绑失败", data['message_type'])
@@ -55,6 +58,7 @@ class CanvasiCalBind(StandardPlugin):
                 "\n【已做防注入处理】", data['message_type'])
         else:
             if edit_bind_ics(data['user_id'], msg):
+                invalidate('canvasReminder')
                 send(target,"绑定成功", data['message_type'])
             else:
                 send(target,"绑定失败", data['message_type'])
@@ -136,29 +140,13 @@ def getCanvas(qq_id) -> Tuple[bool, str]:
             url = urls[0][0]
     except BaseException as e:
         warning("error in canvasSync, error: {}".format(e))
+        return False, f"查询失败\n{FAIL_REASON_2}"
     qq_id=str(qq_id)
     
     try:
-        ret = requests.get(url=url)
-        if ret.status_code != requests.codes.ok:
-            return False, f"查询失败\n{FAIL_REASON_2}"
-        data = ret.content
-        gcal = Calendar.from_ical(data)
-        event_list = []
-        for component in gcal.walk():
-            if component.name == "VEVENT":
-                now = time.localtime()
-                ddl_time = component.get('dtend').dt
-                if not isinstance(ddl_time,datetime):
-                    tmp=datetime.strftime(ddl_time,"%Y-%m-%d")+" 23:59:59"
-                    ddl_time = datetime.strptime(tmp,"%Y-%m-%d %H:%M:%S")
-                else:
-                    ddl_time+=timedelta(hours=8)
-                    tmp = datetime.strftime(ddl_time, "%Y-%m-%d %H:%M:%S")
-                if time.mktime(time.strptime(tmp, "%Y-%m-%d %H:%M:%S")) < time.mktime(now):
-                    continue
-                ddl_time = datetime.strftime(ddl_time,"%Y-%m-%d %H:%M")
-                event_list.append([component.get('summary'), component.get('description'), ddl_time])
+        # 馈送未变化时直接使用缓存中已解析、按截止时间排序的事件
+        events = icsFeedCache.getEvents(url)
+        event_list = [[e.summary, e.description, e.deadlineStr] for e in events]
         return True, DrawEventListPic(event_list, qq_id)
     except Exception as e:
         print(e)
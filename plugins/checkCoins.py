@@ -3,6 +3,7 @@ from typing import Union, Any
 from utils.basicEvent import *
 from utils.basicConfigs import *
 from utils.standardPlugin import StandardPlugin
+from utils.runtimeConfig import runtimeConfig
 from utils.accountOperation import get_user_coins, get_user_transactions, update_user_coins
 from PIL import Image, ImageDraw, ImageFont
 import os.path
@@ -28,7 +29,7 @@ class CheckCoins(StandardPlugin): # 查询当前金币
         }
 class AddAssignedCoins(StandardPlugin): # 测试时使用，给指定用户增加金币
     def judgeTrigger(self, msg:str, data:Any) -> bool:
-        return (msg.startswith('-addcoins ') and data['user_id'] in ROOT_ADMIN_ID)
+        return (msg.startswith('-addcoins ') and data['user_id'] in runtimeConfig.current().rootAdminIds)
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
         msg=msg.replace('-addcoins ','',1)
         msg_split=msg.strip().split()
@@ -1,6 +1,6 @@
 from typing import Dict, Union, Any, List, Tuple
 from utils.basicEvent import getGroupAdmins, send, warning
-from utils.standardPlugin import StandardPlugin
+from utils.standardPlugin import StandardPlugin, TriggerMatch
 from utils.basicConfigs import ROOT_PATH, SAVE_TMP_PATH, sqlConfig
 from utils.responseImage import PALETTE_RED, ResponseImage, PALETTE_CYAN, FONTS_PATH, ImageFont
 import re, os.path, os
@@ -64,7 +64,7 @@ class HelpFAQ(StandardPlugin):
             'usePlace': ['group', ],
             'showInHelp': True,
             'pluginConfigTableNames': [],
-            'version': '1.0.4',
+            'version': '1.0.5',
             'author': 'Unicorn',
         }
 def get_answer(group_id: int, key: str)->Tuple[bool, str]:
@@ -161,10 +161,17 @@ def update_answer(group_id:int, question:str, answer:str, data:Any, tag:str = ''
 class AskFAQ(StandardPlugin):
     def __init__(self):
         self.pattern = re.compile(r'^(问|q)\s+([^\s]+)$')
+    def matchTrigger(self, msg:str, data:Any) -> Union[TriggerMatch, None]:
+        if data['message_type'] != 'group':
+            return None
+        result = self.pattern.match(msg)
+        return TriggerMatch(self, result.groups()) if result != None else None
     def judgeTrigger(self, msg:str, data:Any) -> bool:
-        return self.pattern.match(msg) != None and data['message_type']=='group'
+        return self.matchTrigger(msg, data) != None
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
-        question = self.pattern.findall(msg)[0][1]
+        return self.executeMatch(self.matchTrigger(msg, data), msg, data)
+    def executeMatch(self, match:TriggerMatch, msg:str, data:Any) -> Union[None, str]:
+        question = match.args[1]
         group_id = data['group_id']
         hasMsg, ans = get_answer(group_id, question)
         if hasMsg:
@@ -200,10 +207,17 @@ class MaintainFAQ(StandardPlugin):
             'rollback': MaintainFAQ.faqRollBack,
             'history': MaintainFAQ.faqHistory,
         }
+    def matchTrigger(self, msg:str, data:Any) -> Union[TriggerMatch, None]:
+        if data['message_type'] != 'group':
+            return None
+        result = self.findModPattern.match(msg)
+        return TriggerMatch(self, result.groups()) if result != None else None
     def judgeTrigger(self, msg:str, data:Any) -> bool:
-        return self.findModPattern.match(msg) != None and data['message_type']=='group'
+        return self.matchTrigger(msg, data) != None
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
-        mod, cmd = self.findModPattern.findall(msg)[0]
+        return self.executeMatch(self.matchTrigger(msg, data), msg, data)
+    def executeMatch(self, match:TriggerMatch, msg:str, data:Any) -> Union[None, str]:
+        mod, cmd = match.args
         if mod in self.modMap.keys():
             self.modMap[mod](cmd, data)
         else:
@@ -217,7 +231,7 @@ class MaintainFAQ(StandardPlugin):
             'usePlace': ['group', ],
             'showInHelp': True,
             'pluginConfigTableNames': [],
-            'version': '1.0.4',
+            'version': '1.0.5',
             'author': 'Unicorn',
         }
     @staticmethod
@@ -5,6 +5,7 @@ from datetime import datetime
 from typing import Union, Any
 from utils.basicEvent import *
 from utils.basicConfigs import *
+from utils.broadcast import broadcaster
 from utils.standardPlugin import StandardPlugin, PluginGroupManager
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
@@ -102,8 +103,9 @@ class DektGroup(PluginGroupManager):
             if data_1['data'][0]['id'] != data_2['data'][0]['id']:
                 picPath = NewActlistPic()
                 picPath = picPath if os.path.isabs(picPath) else os.path.join(ROOT_PATH, picPath)
-                for group_id in getPluginEnabledGroups(self.groupName):
-                    send(group_id, f'已发现第二课堂活动更新:[CQ:image,file=files://{picPath},id=40000]')
+                broadcaster.broadcast('dekt', str(data_2['data'][0]['id']),
+                    [f'已发现第二课堂活动更新:[CQ:image,file=files://{picPath},id=40000]'],
+                    getPluginEnabledGroups(self.groupName))
         except json.JSONDecodeError as e:
             warning("dekt json parse error {}".format(e))
         except KeyError as e:
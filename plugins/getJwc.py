@@ -5,6 +5,7 @@ import requests
 from bs4 import BeautifulSoup as BS
 from utils.basicEvent import *
 from utils.basicConfigs import *
+from utils.broadcast import broadcaster
 from threading import Timer
 from pathlib import Path
 import json
@@ -213,9 +214,10 @@ class JwcGroup(PluginGroupManager):
                 if not updateFlag: continue
                 pic = DrawNoticePIC(j)
                 pic = pic if os.path.isabs(pic) else os.path.join(ROOT_PATH, pic)
-                for group_id in getPluginEnabledGroups(self.groupName):
-                    send(group_id, '已发现教务通知更新:\n【'+j['title']+'】\n'+j['link'])
-                    send(group_id, '[CQ:image,file=files://%s,id=40000]'%pic)
+                broadcaster.broadcast('jwc', j['link'], [
+                    '已发现教务通知更新:\n【'+j['title']+'】\n'+j['link'],
+                    '[CQ:image,file=files://%s,id=40000]'%pic,
+                ], getPluginEnabledGroups(self.groupName))
         with open(exact_path, 'w') as f:
             json.dump(url_list, f, indent=4)
 
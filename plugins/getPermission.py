@@ -1,11 +1,11 @@
 from typing import Union, Any
 from utils.basicEvent import delGroupAdmin, send, addGroupAdmin, getGroupAdmins
-from utils.basicConfigs import ROOT_ADMIN_ID
+from utils.runtimeConfig import runtimeConfig
 from utils.standardPlugin import StandardPlugin
 import re
 class GetPermission(StandardPlugin):
     def judgeTrigger(self, msg:str, data:Any) -> bool:
-        return msg == '-sudo' and data['user_id'] in ROOT_ADMIN_ID
+        return msg == '-sudo' and data['user_id'] in runtimeConfig.current().rootAdminIds
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
         groupId = data['group_id']
         userId = data['user_id']
@@ -30,7 +30,7 @@ class AddPermission(StandardPlugin):
         self.cmdStyle = re.compile(r'^-addadmin ?\[CQ:at,qq=(\d+)\]$')
     def judgeTrigger(self, msg:str, data:Any) -> bool:
         userId = data['user_id']
-        return self.cmdStyle.match(msg) != None and userId in ROOT_ADMIN_ID
+        return self.cmdStyle.match(msg) != None and userId in runtimeConfig.current().rootAdminIds
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
         groupId = data['group_id']
         userId = data['user_id']
@@ -57,7 +57,7 @@ class DelPermission(StandardPlugin):
         self.cmdStyle = re.compile(r'^-deladmin ?\[CQ:at,qq=(\d+)\]$')
     def judgeTrigger(self, msg:str, data:Any) -> bool:
         userId = data['user_id']
-        return self.cmdStyle.match(msg) != None and userId in ROOT_ADMIN_ID
+        return self.cmdStyle.match(msg) != None and userId in runtimeConfig.current().rootAdminIds
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
         groupId = data['group_id']
         targetId = int(self.cmdStyle.findall(msg)[0])
@@ -1,47 +1,103 @@
 import re, os, os.path
 from typing import Tuple, Union, Any
-from threading import Timer
+from threading import Lock, RLock
+import time
 from utils.basicEvent import *
 from utils.basicConfigs import *
 from utils.standardPlugin import StandardPlugin
 from utils.accountOperation import get_user_coins, update_user_coins
 from utils.goBangGame import NCOLS, NROWS, GoBangGame, drawGoBangPIC
+from utils.goBangBot import searchAsync, BOT_TIME_BUDGET, BOT_DEADLINE_SLACK
+from utils.gameSessionStore import GameSessionStore, gameTimeoutSweeper
 from enum import IntEnum
 import traceback
 GOBANG_SPEND_COINS = 0
-CMD_GOBANG = ['开始五子棋','取消五子棋','接受五子棋','认输']
-CMD_GOBANG_ONGOING = lambda txt: re.match('^([1-9]|0[1-9]|1[0-%d])([A-%s])$'%(NROWS%10,"_ABCDEFGHIJKLMNOPQRSTUVWXYZ"[NCOLS]), txt) != None
+GOBANG_FORBID_RULE = False # 是否对黑棋启用禁手(长连/双四/双三)规则
+CMD_GOBANG = ['开始五子棋','取消五子棋','接受五子棋','认输','人机五子棋']
+GOBANG_POS_PATTERN = re.compile('^([1-9]|0[1-9]|1[0-%d])([A-%s])$'%(NROWS%10,"_ABCDEFGHIJKLMNOPQRSTUVWXYZ"[NCOLS]))
+CMD_GOBANG_ONGOING = lambda txt: GOBANG_POS_PATTERN.match(txt) != None
 class GameStatus(IntEnum):
     FREE = 0
     READY = 1
     GAMING = 2
 class GoBangGroupInterface():
     """五子棋群聊接口类"""
-    def __init__(self, group_id):
+    def __init__(self, group_id, store:GameSessionStore):
         self.player=[0, 0]
         self.status=GameStatus.FREE
         self.group_id=group_id # 群号（用于读取金币数量）
         self.round_index=0 # 在0和1之间切换，对应当前开枪者
-        self.game = GoBangGame()
-        self.timer= None
+        self.game = GoBangGame(GOBANG_FORBID_RULE)
+        self.deadline = None # 超时结算的时间戳, None表示不计时
+        self.vsBot = False # 是否为人机对局, 人机对局中bot执白
+        self.gameIndex = 0 # 每局自增, 用于丢弃上一局遗留的bot搜索结果
+        self.lock = Lock()
+        self.store = store
     def refresh(self):
         self.player=[0, 0]
         self.status=GameStatus.FREE
         self.round_index=0 # 在0和1之间切换，对应当前开枪者
-        self.timer = None
+        self.deadline = None
+        self.vsBot = False
+        self.gameIndex += 1
         self.game.refresh()
+    def snapshot(self)->dict:
+        return {
+            'player': self.player,
+            'status': int(self.status),
+            'round_index': self.round_index,
+            'vsBot': self.vsBot,
+            'pieceOrder': self.game.pieceOrder,
+            'deadline': self.deadline,
+        }
+    def restore(self, snapshot:dict):
+        self.player = snapshot['player']
+        self.status = GameStatus(snapshot['status'])
+        self.round_index = snapshot['round_index']
+        self.vsBot = snapshot['vsBot']
+        self.deadline = snapshot['deadline']
+        self.game.refresh()
+        for pos in snapshot['pieceOrder']:
+            self.game.act(tuple(pos))
+        if self.vsBot and self.status == GameStatus.GAMING and self.round_index == 1:
+            # 重启前bot正在思考, 重新提交搜索
+            self.startBotSearch()
+    def persist(self): # 同步对局快照
+        if self.status == GameStatus.FREE:
+            self.store.delete(self.group_id)
+        else:
+            self.store.save(self.group_id, self.snapshot(), self.deadline)
     def get_cmd(self, msg:str, data)->Union[None, str]:
+        """调用方需持有 self.lock, 见 GoBangPlugin.acquireInterface"""
+        before = self.stateKey()
+        ret = self._get_cmd(msg, data)
+        # 大部分匹配到的消息只是闲聊中的坐标或非当前玩家的落子, 状态不变时不写数据库
+        if self.stateKey() != before:
+            self.persist()
+        return ret
+    def stateKey(self)->Tuple:
+        return (self.gameIndex, self.status, self.round_index, len(self.game.pieceOrder))
+    def _get_cmd(self, msg:str, data)->Union[None, str]:
         userId = data['user_id']
         groupId = data['group_id']
         # init阶段，发起决斗申请
         if self.status == GameStatus.FREE:
+            if startswith_in(msg, ['人机五子棋']):
+                self.status = GameStatus.GAMING
+                self.player = [userId, BOT_SELF_QQ]
+                self.vsBot = True
+                self.round_index = 0
+                picPath = drawGoBangPIC([], [], groupId)
+                picPath = picPath if os.path.isabs(picPath) else os.path.join(ROOT_PATH, picPath)
+                send(groupId, '开始人机对局，[CQ:at,qq=%d]执黑先行！'%userId, 'group')
+                self.deadline = time.time() + 60
+                return f'[CQ:image,file=files://{picPath}]'
             if startswith_in(msg, ['开始五子棋']):
                 if get_user_coins(userId) < GOBANG_SPEND_COINS:
                     return '金币不足，五子棋需%d金币'%GOBANG_SPEND_COINS
                 self.status = GameStatus.READY
                 self.player[0] = userId
-                self.timer = Timer(45, self.prepare_timeout)
-                self.timer.start()
+                self.deadline = time.time() + 45
                 return "[CQ:at,qq=%d]向群友发起五子棋挑战，回复“接受五子棋”迎接挑战吧！"%userId
         elif self.status == GameStatus.READY:
             if msg == '接受五子棋':
@@ -49,15 +105,14 @@ class GoBangGroupInterface():
                     return '自己不能和自己下棋'
                 if get_user_coins(userId) < GOBANG_SPEND_COINS:
                     return '金币不足，五子棋需%d金币'%GOBANG_SPEND_COINS
-                self.timer.cancel()
+                self.deadline = None
                 self.status = GameStatus.GAMING
                 self.player[1] = userId
                 self.round_index = 0
                 picPath = drawGoBangPIC([], [], groupId)
                 picPath = picPath if os.path.isabs(picPath) else os.path.join(ROOT_PATH, picPath)
                 send(groupId, '开始游戏，由发起挑战者执黑先行！', 'group')
-                self.timer = Timer(60, self.ongoing_timeout)
-                self.timer.start()
+                self.deadline = time.time() + 60
                 return f'[CQ:image,file=files://{picPath}]'
         elif self.status == GameStatus.GAMING:
             if userId != self.player[self.round_index]:
@@ -65,17 +120,20 @@ class GoBangGroupInterface():
             if msg == '认输':
                 winner = self.player[1^self.round_index]
                 loser = self.player[self.round_index]
-                self.timer.cancel()
+                self.deadline = None
                 self.refresh()
                 return '恭喜[CQ:at,qq=%d]战胜[CQ:at,qq=%d],取得本局五子棋的胜利！'%(winner, loser)
-            if CMD_GOBANG_ONGOING(msg):
-                x, y = re.findall('^([1-9]|0[1-9]|1[0-%d])([A-%s])$'%(NROWS%10,"_ABCDEFGHIJKLMNOPQRSTUVWXYZ"[NCOLS]), msg)[0]
+            pos = GOBANG_POS_PATTERN.match(msg)
+            if pos != None:
+                x, y = pos.groups()
                 x = int(x) - 1
                 y = ord(y) - ord('A')
+                if self.game.forbidRule and self.game.checkForbid(self.game.currentPiece, (x, y)):
+                    return "此处为黑棋禁手，不能落子"
                 valid = self.game.act((x, y))
                 if not valid:
                     return "此处不能落子"
-                self.timer.cancel()
+                self.deadline = None
                 done = self.game.done()
                 if done:
                     winner = self.player[self.round_index]
@@ -86,32 +144,124 @@ class GoBangGroupInterface():
                 black, white = self.game.getPieceLocs()
                 picPath = drawGoBangPIC(black, white, groupId)
                 picPath = picPath if os.path.isabs(picPath) else os.path.join(ROOT_PATH, picPath)
-                self.timer = Timer(60, self.ongoing_timeout)
-                self.timer.start()
+                if self.vsBot:
+                    self.startBotSearch()
+                    return f'[CQ:image,file=files://{picPath}]'
+                self.deadline = time.time() + 60
                 return f'[CQ:image,file=files://{picPath}]'
         else:
             warning("unexpected gobang status")
             return None
+    def startBotSearch(self): # bot在子进程中搜索, 不阻塞消息处理; 调用方需持有 self.lock
+        # bot回合同样计时, 搜索结果丢失时由超时扫描结算本局
+        self.deadline = time.time() + BOT_TIME_BUDGET + BOT_DEADLINE_SLACK
+        gameIndex = self.gameIndex
+        searchAsync(self.game, lambda pos: self.bot_act(gameIndex, pos))
+    def bot_act(self, gameIndex:int, pos:Union[None, Tuple]): # bot搜索结束后落子
+        with self.lock:
+            if gameIndex != self.gameIndex or self.status != GameStatus.GAMING:
+                return
+            if pos == None or not self.game.act(pos):
+                winner = self.player[0]
+                self.refresh()
+                send(self.group_id, '机器人无处落子，恭喜[CQ:at,qq=%d]取得本局五子棋的胜利！'%winner)
+                self.persist()
+                return
+            black, white = self.game.getPieceLocs()
+            picPath = drawGoBangPIC(black, white, self.group_id)
+            picPath = picPath if os.path.isabs(picPath) else os.path.join(ROOT_PATH, picPath)
+            send(self.group_id, f'[CQ:image,file=files://{picPath}]')
+            if self.game.done():
+                loser = self.player[0]
+                self.refresh()
+                send(self.group_id, '五子连珠！机器人战胜了[CQ:at,qq=%d]，再接再厉！'%loser)
+                self.persist()
+                return
+            self.round_index ^= 1
+            self.deadline = time.time() + 60
+            self.persist()
+    def check_timeout(self, now:float, offline:bool=False):
+        with self.lock:
+            self._check_timeout(now, offline)
+    def _check_timeout(self, now:float, offline:bool=False): # 调用方需持有 self.lock
+        if self.deadline == None or self.deadline > now:
+            return
+        if offline:
+            send(self.group_id,'⚠️bot重启期间五子棋对局已超时，本局作废')
+            self.refresh()
+        elif self.status == GameStatus.READY:
+            self.prepare_timeout()
+        elif self.status == GameStatus.GAMING:
+            self.ongoing_timeout()
+        self.persist()
     def prepare_timeout(self): # 准备阶段超时无人应答
-        self.timer.cancel()
         send(self.group_id,'⏰45s内无应答，[CQ:at,qq=%d]的决斗请求已自动取消'%(self.player[0]))
         self.refresh()
     def ongoing_timeout(self): # 游戏阶段超时无人应答
-        self.timer.cancel()
+        if self.vsBot and self.round_index == 1:
+            send(self.group_id,'⏰机器人思考超时，本局自动结算，胜利者为[CQ:at,qq=%d]'%(self.player[0]))
+            self.refresh()
+            return
         send(self.group_id,'⏰60s内无应答，决斗已自动结算，胜利者为[CQ:at,qq=%d]'%(self.player[1^self.round_index]))
         self.refresh()
 class GoBangPlugin(StandardPlugin):
     def __init__(self) -> None:
-        self.goBangDict = {}
+        self.goBangDict = {} # 只保存进行中的对局, 其余对局按需从数据库加载
+        self.lock = RLock()
+        self.store = GameSessionStore('gobang')
+        self.pendingDeadlines = self.store.loadDeadlines() # 尚未加载到内存的对局
+        # 启动时处理bot离线期间已超时的对局
+        now = time.time()
+        for groupId, deadline in list(self.pendingDeadlines.items()):
+            if deadline != None and deadline <= now:
+                self.getInterface(groupId).check_timeout(now, offline=True)
+        gameTimeoutSweeper.register(self.sweepTimeout)
+    def getInterface(self, groupId)->GoBangGroupInterface:
+        with self.lock:
+            if groupId not in self.goBangDict.keys():
+                interface = GoBangGroupInterface(groupId, self.store)
+                if groupId in self.pendingDeadlines.keys():
+                    del self.pendingDeadlines[groupId]
+                    snapshot = self.store.load(groupId)
+                    if snapshot != None:
+                        interface.restore(snapshot)
+                self.goBangDict[groupId] = interface
+            return self.goBangDict[groupId]
+    def acquireInterface(self, groupId)->GoBangGroupInterface:
+        """返回该群的对局并持有其锁, 调用方负责释放
+        扫描线程可能在取得对局与加锁之间移除空闲对局, 加锁后确认对局仍在 goBangDict 中, 否则重新获取"""
+        while True:
+            interface = self.getInterface(groupId)
+            interface.lock.acquire()
+            with self.lock:
+                if self.goBangDict.get(groupId) is interface:
+                    return interface
+            interface.lock.release()
+    def sweepTimeout(self, now:float):
+        with self.lock:
+            for groupId, deadline in list(self.pendingDeadlines.items()):
+                if deadline != None and deadline <= now:
+                    self.getInterface(groupId)
+            for groupId, interface in list(self.goBangDict.items()):
+                if not interface.lock.acquire(blocking=False):
+                    continue # 该群正在处理消息, 下一轮再检查
+                try:
+                    interface._check_timeout(now)
+                    if interface.status == GameStatus.FREE:
+                        del self.goBangDict[groupId]
+                finally:
+                    interface.lock.release()
     def judgeTrigger(self, msg:str, data:Any) -> bool:
         return startswith_in(msg, CMD_GOBANG) or CMD_GOBANG_ONGOING(msg)
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
         groupId = data['group_id']
         userId = data['user_id']
-        if groupId not in self.goBangDict.keys():
-            self.goBangDict[groupId] = GoBangGroupInterface(groupId)
         try:
-            ret = self.goBangDict[groupId].get_cmd(msg, data)
+            interface = self.acquireInterface(groupId)
+            try:
+                ret = interface.get_cmd(msg, data)
+            finally:
+                interface.lock.release()
             if isinstance(ret, str):
                 send(groupId, ret)
         except Exception as e:
@@ -122,10 +272,10 @@ class GoBangPlugin(StandardPlugin):
         return {
             'name': 'GoBang',
             'description': '五子棋',
-            'commandDescription': '开始五子棋/接受五子棋/认输/A1、B2...',
+            'commandDescription': '开始五子棋/人机五子棋/接受五子棋/认输/A1、B2...',
             'usePlace': ['group', ],
             'showInHelp': True,
             'pluginConfigTableNames': [],
-            'version': '1.0.0',
+            'version': '1.1.0',
             'author': 'Unicorn',
         }
\ No newline at end of file
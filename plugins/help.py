@@ -1,9 +1,11 @@
 from typing import Union, Any
-import psutil
 from utils.basicEvent import *
 from utils.basicConfigs import *
 from utils.standardPlugin import StandardPlugin, PluginGroupManager
 from utils.responseImage import *
+from utils.lazyPlugin import LazyPlugin
+from utils.pluginMetrics import pluginMetrics
+from utils.runtimeConfig import runtimeConfig
 import os.path
 class ShowHelp(StandardPlugin): 
     def __init__(self) -> None:
@@ -56,6 +58,8 @@ class ShowHelp(StandardPlugin):
         )
         pluginList = self.pluginList if group_id!=0 else self.pluginListPrivate
         for item in pluginList:
+            if isinstance(item, LazyPlugin) and item.loaded():
+                item = item.load()
             cardPluginList = []
             flag = False
             if issubclass(type(item), PluginGroupManager):
@@ -112,8 +116,9 @@ class ShowStatus(StandardPlugin):
 
 class ServerMonitor(StandardPlugin):
     def judgeTrigger(self, msg:str, data:Any) -> bool:
-        return msg == '-monitor' and data['user_id'] in ROOT_ADMIN_ID
+        return msg == '-monitor' and data['user_id'] in runtimeConfig.current().rootAdminIds
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
+        import psutil # 仅在 -monitor 时用到, 不在启动时导入
         target = data['group_id'] if data['message_type']=='group' else data['user_id']
         statusCards = ResponseImage(
             title = 'Bot 服务器状态', 
@@ -130,6 +135,19 @@ class ServerMonitor(StandardPlugin):
                 ('progressBar', cpu/100, 'auto'),
             ])
         )
+        # 插件耗时统计, 按总耗时排序
+        metricsContent = [('title', '插件耗时 (平均/p95, 命中, 异常)'), ('separator', )]
+        for name, stat in pluginMetrics.summary():
+            metricsContent.append(('keyword', name))
+            metricsContent.append(('body', '判定 %.1fms/%.1fms  执行 %.1fms/%.1fms  命中 %d  异常 %d'%(
+                stat.trigger.mean()*1000, stat.trigger.quantile(0.95)*1000,
+                stat.execute.mean()*1000, stat.execute.quantile(0.95)*1000,
+                stat.hits, stat.errors)))
+        sendHist = pluginMetrics.send
+        metricsContent.append(('separator', ))
+        metricsContent.append(('subtitle', '发送消息: %d 次, 平均 %.1fms, p95 %.1fms, 失败 %d'%(
+            sendHist.count, sendHist.mean()*1000, sendHist.quantile(0.95)*1000, pluginMetrics.sendErrors)))
+        statusCards.addCard(ResponseImage.RichContentCard(raw_content=metricsContent))
         save_path = os.path.join(SAVE_TMP_PATH, 'server_monitor.png')
         statusCards.generateImage(save_path)
         save_path = save_path if os.path.isabs(save_path) else os.path.join(ROOT_PATH, save_path)
@@ -143,6 +161,6 @@ class ServerMonitor(StandardPlugin):
             'usePlace': ['group', 'private', ],
             'showInHelp': False,
             'pluginConfigTableNames': [],
-            'version': '1.0.0',
+            'version': '1.1.0',
             'author': 'Unicorn',
         }
@@ -0,0 +1,89 @@
+"""
+依赖较重的插件 (torch/jieba, lxml, icalendar, selenium, bs4/qrcode, bilibili_api 等) 的懒加载描述
+这里的函数与插件类同名, main.py 中可以像构造插件一样直接调用;
+插件信息需与对应插件的 getPluginInfo() 保持一致, trigger 需覆盖插件的全部触发条件
+"""
+from typing import Any, List
+from utils.basicEvent import startswith_in
+from utils.basicConfigs import BILIBILI_LIVE_ROOMS
+from utils.lazyPlugin import LazyPlugin
+
+def _info(name: str, description: str, commandDescription: str, usePlace=('group', 'private'),
+          pluginConfigTableNames=(), version: str='1.0.0', author: str='Unicorn') -> dict:
+    return {
+        'name': name,
+        'description': description,
+        'commandDescription': commandDescription,
+        'usePlace': list(usePlace),
+        'showInHelp': True,
+        'pluginConfigTableNames': list(pluginConfigTableNames),
+        'version': version,
+        'author': author,
+    }
+
+def _groupTrigger(groupName: str, commands: list):
+    def trigger(msg: str, data: Any) -> bool:
+        return msg in commands or msg in ['-grpcfg enable %s'%groupName, '-grpcfg disable %s'%groupName]
+    return trigger
+
+def ChatWithNLP()->LazyPlugin:
+    return LazyPlugin('plugins.chatWithNLP', 'ChatWithNLP',
+        _info('ChatWithNLP', 'NLP对话', '小马，'),
+        lambda msg, data: startswith_in(msg, ['小马，','小马,']))
+
+def ShowNews()->LazyPlugin:
+    return LazyPlugin('plugins.news', 'ShowNews',
+        _info('ShowNews', '新闻', '每日新闻/新闻', author='北极づ莜蓝'),
+        lambda msg, data: msg in ['每日新闻','新闻'])
+
+def GetCanvas()->LazyPlugin:
+    return LazyPlugin('plugins.canvasSync', 'GetCanvas',
+        _info('GetCanvas', 'canvas活动查询', '-ddl/-canvas', pluginConfigTableNames=['canvasIcs']),
+        lambda msg, data: msg.strip() in ['-ddl', '-canvas'])
+
+def CanvasiCalBind()->LazyPlugin:
+    return LazyPlugin('plugins.canvasSync', 'CanvasiCalBind',
+        _info('CanvasiCalBind', 'canvas日历绑定', '-ics bind [url]'),
+        lambda msg, data: startswith_in(msg, ['-ics bind ']))
+
+def CanvasiCalUnbind()->LazyPlugin:
+    return LazyPlugin('plugins.canvasSync', 'CanvasiCalUnbind',
+        _info('CanvasiCalUnbind', 'canvas日历解绑', '-ics unbind'),
+        lambda msg, data: msg.strip() == '-ics unbind')
+
+def GetDektNewActivity()->LazyPlugin:
+    return LazyPlugin('plugins.getDekt', 'GetDektNewActivity',
+        _info('GetDektNewActivity', '第二课堂', '-dekt'),
+        lambda msg, data: msg == '-dekt')
+
+def GetJwc()->LazyPlugin:
+    return LazyPlugin('plugins.getJwc', 'GetJwc',
+        _info('GetJwc', '获取教务通知', '-jwc'),
+        lambda msg, data: msg == '-jwc')
+
+# 以下插件含有定时轮询, 在后台预热时加载
+def CanvasReminder()->LazyPlugin:
+    return LazyPlugin('plugins.canvasReminder', 'CanvasReminder',
+        _info('CanvasReminder', 'canvas ddl提醒', '-ics remind on/off',
+              pluginConfigTableNames=['canvasReminderLog', 'canvasRemindOff']),
+        lambda msg, data: msg.strip() in ['-ics remind on', '-ics remind off'], warmUp=True)
+
+def DektGroup()->LazyPlugin:
+    return LazyPlugin('plugins.getDekt', 'DektGroup',
+        _info('dekt', '第二课堂', '-dekt', ['group']),
+        _groupTrigger('dekt', ['-dekt']), warmUp=True)
+
+def JwcGroup()->LazyPlugin:
+    return LazyPlugin('plugins.getJwc', 'JwcGroup',
+        _info('jwc', '获取教务通知/获取交大新闻网', '-jwc/-sjtu news', ['group']),
+        _groupTrigger('jwc', ['-jwc', '-sjtu news']), warmUp=True)
+
+def LiveRoomStatus(roomName: str)->LazyPlugin:
+    room = [room for room in BILIBILI_LIVE_ROOMS if room['name'] == roomName][0]
+    return LazyPlugin('plugins.sjmcLive', 'LiveRoomStatus',
+        _info(room['name'], room['description'], '/'.join(room['commands']), version='1.1.0'),
+        lambda msg, data: msg in room['commands'], warmUp=True, args=(roomName, ))
+
+def LiveRoomPlugins()->List[LazyPlugin]:
+    """basicConfigs.BILIBILI_LIVE_ROOMS 中配置的全部直播间"""
+    return [LiveRoomStatus(room['name']) for room in BILIBILI_LIVE_ROOMS]
@@ -1,10 +1,30 @@
 from utils.standardPlugin import StandardPlugin, RecallMessageStandardPlugin, Union, Tuple, Any, List
 from utils.basicEvent import get_group_list, warning, get_group_list, get_group_msg_history
 from utils.basicConfigs import sqlConfig
+from utils.workerPool import currentShard
+from utils.messageRecordIndex import hasIndex
 from pymysql.converters import escape_string
 import mysql.connector
 import threading, time
 import json
+from collections import OrderedDict
+RECALL_CACHE_SIZE = 20000 # 内存中保留的最近消息 (group_id, message_id) -> message_seq 映射条数
+
+class RecentMessageSeq():
+    """有界 LRU: (group_id, message_id) -> message_seq, 撤回的多是最近的消息, 命中时按主键更新"""
+    def __init__(self, capacity: int=RECALL_CACHE_SIZE) -> None:
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.seqs: OrderedDict = OrderedDict()
+    def put(self, groupId: int, messageId: int, messageSeq: int)->None:
+        with self.lock:
+            self.seqs[(groupId, messageId)] = messageSeq
+            self.seqs.move_to_end((groupId, messageId))
+            if len(self.seqs) > self.capacity:
+                self.seqs.popitem(last=False)
+    def pop(self, groupId: int, messageId: int)->Union[int, None]:
+        with self.lock:
+            return self.seqs.pop((groupId, messageId), None)
 
 def getLatestRecordSeq():
     groupList = [group['group_id'] for group in get_group_list()]
@@ -90,6 +110,9 @@ def getGroupMessageThread(latestResultSeq):
 
 class GroupMessageRecorder(StandardPlugin, RecallMessageStandardPlugin):
     def __init__(self) -> None:
+        self.recentSeqs = RecentMessageSeq()
+        if currentShard() not in (None, 0):
+            return # 多进程模式下建表与补录离线期间的消息只在 0 号 worker 中执行
         # 首先获取群聊列表，看看数据库是否开了这些表
         mydb = mysql.connector.connect(charset='utf8mb4',**sqlConfig)
         mydb.autocommit = True
@@ -105,8 +128,13 @@ class GroupMessageRecorder(StandardPlugin, RecallMessageStandardPlugin):
             `nickname` varchar(50) not null,
             `card` varchar(50) not null,
             `recall` bool not null default false,
-            primary key (`group_id`, `message_seq`)
+            primary key (`group_id`, `message_seq`),
+            key `idx_message_id` (`group_id`, `message_id`),
+            key `idx_group_time` (`group_id`, `time`),
+            fulltext key `ft_message` (`message`) with parser ngram
         )charset=utf8mb4, collate=utf8mb4_unicode_ci;""")
+        if not hasIndex('idx_message_id'):
+            warning("messageRecord 缺少 idx_message_id 索引, 撤回较早的消息时会扫描整个群的记录, 请运行 python -m utils.messageRecordIndex")
         # 多线程获取离线期间的聊天记录
         latestResultSeq = getLatestRecordSeq()
         self._getGroupMessageThread = threading.Thread(target=getGroupMessageThread,args=(latestResultSeq,))
@@ -116,12 +144,20 @@ class GroupMessageRecorder(StandardPlugin, RecallMessageStandardPlugin):
             mydb = mysql.connector.connect(charset='utf8mb4',**sqlConfig)
             mydb.autocommit = True
             mycursor = mydb.cursor()
+            groupId, messageId = data['group_id'], data['message_id']
+            messageSeq = self.recentSeqs.pop(groupId, messageId)
+            if messageSeq != None:
+                mycursor.execute("""
+                    update `BOT_DATA`.`messageRecord` set recall=true where 
+                    group_id = %s and message_seq = %s and message_id = %s
+                """, (groupId, messageSeq, messageId))
+                if mycursor.rowcount > 0:
+                    return None
+            # 较早的消息走 (group_id, message_id) 二级索引
             mycursor.execute("""
                 update `BOT_DATA`.`messageRecord` set recall=true where 
-                group_id = %d and message_id = %d
-            """%(
-                data['group_id'], data['message_id']
-            ))
+                group_id = %s and message_id = %s
+            """, (groupId, messageId))
         except KeyError as e:
             warning("key error in recall message: {}".format(e))
         except mysql.connector.Error as e:
@@ -156,6 +192,7 @@ class GroupMessageRecorder(StandardPlugin, RecallMessageStandardPlugin):
                     escape_string(card)
                 )
             )
+            self.recentSeqs.put(data['group_id'], data['message_id'], data['message_seq'])
         except mysql.connector.Error as e:
             warning("mysql error in MessageRecorder: {}".format(e))
         except KeyError as e:
@@ -172,6 +209,6 @@ class GroupMessageRecorder(StandardPlugin, RecallMessageStandardPlugin):
             'usePlace': ['group', 'group_recall'],
             'showInHelp': False,                
             'pluginConfigTableNames': ['messageRecord', ],
-            'version': '1.0.0',
+            'version': '1.0.1',
             'author': 'Unicorn',
         }
\ No newline at end of file
@@ -1,13 +1,15 @@
 from PIL import Image, ImageDraw, ImageFont
 import random
-from threading import Timer
+from threading import Lock
+import time
 from io import BytesIO
 from typing import Union, Any
 from utils.basicEvent import *
 from utils.basicConfigs import *
 from utils.standardPlugin import StandardPlugin
 from utils.accountOperation import get_user_coins, update_user_coins
-import re
+from utils.gameSessionStore import GameSessionStore, gameTimeoutSweeper
+from utils.messageParser import parseMessage
 
 # 轮盘赌类，每个群创建一个实例
 class _roulette():
@@ -25,7 +27,7 @@ class _roulette():
         self.num_whole=0
         #self.random_bullet(num_bullet, num_whole)
         self.cur_index=0
-        self.timer=Timer
+        self.deadline=None # 超时结算的时间戳, None表示不计时
         
 
     def get_cmd(self, id, msg):
@@ -39,7 +41,7 @@ class _roulette():
                     ret_p=(f'\n\n当前正在进行决斗：\n{self.player[0]} vs {self.player[1]}\n挑战金额：{self.wager}\n子弹数：{len(self.bullet_index)} in {self.num_whole}')
                 return ERR_DESCRIBES[4]+ret_p
             else:
-                msg_split=msg.split()
+                msg_split=parseMessage(msg).args
                 if len(msg_split)<4 or len(msg_split)>5:
                     return ERR_DESCRIBES[0]
                 try:
@@ -63,9 +65,7 @@ class _roulette():
                # print(self.player)
                 try:
                     if len(msg_split) > 4:
-                        qqExtractor = re.compile(r'\[CQ:at,qq=(\d+)\]')
-                        qqMsg = msg_split[4].strip()
-                        aim_id = int(qqExtractor.findall(qqMsg)[0])
+                        aim_id = parseMessage(msg_split[4]).mentions[0]
                         if aim_id==self.player[0]:
                             return ERR_DESCRIBES[3]
                         if aim_id==BOT_SELF_QQ:
@@ -80,8 +80,7 @@ class _roulette():
                 self.random_bullet(num_bul, num_who) # 随机填入子弹
                 self.num_whole=num_who
                 self.status='prepare'
-                self.timer=Timer(45, self.prepare_timeout)
-                self.timer.start()
+                self.deadline=time.time()+45
                 if self.aim_id==None:
                     return (f'🚩{self.player[0]}向群友发起决斗请求！\n\n - 挑战金额：{self.wager} 子弹数：{len(self.bullet_index)} in {self.num_whole}\n - 愿意接受的勇敢者请回复【接受决斗】，支付相同金币并参加决斗\n - 未应答前，发起者可以发送【取消决斗】取消，45s无应答自动取消🚩')
                 else:
@@ -128,7 +127,7 @@ class _roulette():
                 return ERR_DESCRIBES[12]
             if id not in self.player:
                 return ERR_DESCRIBES[10][:5]
-            msg_split=msg.split()
+            msg_split=parseMessage(msg).args
             num_shot=0
             try:
                 num_shot=int(msg_split[1])
@@ -139,13 +138,13 @@ class _roulette():
             return(self.shot(num_shot))
 
     def prepare_timeout(self): # 准备阶段超时无人应答
-        self.timer.cancel()
+        self.deadline=None
         send(self.group_id,f'⏰45s内无应答，{self.player[0]}的决斗请求已自动取消')
         self.__init__(self.group_id)
         return
 
     def ongoing_timeout(self): # 游戏阶段超时无人应答
-        self.timer.cancel()
+        self.deadline=None
         send(self.group_id,f'⏰30s内无应答，决斗已自动结算，胜利者为{self.player[1-self.round_index]}')
         update_user_coins(self.player[1-self.round_index], 2*self.wager, '轮盘获胜奖励')
         ret = self.result(self.player[1-self.round_index],self.player[self.round_index])
@@ -156,7 +155,7 @@ class _roulette():
         return
 
     def shot(self, num_shot): # 开枪
-        self.timer.cancel()    
+        self.deadline=None
         for i in range(num_shot):
             self.cur_index+=1
             if self.cur_index in self.bullet_index:
@@ -167,8 +166,7 @@ class _roulette():
                 return self.result(self.player[1-self.round_index],self.player[self.round_index])
         self.round_index=1-self.round_index # 切换下一个开枪者
         tmp = random.choice(ALIVE_TEXT)+(f'\n------\n已进行到第{self.cur_index}发，轮盘共{self.num_whole}格，填入子弹{len(self.bullet_index)}颗')
-        self.timer=Timer(30,self.ongoing_timeout)
-        self.timer.start()
+        self.deadline=time.time()+30
         return (f'[CQ:at,qq={self.player[1-self.round_index]}]:\n')+tmp+(f'\n请[CQ:at,qq={self.player[self.round_index]}]在30s内开枪，超时自动判负')
 
     def random_bullet(self, num_bullet, num_whole): # 随机生成子弹
@@ -182,12 +180,38 @@ class _roulette():
 
     def begin_game(self): # 开始比赛
         self.status='ongoing'  
-        self.timer.cancel()    
-        self.timer=Timer(30,self.ongoing_timeout)  
-        self.timer.start()
+        self.deadline=time.time()+30
+
+    def on_timeout(self): # 超时扫描线程发现已超时
+        if self.status=='prepare':
+            self.prepare_timeout()
+        elif self.status=='ongoing':
+            self.ongoing_timeout()
+        else:
+            self.deadline=None
+
+    def refund(self): # 对局中断（如bot重启期间超时），退还已扣除的挑战金额
+        if self.status=='ongoing':
+            for player in self.player:
+                update_user_coins(player, self.wager, '轮盘中断-退还挑战金额')
+        send(self.group_id, '⚠️bot重启期间决斗已超时，本局作废，已退还双方挑战金额' if self.status=='ongoing'
+            else '⚠️bot重启期间决斗请求已超时，已自动取消')
+        self.__init__(self.group_id)
+
+    def snapshot(self)->dict: # 持久化所需的对局状态
+        return {
+            'player': self.player, 'status': self.status, 'wager': self.wager,
+            'aim_id': self.aim_id, 'round_index': self.round_index,
+            'bullet_index': self.bullet_index, 'num_whole': self.num_whole,
+            'cur_index': self.cur_index, 'deadline': self.deadline,
+        }
+
+    def restore(self, snapshot:dict):
+        for key, value in snapshot.items():
+            setattr(self, key, value)
 
     def result(self,win_qqid,loser_qqid):
-        self.timer.cancel()
+        self.deadline=None
         height=820
         width=720
         img = Image.new('RGBA', (width, height), (244, 149 ,4, 255))
@@ -231,18 +255,79 @@ class _roulette():
 # 插件类，响应bot事件
 class RoulettePlugin(StandardPlugin):
     def __init__(self) -> None:
-        self.roulette_dict={}
+        self.roulette_dict={} # 只保存进行中的对局, 其余对局按需从数据库加载
+        self.lock=Lock() # 只保护 roulette_dict / pendingDeadlines / groupLocks, 不在持有时做网络或数据库操作
+        self.groupLocks={} # 每个群一把锁, 同一群的消息处理与超时结算互斥, 不同群互不阻塞
+        self.store=GameSessionStore('roulette')
+        self.pendingDeadlines=self.store.loadDeadlines() # 尚未加载到内存的对局
+        self.reconcile()
+        gameTimeoutSweeper.register(self.sweepTimeout)
+    def reconcile(self): # 启动时处理bot离线期间已超时的对局
+        now=time.time()
+        for group_id, deadline in list(self.pendingDeadlines.items()):
+            if deadline!=None and deadline<=now:
+                with self.groupLock(group_id):
+                    roulette=self.getRoulette(group_id)
+                    roulette.refund()
+                    self.persist(group_id, roulette)
+    def groupLock(self, group_id)->Lock:
+        with self.lock:
+            return self.groupLocks.setdefault(group_id, Lock())
+    def getRoulette(self, group_id)->_roulette: # 调用方需持有该群的锁
+        with self.lock:
+            if group_id in self.roulette_dict.keys():
+                return self.roulette_dict[group_id]
+            needLoad = group_id in self.pendingDeadlines.keys()
+            if needLoad:
+                del self.pendingDeadlines[group_id]
+        roulette=_roulette(group_id)
+        if needLoad:
+            snapshot=self.store.load(group_id)
+            if snapshot!=None:
+                roulette.restore(snapshot)
+        with self.lock:
+            self.roulette_dict[group_id]=roulette
+        return roulette
+    def persist(self, group_id, roulette:_roulette): # 同步对局快照, 结束的对局移出内存; 调用方需持有该群的锁
+        if roulette.status=='init':
+            with self.lock:
+                self.roulette_dict.pop(group_id, None)
+            self.store.delete(group_id)
+        else:
+            self.store.save(group_id, roulette.snapshot(), roulette.deadline)
+    def sweepTimeout(self, now:float):
+        with self.lock:
+            expired=[group_id for group_id, deadline in self.pendingDeadlines.items() if deadline!=None and deadline<=now]
+            expired+=[group_id for group_id, roulette in self.roulette_dict.items() if roulette.deadline!=None and roulette.deadline<=now]
+        for group_id in expired:
+            lock=self.groupLock(group_id)
+            if not lock.acquire(blocking=False):
+                continue # 该群正在处理消息, 下一轮再检查
+            try:
+                roulette=self.getRoulette(group_id)
+                if roulette.deadline!=None and roulette.deadline<=now:
+                    roulette.on_timeout()
+                    self.persist(group_id, roulette)
+            finally:
+                lock.release()
     def judgeTrigger(self, msg:str, data:Any) -> bool:
         if data['message_type']!='group': return False
         group_id = data['group_id']
-        if group_id not in self.roulette_dict.keys():
-            self.roulette_dict[group_id] = _roulette(group_id)
-        return startswith_in(msg, CMD_ROULETTE) or \
-            (startswith_in(msg, CMD_ROULETTE_ONGOING) and \
-            self.roulette_dict[group_id].status=='ongoing')
+        if startswith_in(msg, CMD_ROULETTE):
+            return True
+        if not startswith_in(msg, CMD_ROULETTE_ONGOING):
+            return False
+        with self.lock:
+            if group_id not in self.roulette_dict.keys() and group_id not in self.pendingDeadlines.keys():
+                return False
+        with self.groupLock(group_id):
+            return self.getRoulette(group_id).status=='ongoing'
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
         group_id = data['group_id']
-        ret = self.roulette_dict[group_id].get_cmd(data['user_id'],msg)
+        with self.groupLock(group_id):
+            roulette = self.getRoulette(group_id)
+            ret = roulette.get_cmd(data['user_id'],msg)
+            self.persist(group_id, roulette)
         try:
             if ret[-3:]=='png':
                 picPath = ret if os.path.isabs(ret) else os.path.join(ROOT_PATH, ret)
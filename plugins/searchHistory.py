@@ -0,0 +1,81 @@
+from typing import Union, Any, List
+from datetime import datetime
+import time
+import mysql.connector
+from utils.basicEvent import send, warning
+from utils.standardPlugin import StandardPlugin
+from utils.messageParser import parseMessage
+from utils.messageSearch import searchMessages, hasFulltextIndex, SEARCH_MIN_KEYWORD
+SEARCH_HELP = """聊天记录搜索：-search 关键词 [关键词...] [days:天数] [since:2023-01-01] [until:2023-02-01] [page:页码]
+多个关键词需同时出现，每个关键词至少%d个字"""%SEARCH_MIN_KEYWORD
+SEARCH_PREVIEW_LENGTH = 60
+
+def parseDate(text: str)->float:
+    return time.mktime(datetime.strptime(text, '%Y-%m-%d').timetuple())
+
+class SearchHistory(StandardPlugin):
+    def __init__(self) -> None:
+        self.indexReady = False
+    def judgeTrigger(self, msg:str, data:Any) -> bool:
+        return data['message_type']=='group' and (msg == '-search' or msg.startswith('-search '))
+    def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
+        groupId = data['group_id']
+        keywords: List[str] = []
+        filters: List[str] = [] # 翻页时保留的时间条件
+        since, until, page = None, None, 1
+        try:
+            for arg in parseMessage(msg).args[1:]:
+                key, sep, value = arg.partition(':')
+                if sep == '' or key not in ['days', 'since', 'until', 'page']:
+                    keywords.append(arg)
+                elif key == 'page':
+                    page = max(1, int(value))
+                else:
+                    if key == 'days':
+                        since = time.time() - float(value) * 24 * 3600
+                    elif key == 'since':
+                        since = parseDate(value)
+                    else:
+                        until = parseDate(value) + 24 * 3600
+                    filters.append(arg)
+        except ValueError:
+            send(groupId, SEARCH_HELP)
+            return "OK"
+        if len(keywords) == 0 or any(len(k) < SEARCH_MIN_KEYWORD for k in keywords):
+            send(groupId, SEARCH_HELP)
+            return "OK"
+        if not self.indexReady:
+            self.indexReady = hasFulltextIndex()
+            if not self.indexReady:
+                send(groupId, '聊天记录索引尚未建立，请联系管理员运行 python -m utils.messageSearch reindex')
+                return "OK"
+        try:
+            rows, hasMore = searchMessages(groupId, keywords, since, until, page)
+        except mysql.connector.Error as e:
+            warning("mysql error in SearchHistory: {}".format(e))
+            send(groupId, '搜索失败')
+            return "OK"
+        if len(rows) == 0:
+            send(groupId, '[CQ:reply,id=%d]未找到相关聊天记录'%data['message_id'])
+            return "OK"
+        lines = ['「{}」的搜索结果 第{}页：'.format(' '.join(keywords), page)]
+        for _, msgTime, userId, nickname, card, message in rows:
+            text = parseMessage(message).text
+            if len(text) > SEARCH_PREVIEW_LENGTH:
+                text = text[:SEARCH_PREVIEW_LENGTH] + '…'
+            lines.append('[{}] {}：{}'.format(msgTime.strftime('%Y-%m-%d %H:%M'), card if card != '' else nickname, text))
+        if hasMore:
+            lines.append('发送 -search {} page:{} 查看下一页'.format(' '.join(keywords + filters), page + 1))
+        send(groupId, '\n'.join(lines))
+        return "OK"
+    def getPluginInfo(self, )->Any:
+        return {
+            'name': 'SearchHistory',
+            'description': '搜索聊天记录',
+            'commandDescription': '-search 关键词 [days:天数] [page:页码]',
+            'usePlace': ['group', ],
+            'showInHelp': True,
+            'pluginConfigTableNames': ['messageRecord'],
+            'version': '1.0.0',
+            'author': 'Unicorn',
+        }
@@ -3,19 +3,25 @@ import requests
 from utils.basicEvent import *
 from utils.basicConfigs import *
 from utils.standardPlugin import StandardPlugin
+from utils.asyncPlugin import AsyncStandardPlugin, getHttpClient
 import urllib.parse
-class Show2cyPIC(StandardPlugin): 
+import httpx
+class Show2cyPIC(AsyncStandardPlugin): 
     def judgeTrigger(self, msg:str, data:Any) -> bool:
         return msg == '来点图图'
-    def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
+    async def executeEventAsync(self, msg:str, data:Any) -> Union[None, str]:
         target = data['group_id'] if data['message_type']=='group' else data['user_id']
-        req = requests.get(url='https://tenapi.cn/acg',params={'return': 'json'})
+        try:
+            req = await getHttpClient().get('https://tenapi.cn/acg', params={'return': 'json'})
+        except httpx.HTTPError as e:
+            warning("tenapi failed in Show2cyPIC: {}".format(e))
+            return "OK"
         if req.status_code != requests.codes.ok:
             warning("tenapi failed in Show2cyPIC")
             return "OK"
         try:
             pic_url = req.json()['imgurl']
-        except requests.JSONDecodeError as e:
+        except ValueError as e:
             warning("json decode error in Show2cyPIC: {}".format(e))
             return "OK"
         except KeyError as e:
@@ -31,15 +37,15 @@ class Show2cyPIC(StandardPlugin):
             'usePlace': ['group', 'private', ],
             'showInHelp': True,
             'pluginConfigTableNames': [],
-            'version': '1.0.0',
+            'version': '1.1.0',
             'author': 'Unicorn',
         }
-class ShowSePIC(StandardPlugin): 
+class ShowSePIC(AsyncStandardPlugin): 
     def __init__(self) -> None:
         print('注意，开启ShowSePIC插件有被腾讯封号的危险')
     def judgeTrigger(self, msg:str, data:Any) -> bool:
         return startswith_in(msg, ['来点涩涩'])
-    def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
+    async def executeEventAsync(self, msg:str, data:Any) -> Union[None, str]:
         msg_split = msg.split()
         if len(msg_split)==0:
             tag=''
@@ -51,7 +57,7 @@ class ShowSePIC(StandardPlugin):
                 tagText += urllib.parse.quote(t) + '|'
             tagText = tagText[:-1]
             try:
-                req= requests.get(url=f"https://api.lolicon.app/setu/v2?tag={tagText}&r18=0&size=regular",params={'return': 'json'})
+                req = await getHttpClient().get(f"https://api.lolicon.app/setu/v2?tag={tagText}&r18=0&size=regular",params={'return': 'json'})
                 if req.status_code != requests.codes.ok:
                     warning("lolicon API failed in ShowSePIC")
                     return "OK"
@@ -69,6 +75,6 @@ class ShowSePIC(StandardPlugin):
             'usePlace': ['group', 'private', ],
             'showInHelp': True,
             'pluginConfigTableNames': [],
-            'version': '1.0.0',
+            'version': '1.1.0',
             'author': 'Unicorn',
         }
\ No newline at end of file
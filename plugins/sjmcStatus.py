@@ -1,22 +1,37 @@
 from datetime import datetime
-from typing import Union, Any
+from typing import Union, Any, List, Tuple
 from utils.basicEvent import *
 from utils.basicConfigs import *
 from utils.standardPlugin import StandardPlugin
 from PIL import Image, ImageDraw, ImageFont
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock
 import requests
 import base64
 import re
 import uuid
+import time
 from io import BytesIO
 
+SJMC_SERVER_COUNT = 8
+SJMC_REQUEST_TIMEOUT = 3 # 单个服务器状态请求的超时(秒)
+SJMC_STATUS_TTL = 60 # 状态快照的有效期(秒)
+SJMC_REFRESH_INTERVAL = 45 # 后台刷新间隔(秒)
+SJMC_KEEP_WARM = 1800 # 最近一次查询后继续后台刷新的时长(秒)
+
+font_mc_l = ImageFont.truetype(os.path.join(FONTS_PATH, 'Minecraft AE.ttf'), 30)
+font_mc_m = ImageFont.truetype(os.path.join(FONTS_PATH, 'Minecraft AE.ttf'), 20)
+font_mc_s = ImageFont.truetype(os.path.join(FONTS_PATH, 'Minecraft AE.ttf'), 16)
+font_mc_xl = ImageFont.truetype(os.path.join(FONTS_PATH, 'Minecraft AE.ttf'), 39)
+
 class ShowSjmcStatus(StandardPlugin):
     def judgeTrigger(self, msg:str, data:Any) -> bool:
         return msg == '-sjmc'
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
         target = data['group_id'] if data['message_type']=='group' else data['user_id']
-        send(target, '正在获取sjmc状态...', data['message_type'])
-        imgPath = get_sjmc_info()
+        if not sjmcStatusCache.fresh():
+            send(target, '正在获取sjmc状态...', data['message_type'])
+        imgPath = sjmcStatusCache.getImage()
         imgPath = imgPath if os.path.isabs(imgPath) else os.path.join(ROOT_PATH, imgPath)
         send(target, '[CQ:image,file=files://%s,id=40000]'%imgPath, data['message_type'])
         return "OK"
@@ -28,42 +43,95 @@ class ShowSjmcStatus(StandardPlugin):
             'usePlace': ['group', 'private', ],
             'showInHelp': True,
             'pluginConfigTableNames': [],
-            'version': '1.0.0',
+            'version': '1.1.0',
             'author': 'Unicorn',
         }
-def get_sjmc_info():
+
+def fetch_server_status(i: int)->Union[dict, None]:
+    """获取第i个服务器的状态, 远程favicon一并下载为 res['faviconBytes']"""
     url="https://mc.sjtu.cn/wp-admin/admin-ajax.php"
-    dat = []
-    j, j1=0, 0
-    for t in range(8):
-        #try:
-        params={
-            "_ajax_nonce": "0e441f8c8a",
-            "action": "fetch_mcserver_status",
-            "i": str(t),
-        }
+    params={
+        "_ajax_nonce": "0e441f8c8a",
+        "action": "fetch_mcserver_status",
+        "i": str(i),
+    }
+    try:
+        res = requests.get(url, verify=False, params=params, timeout=SJMC_REQUEST_TIMEOUT)
+        if res.status_code!= requests.codes.ok:
+            return None
+        res = res.json()
+        icon_url = res.get('favicon', '')
+        if icon_url[:4]=="http":
+            url_avatar = requests.get(icon_url, timeout=SJMC_REQUEST_TIMEOUT)
+            if url_avatar.status_code == requests.codes.ok:
+                res['faviconBytes'] = url_avatar.content
+        return res
+    except requests.JSONDecodeError as e:
+        warning("sjmc json decode error: {}".format(e))
+    except requests.Timeout as e:
+        print("connection time out")
+    except BaseException as e:
+        warning("sjmc basic exception: {}".format(e))
+    return None
+
+def fetch_sjmc_status()->List[dict]:
+    """并发获取所有服务器的状态, 保持服务器顺序"""
+    with ThreadPoolExecutor(max_workers=SJMC_SERVER_COUNT) as executor:
+        results = executor.map(fetch_server_status, range(SJMC_SERVER_COUNT))
+    return [res for res in results if res != None]
+
+class SjmcStatusCache():
+    """sjmc状态快照与渲染结果的缓存, 有人查询后由后台线程保持刷新"""
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.snapshotTime = 0.0
+        self.imgPath: Union[str, None] = None
+        self.lastQuery = 0.0
+        self.refresher: Union[Thread, None] = None
+
+    def fresh(self)->bool:
+        return self.imgPath != None and time.time() - self.snapshotTime < SJMC_STATUS_TTL
+
+    def refresh(self, force: bool=False)->str:
+        with self.lock:
+            if not force and self.fresh():
+                return self.imgPath
+            dat = fetch_sjmc_status()
+            self.imgPath = draw_sjmc_info(dat)
+            self.snapshotTime = time.time()
+            return self.imgPath
+
+    def getImage(self)->str:
+        self.lastQuery = time.time()
+        if self.refresher == None or not self.refresher.is_alive():
+            self.refresher = Thread(target=self._refreshLoop, daemon=True)
+            self.refresher.start()
+        if self.fresh():
+            return self.imgPath
+        return self.refresh()
+
+    def _refreshLoop(self)->None:
+        while time.time() - self.lastQuery < SJMC_KEEP_WARM:
+            time.sleep(SJMC_REFRESH_INTERVAL)
+            try:
+                self.refresh(force=True)
+            except BaseException as e:
+                warning("sjmc refresh exception: {}".format(e))
+
+sjmcStatusCache = SjmcStatusCache()
+
+def get_sjmc_info():
+    return draw_sjmc_info(fetch_sjmc_status())
+
+def draw_sjmc_info(dat: List[dict])->str:
+    j, j1 = 0, 0
+    for res in dat:
         try:
-            res = requests.get(url, verify=False, params=params)
-            if res.status_code!= requests.codes.ok:
-                continue
-            res = res.json()
             if res['online'] and res['players']['online']!=0:
                 j+=1
-            dat.append(res)
-        except requests.JSONDecodeError as e:
-            warning("sjmc json decode error: {}".format(e))
-        except requests.Timeout as e:
-            print("connection time out")
         except KeyError as e:
             warning("key error in sjmc: {}".format(e))
-        except BaseException as e:
-            warning("sjmc basic exception: {}".format(e))
-    FONTS_PATH = 'resources/fonts'
     white, grey, green, red = (255,255,255,255),(128,128,128,255),(0,255,33,255),(255,85,85,255)
-    font_mc_l = ImageFont.truetype(os.path.join(FONTS_PATH, 'Minecraft AE.ttf'), 30)
-    font_mc_m = ImageFont.truetype(os.path.join(FONTS_PATH, 'Minecraft AE.ttf'), 20)
-    font_mc_s = ImageFont.truetype(os.path.join(FONTS_PATH, 'Minecraft AE.ttf'), 16)
-    font_mc_xl = ImageFont.truetype(os.path.join(FONTS_PATH, 'Minecraft AE.ttf'), 39)
     width=860
     height=215+len(dat)*140+j*35
     img = Image.new('RGBA', (width, height), (46, 33, 23, 255))
@@ -91,16 +159,14 @@ def get_sjmc_info():
         # cop = re.compile("[^\u4e00-\u9fa5^a-z^A-Z^0-9^|^\ ^-]") # 正则筛选
         # title = cop.sub("", title)
 
-        icon_url = res['favicon']
+        icon_url = res.get('favicon', '')
+        img_avatar = None
         if icon_url[:4]=="data":
             img_avatar = Image.open(decode_image(icon_url)).resize((80,80))
-        else:
-            url_avatar = requests.get(icon_url)
-            if url_avatar.status_code != requests.codes.ok:
-                img_avatar = None
-            else:
-                img_avatar = Image.open(BytesIO(url_avatar.content)).resize((80,80))
-        img.paste(img_avatar, (60, fy))
+        elif 'faviconBytes' in res.keys():
+            img_avatar = Image.open(BytesIO(res['faviconBytes'])).resize((80,80))
+        if img_avatar != None:
+            img.paste(img_avatar, (60, fy))
         new_title=""
         m=0
         while True:
@@ -7,14 +7,12 @@ from utils.accountOperation import get_user_coins, update_user_coins
 from utils.basicConfigs import sqlConfig
 import mysql.connector
 from pymysql.converters import escape_string
-from utils.ashareAPI import get_price
+from utils.quoteCache import get_price_cached, get_quotes, normalizeCode
+from utils.stockIndex import stockSymbolIndex
+from utils.messageParser import parseMessage
 
 def queryStocks(stock: str)->str:
-    stock = escape_string(stock)
-    mydb = mysql.connector.connect(**sqlConfig)
-    mycursor = mydb.cursor()
-    mycursor.execute("""select ashareCode, name, fullName, industry from STOCKS.stockCode where regexp_like(name, '%s') or regexp_like(fullName, '%s') or regexp_like(ashareCode, '%s')"""%(stock, stock, stock))
-    results = list(mycursor)
+    results = stockSymbolIndex.search(stock)
     resultText = ""
     for r in results[:5]:
         ashareCode, name, fullName, industry = r
@@ -22,14 +20,20 @@ def queryStocks(stock: str)->str:
     resultText += f'共 {len(results)} 条结果'
     return resultText
 def verifyStocksCode(stockCode: str)->bool:
-    stockCode = escape_string(stockCode)
-    mydb = mysql.connector.connect(**sqlConfig)
-    mycursor = mydb.cursor()
-    mycursor.execute("""select count(*) from STOCKS.stockCode where ashareCode='%s'"""%(stockCode))
-    result = list(mycursor)
-    if len(result) < 1:
-        return False
-    return result[0][0] == 1
+    return stockSymbolIndex.getByCode(stockCode) != None
+def formatStockPrice(stockCode: str)->str:
+    """实时报价与最近3根15分钟K线"""
+    text = ''
+    stockCode = normalizeCode(stockCode)
+    quote = get_quotes([stockCode]).get(stockCode)
+    if quote != None:
+        text += '\n%s 现价 %.2f (%+.2f%%)'%(quote['name'], quote['price'], quote['changePercent'])
+    bars = get_price_cached(stockCode, count=3, frequency='15m')
+    text += '\n\n时间 | 开 | 收 | 高 | 低 | 量'
+    for i in range(len(bars['time'])):
+        text += '\n%s | %.2f | %.2f | %.2f | %.2f | %d'%(bars['time'][i], bars['open'][i],
+            bars['close'][i], bars['high'][i], bars['low'][i], bars['volume'][i])
+    return text
     
 class QueryStocksHelper(StandardPlugin): # 查询股票的帮助
     def judgeTrigger(self, msg:str, data:Any) -> bool:
@@ -41,6 +45,7 @@ class QueryStocksHelper(StandardPlugin): # 查询股票的帮助
         text += '\narg1: $想要查询的股票信息'
         text += '\neg: 查股票 sz300059'
         text += '\neg: 查股票 武汉'
+        text += '\neg: 查股票 dfcf (拼音首字母)'
         text += '\n\n注意: 已添加sql转义,不要做无意义的尝试'
         send(target, text, data['message_type'])
         return "OK"
@@ -61,7 +66,7 @@ class QueryStocks(StandardPlugin): # 查询股票
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
         target = data['group_id'] if data['message_type']=='group' else data['user_id']
         text =  '[CQ:reply,id='+str(data['message_id'])+']'
-        stock = msg.split(' ')
+        stock = parseMessage(msg).args
         if len(stock) < 2:
             text += '参数错误,请输入`查股票帮助`获取格式信息'
         else:
@@ -110,7 +115,7 @@ class QueryStocksPrice(StandardPlugin): # 查股价格
         return msg.startswith("查股价") or msg.startswith("查询股价") or msg.startswith("股价查询") or msg.startswith("-buystocks")
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
         target = data['group_id'] if data['message_type']=='group' else data['user_id']
-        msg = msg.split(' ')
+        msg = parseMessage(msg).args
         text = f'[CQ:reply,id={str(data["message_id"])}]'
         if len(msg) < 2:
             text += '参数错误,请输入`查股价帮助`获取格式信息'
@@ -119,8 +124,11 @@ class QueryStocksPrice(StandardPlugin): # 查股价格
             if not verifyStocksCode(stockCode):
                 text += "股票代码错误,请先查询正确的股票代码"
             else:
-                priceData = get_price(stockCode, frequency='15m', count=3)
-                text += '\n\n' + str(priceData)
+                try:
+                    text += formatStockPrice(stockCode)
+                except BaseException as e:
+                    warning("error in QueryStocksPrice: {}".format(e))
+                    text += "行情获取失败,请稍后再试"
         send(target, text, data['message_type'])
         return "OK"
     def getPluginInfo(self, )->Any:
@@ -165,7 +173,7 @@ class BuyStocks(StandardPlugin): # 买股票
     def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
         target = data['group_id'] if data['message_type']=='group' else data['user_id']
         text = f'[CQ:reply,id={data["message_id"]}]'
-        msg = msg.split(' ')
+        msg = parseMessage(msg).args
         if len(msg) < 3:
             text += '参数错误,请输入`买股票帮助`获取格式信息'
         else:
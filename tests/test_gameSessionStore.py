@@ -0,0 +1,68 @@
+"""
+对局快照分片测试: 多进程模式下每个群的未结束对局只由所属 worker 恢复与结算
+用法 (需在仓库根目录运行):
+    python -m unittest tests.test_gameSessionStore
+"""
+import time, unittest
+from unittest import mock
+from typing import Dict, List, Tuple
+from utils import workerPool
+from utils.gameSessionStore import GameSessionStore
+
+class FakeCursor():
+    def __init__(self, rows: List[Tuple]) -> None:
+        self.rows = rows
+    def execute(self, sql: str, params: tuple=())->None:
+        pass
+    def __iter__(self):
+        return iter(self.rows)
+
+class FakeConnection():
+    def __init__(self, rows: List[Tuple]) -> None:
+        self.rows = rows
+        self.autocommit = False
+    def cursor(self)->FakeCursor:
+        return FakeCursor(self.rows)
+
+class TestLoadDeadlinesSharding(unittest.TestCase):
+    def setUp(self):
+        now = time.time()
+        # 奇数群已在离线期间超时, 偶数群仍在计时, 100006 没有计时
+        self.rows = [(groupId, now - 10 if groupId % 2 else now + 60) for groupId in range(100001, 100006)]
+        self.rows.append((100006, None))
+        patcher = mock.patch('utils.gameSessionStore.mysql.connector.connect',
+                             side_effect=lambda **kwargs: FakeConnection(self.rows))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, workerPool, '_shard', workerPool._shard)
+        self.addCleanup(setattr, workerPool, '_shardCount', workerPool._shardCount)
+
+    def loadAs(self, shard, count: int)->Dict[int, float]:
+        workerPool._shard, workerPool._shardCount = shard, count
+        return GameSessionStore('roulette').loadDeadlines()
+
+    def test_single_process_loads_all(self):
+        self.assertEqual(sorted(self.loadAs(None, 1).keys()), [groupId for groupId, _ in self.rows])
+
+    def test_two_shards_partition_groups(self):
+        shards = [self.loadAs(shard, 2) for shard in range(2)]
+        for shard, deadlines in enumerate(shards):
+            for groupId in deadlines.keys():
+                self.assertEqual(workerPool.shardOf({'group_id': groupId}, 2), shard)
+        self.assertEqual(sorted(list(shards[0].keys()) + list(shards[1].keys())),
+                         [groupId for groupId, _ in self.rows])
+
+    def test_expired_sessions_settled_once(self):
+        # 模拟各 worker 启动时的离线超时结算 (RoulettePlugin.reconcile / GoBangPlugin.__init__)
+        now = time.time()
+        settled: Dict[int, int] = {}
+        for shard in range(2):
+            for groupId, deadline in self.loadAs(shard, 2).items():
+                if deadline != None and deadline <= now:
+                    settled[groupId] = settled.get(groupId, 0) + 1
+        expired = [groupId for groupId, deadline in self.rows if deadline != None and deadline <= now]
+        self.assertEqual(sorted(settled.keys()), expired)
+        self.assertTrue(all(count == 1 for count in settled.values()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+五子棋规则测试: 五连、长连与黑棋禁手 (双三、双四、长连)
+用法 (需在仓库根目录运行):
+    python -m unittest tests.test_goBangGame
+"""
+import unittest
+from typing import List, Tuple
+from utils.goBangGame import GoBangGame, GoBangPiece, posToBit
+
+def makeGame(black: List[Tuple], white: List[Tuple]=[], forbidRule: bool=True,
+             currentPiece: GoBangPiece=GoBangPiece.BLACK)->GoBangGame:
+    """直接在位棋盘上摆出局面, 不经过 act 的轮流落子与禁手检查"""
+    game = GoBangGame(forbidRule)
+    for pos in black:
+        game.bitboards[GoBangPiece.BLACK] |= 1 << posToBit(pos)
+    for pos in white:
+        game.bitboards[GoBangPiece.WHITE] |= 1 << posToBit(pos)
+    game.currentPiece = currentPiece
+    return game
+
+class TestFive(unittest.TestCase):
+    def test_horizontal_five(self):
+        game = makeGame([(8, 4), (8, 5), (8, 6), (8, 7)], forbidRule=False)
+        self.assertTrue(game.act((8, 8)))
+        self.assertTrue(game.done())
+
+    def test_diagonal_five(self):
+        game = makeGame([(4, 12), (5, 11), (6, 10), (7, 9)], forbidRule=False)
+        self.assertTrue(game.act((8, 8)))
+        self.assertTrue(game.done())
+
+    def test_four_is_not_five(self):
+        game = makeGame([(8, 5), (8, 6), (8, 7)], forbidRule=False)
+        self.assertTrue(game.act((8, 8)))
+        self.assertFalse(game.done())
+
+    def test_no_wrap_across_rows(self):
+        # 行尾与下一行行首的棋子不能连成五子
+        game = makeGame([(7, 14), (7, 15), (8, 0), (8, 1)], forbidRule=False)
+        self.assertTrue(game.act((7, 16)))
+        self.assertFalse(game.done())
+
+    def test_undo_clears_done(self):
+        game = makeGame([(8, 4), (8, 5), (8, 6), (8, 7)], forbidRule=False)
+        game.act((8, 8))
+        self.assertTrue(game.undo())
+        self.assertFalse(game.done())
+        self.assertEqual(game.getPiece((8, 8)), GoBangPiece.NOTHING)
+        self.assertEqual(game.currentPiece, GoBangPiece.BLACK)
+
+class TestOverline(unittest.TestCase):
+    black = [(8, 3), (8, 4), (8, 5), (8, 7), (8, 8)]
+
+    def test_overline_wins_without_forbid_rule(self):
+        game = makeGame(self.black, forbidRule=False)
+        self.assertTrue(game.act((8, 6)))
+        self.assertTrue(game.done())
+
+    def test_overline_forbidden_for_black(self):
+        game = makeGame(self.black)
+        self.assertTrue(game.checkForbid(GoBangPiece.BLACK, (8, 6)))
+        self.assertFalse(game.act((8, 6)))
+        self.assertEqual(game.getPiece((8, 6)), GoBangPiece.NOTHING)
+        self.assertNotIn((8, 6), game.legalMoves())
+
+    def test_overline_wins_for_white(self):
+        game = makeGame([], self.black, currentPiece=GoBangPiece.WHITE)
+        self.assertFalse(game.checkForbid(GoBangPiece.WHITE, (8, 6)))
+        self.assertTrue(game.act((8, 6)))
+        self.assertTrue(game.done())
+
+class TestForbid(unittest.TestCase):
+    def test_double_three(self):
+        game = makeGame([(8, 6), (8, 7), (6, 8), (7, 8)])
+        self.assertTrue(game.checkForbid(GoBangPiece.BLACK, (8, 8)))
+        self.assertFalse(game.act((8, 8)))
+
+    def test_single_three_allowed(self):
+        game = makeGame([(8, 6), (8, 7)])
+        self.assertFalse(game.checkForbid(GoBangPiece.BLACK, (8, 8)))
+
+    def test_blocked_three_not_counted(self):
+        # 横向的三被白棋挡住一端, 只剩一个活三
+        game = makeGame([(8, 6), (8, 7), (6, 8), (7, 8)], [(8, 5), (8, 9)])
+        self.assertFalse(game.checkForbid(GoBangPiece.BLACK, (8, 8)))
+
+    def test_double_four(self):
+        game = makeGame([(8, 5), (8, 6), (8, 7), (5, 8), (6, 8), (7, 8)])
+        self.assertTrue(game.checkForbid(GoBangPiece.BLACK, (8, 8)))
+        self.assertFalse(game.act((8, 8)))
+
+    def test_double_four_on_one_line(self):
+        # X_X?X_X: 两侧的空位补上任意一个都成五
+        game = makeGame([(8, 2), (8, 4), (8, 6), (8, 8)])
+        self.assertTrue(game.checkForbid(GoBangPiece.BLACK, (8, 5)))
+
+    def test_four_three_allowed(self):
+        game = makeGame([(8, 5), (8, 6), (8, 7), (6, 8), (7, 8)])
+        self.assertFalse(game.checkForbid(GoBangPiece.BLACK, (8, 8)))
+        self.assertTrue(game.act((8, 8)))
+
+    def test_five_overrides_forbid(self):
+        # 成五的同时形成双四也不算禁手
+        game = makeGame([(8, 4), (8, 5), (8, 6), (8, 7), (5, 8), (6, 8), (7, 8)])
+        self.assertFalse(game.checkForbid(GoBangPiece.BLACK, (8, 8)))
+        self.assertTrue(game.act((8, 8)))
+        self.assertTrue(game.done())
+
+    def test_forbid_only_applies_to_black(self):
+        game = makeGame([], [(8, 6), (8, 7), (6, 8), (7, 8)], currentPiece=GoBangPiece.WHITE)
+        self.assertFalse(game.checkForbid(GoBangPiece.WHITE, (8, 8)))
+        self.assertTrue(game.act((8, 8)))
+
+if __name__ == '__main__':
+    unittest.main()
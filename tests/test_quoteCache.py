@@ -0,0 +1,199 @@
+"""
+行情缓存测试: 在本地启动新浪/腾讯接口的桩服务, 检查缓存、批量请求与并发合并
+用法 (需在仓库根目录运行):
+    python -m unittest tests.test_quoteCache
+"""
+import json, time, threading, unittest
+from unittest import mock
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, List
+from utils import quoteCache
+
+def txQuoteLine(code: str, name: str, price: float)->str:
+    fields = ['0'] * 35
+    fields[0], fields[1], fields[2] = '51', name, code[2:]
+    fields[3], fields[4], fields[5], fields[6] = str(price), str(price - 1), str(price - 0.5), '1000'
+    fields[30], fields[31], fields[32] = '20230103150000', '1.00', '5.00'
+    fields[33], fields[34] = str(price + 1), str(price - 2)
+    return 'v_%s="%s";\n'%(code, '~'.join(fields))
+
+class QuoteStub(BaseHTTPRequestHandler):
+    """新浪/腾讯行情接口桩, 记录收到的请求"""
+    requests: List[str] = []
+    lock = threading.Lock()
+    delay = 0.0
+    sinaDown = False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        with QuoteStub.lock:
+            QuoteStub.requests.append(self.path)
+        time.sleep(QuoteStub.delay)
+        if url.path.startswith('/q='):
+            codes = url.path[len('/q='):].split(',')
+            body = ''.join(txQuoteLine(code, 'stock' + code[2:], 10.0) for code in codes).encode('gbk')
+        elif url.path == '/sina':
+            if QuoteStub.sinaDown:
+                self.send_response(502)
+                self.end_headers()
+                return
+            count = int(parse_qs(url.query)['datalen'][0])
+            body = json.dumps([{'day': '2023-01-03 %02d:00:00'%(9 + i), 'open': '10.0', 'close': '10.5',
+                'high': '11.0', 'low': '9.5', 'volume': '100'} for i in range(count)]).encode()
+        elif url.path == '/tx/mkline':
+            code, unit, _, count = parse_qs(url.query)['param'][0].split(',')
+            bars = [['2023010309%02d'%i, '10.0', '10.5', '11.0', '9.5', '100'] for i in range(int(count))]
+            body = json.dumps({'data': {code: {unit: bars}}}).encode()
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class QuoteCacheTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), QuoteStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        base = 'http://127.0.0.1:%d'%cls.server.server_port
+        cls.urls = (quoteCache.SINA_KLINE_URL, quoteCache.TX_MIN_KLINE_URL, quoteCache.TX_QUOTE_URL)
+        quoteCache.SINA_KLINE_URL = base + '/sina'
+        quoteCache.TX_MIN_KLINE_URL = base + '/tx/mkline'
+        quoteCache.TX_QUOTE_URL = base + '/q='
+
+    @classmethod
+    def tearDownClass(cls):
+        quoteCache.SINA_KLINE_URL, quoteCache.TX_MIN_KLINE_URL, quoteCache.TX_QUOTE_URL = cls.urls
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        quoteCache._klineCache = quoteCache.CoalescingCache()
+        quoteCache._quoteCache = quoteCache.CoalescingCache()
+        QuoteStub.requests = []
+        QuoteStub.delay = 0.0
+        QuoteStub.sinaDown = False
+
+class TestQuotes(QuoteCacheTestCase):
+    def test_normalize_code(self):
+        self.assertEqual(quoteCache.normalizeCode('SZ300059'), 'sz300059')
+        self.assertEqual(quoteCache.normalizeCode(' sh600000 '), 'sh600000')
+        self.assertEqual(quoteCache.normalizeCode('000001.XSHG'), 'sh000001')
+        self.assertEqual(quoteCache.normalizeCode('000001.XSHE'), 'sz000001')
+
+    def test_batch_in_one_request(self):
+        quotes = quoteCache.get_quotes(['sz300059', 'sh600000', '000001.XSHE'])
+        self.assertEqual(sorted(quotes.keys()), ['sh600000', 'sz000001', 'sz300059'])
+        self.assertEqual(quotes['sz300059']['name'], 'stock300059')
+        self.assertEqual(quotes['sz300059']['price'], 10.0)
+        self.assertEqual(quotes['sz300059']['changePercent'], 5.0)
+        self.assertEqual(len(QuoteStub.requests), 1)
+
+    def test_keyed_by_normalized_code(self):
+        quotes = quoteCache.get_quotes(['SZ300059'])
+        self.assertIn(quoteCache.normalizeCode('SZ300059'), quotes)
+
+    def test_cached_quotes_not_refetched(self):
+        quoteCache.get_quotes(['sz300059'])
+        quotes = quoteCache.get_quotes(['sz300059', 'sh600000'])
+        self.assertEqual(sorted(quotes.keys()), ['sh600000', 'sz300059'])
+        self.assertEqual(len(QuoteStub.requests), 2)
+        self.assertEqual(QuoteStub.requests[1], '/q=sh600000')
+        quoteCache.get_quotes(['sh600000', 'sz300059'])
+        self.assertEqual(len(QuoteStub.requests), 2)
+
+    def test_quote_expires(self):
+        ttl = quoteCache.QUOTE_TTL
+        quoteCache.QUOTE_TTL = 0.1
+        try:
+            quoteCache.get_quotes(['sz300059'])
+            time.sleep(0.2)
+            quoteCache.get_quotes(['sz300059'])
+        finally:
+            quoteCache.QUOTE_TTL = ttl
+        self.assertEqual(len(QuoteStub.requests), 2)
+
+    def test_upstream_error_returns_cached_part(self):
+        quoteCache.get_quotes(['sz300059'])
+        url = quoteCache.TX_QUOTE_URL
+        quoteCache.TX_QUOTE_URL = 'http://127.0.0.1:1/q=' # 连接被拒绝
+        try:
+            quotes = quoteCache.get_quotes(['sz300059', 'sh600000'])
+        finally:
+            quoteCache.TX_QUOTE_URL = url
+        self.assertEqual(list(quotes.keys()), ['sz300059'])
+
+class TestKline(QuoteCacheTestCase):
+    def test_kline_cached(self):
+        bars = quoteCache.get_price_cached('SZ300059', count=3, frequency='15m')
+        self.assertEqual(len(bars['time']), 3)
+        self.assertEqual(bars['close'], [10.5, 10.5, 10.5])
+        quoteCache.get_price_cached('sz300059', count=3, frequency='15m')
+        self.assertEqual(len(QuoteStub.requests), 1)
+        self.assertTrue(QuoteStub.requests[0].startswith('/sina'))
+
+    def test_concurrent_misses_coalesced(self):
+        QuoteStub.delay = 0.2
+        results: Dict[int, dict] = {}
+        def worker(i: int):
+            results[i] = quoteCache.get_price_cached('sz300059', count=5, frequency='1d')
+        threads = [threading.Thread(target=worker, args=(i, )) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result is results[0] for result in results.values()))
+        self.assertEqual(len(QuoteStub.requests), 1)
+
+    def test_fallback_to_tx(self):
+        QuoteStub.sinaDown = True
+        bars = quoteCache.get_price_cached('sz300059', count=4, frequency='15m')
+        self.assertEqual(len(bars['time']), 4)
+        self.assertEqual([path.split('?')[0] for path in QuoteStub.requests], ['/sina', '/tx/mkline'])
+
+    def test_one_minute_uses_tx(self):
+        quoteCache.get_price_cached('sz300059', count=2, frequency='1m')
+        self.assertEqual([path.split('?')[0] for path in QuoteStub.requests], ['/tx/mkline'])
+
+class TestNextBarTime(unittest.TestCase):
+    def nextBar(self, frequency: str, clock: str)->str:
+        """@clock: 北京时间 'HH:MM', 返回下一根K线结束的北京时间 ('+1 ' 表示次日)"""
+        hour, minute = map(int, clock.split(':'))
+        day = 19000 * 86400 # 某日北京时间零点对应的UTC时间戳 + 8小时
+        now = day - quoteCache.BEIJING_UTC_OFFSET + hour * 3600 + minute * 60 + 30
+        with mock.patch.object(quoteCache.time, 'time', return_value=now):
+            expire = quoteCache._nextBarTime(frequency)
+        offset = int(expire + quoteCache.BEIJING_UTC_OFFSET - day)
+        prefix = '+1 ' if offset >= 86400 else ''
+        offset %= 86400
+        return prefix + '%02d:%02d'%(offset // 3600, offset % 3600 // 60)
+
+    def test_hourly_bars_follow_sessions(self):
+        self.assertEqual(self.nextBar('60m', '10:05'), '10:30')
+        self.assertEqual(self.nextBar('60m', '10:45'), '11:30')
+        self.assertEqual(self.nextBar('60m', '13:10'), '14:00')
+        self.assertEqual(self.nextBar('60m', '14:20'), '15:00')
+
+    def test_lunch_break_and_after_close(self):
+        self.assertEqual(self.nextBar('30m', '11:40'), '13:30')
+        self.assertEqual(self.nextBar('15m', '08:00'), '09:45')
+        self.assertEqual(self.nextBar('60m', '15:30'), '+1 10:30')
+
+    def test_minute_bars(self):
+        self.assertEqual(self.nextBar('15m', '09:46'), '10:00')
+        self.assertEqual(self.nextBar('1m', '14:59'), '15:00')
+
+    def test_daily_ttl(self):
+        now = time.time()
+        self.assertAlmostEqual(quoteCache._nextBarTime('1d'), now + quoteCache.DAY_KLINE_TTL, delta=1)
+
+if __name__ == '__main__':
+    unittest.main()
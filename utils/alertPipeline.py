@@ -0,0 +1,126 @@
+import os, re, sys, time, logging, traceback
+from logging.handlers import RotatingFileHandler
+from threading import Thread, Lock, Event
+from typing import Dict, List, Tuple, Union, Any, Callable
+"""
+管理员告警管道 (utils.basicEvent.warning 的后端)
+- 按 出错位置 + 异常类型 + 告警文本 计算指纹, 同一指纹在窗口期内只计数
+- 后台线程定期把各指纹的计数汇总成一条摘要发给管理员, warning() 本身不再阻塞
+- 每条告警都会立即写入本地日志文件, 作为持久记录
+"""
+
+class AlertRecord():
+    def __init__(self, what: str, stack: str, location: str) -> None:
+        self.what = what
+        self.stack = stack
+        self.location = location
+        self.pending = 0     # 上次发送后新增的次数
+        self.total = 0
+        self.firstTime = time.time()
+        self.lastTime = self.firstTime
+        self.lastSent = 0.0
+
+class AlertPipeline():
+    """
+    @sendFunc:      发送摘要的函数, 参数为摘要文本
+    @logPath:       本地日志路径
+    @window:        同一指纹两次发送的最小间隔(秒)
+    @flushInterval: 后台线程检查的间隔(秒)
+    @maxRecords:    最多保留的指纹数, 超出后淘汰最久未出现的
+    """
+    def __init__(self, sendFunc: Callable[[str], None], logPath: str, window: float=600,
+                 flushInterval: float=10, maxRecords: int=512) -> None:
+        self.sendFunc = sendFunc
+        self.window = window
+        self.flushInterval = flushInterval
+        self.maxRecords = maxRecords
+        self.records: Dict[str, AlertRecord] = {}
+        self.lock = Lock()
+        self.wakeUp = Event()
+        self.thread: Union[Thread, None] = None
+        self.logger = logging.getLogger('unikeen.alert')
+        self.logger.propagate = False
+        if len(self.logger.handlers) == 0:
+            try:
+                os.makedirs(os.path.dirname(logPath), exist_ok=True)
+                handler = RotatingFileHandler(logPath, maxBytes=8*1024*1024, backupCount=5, encoding='utf-8', delay=True) # 第一次写入时才创建文件
+            except OSError:
+                handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+
+    @staticmethod
+    def fingerprint(what: str, excInfo: Tuple)->Tuple[str, str]:
+        """返回 (指纹, 出错位置)"""
+        excType, _, tb = excInfo
+        if tb != None:
+            frame = traceback.extract_tb(tb)[-1]
+            location = '%s:%d'%(os.path.basename(frame.filename), frame.lineno)
+        else:
+            # 没有正在处理的异常时, 用调用warning的位置
+            frame = traceback.extract_stack(limit=4)[0]
+            location = '%s:%d'%(os.path.basename(frame.filename), frame.lineno)
+        # 去掉文本中的数字, 避免群号/时间等让同一个错误变成不同的指纹
+        text = re.sub(r'\d+', '#', what.split('\n', 1)[0])[:120]
+        typeName = excType.__name__ if excType != None else '-'
+        return '%s|%s|%s'%(location, typeName, text), location
+
+    def report(self, what: str)->None:
+        excInfo = sys.exc_info()
+        stack = traceback.format_exc() if excInfo[0] != None else ''
+        key, location = self.fingerprint(what, excInfo)
+        self.logger.info('[warning] %s\n[location] %s\n%s', what, location, stack)
+        with self.lock:
+            record = self.records.get(key)
+            if record == None:
+                if len(self.records) >= self.maxRecords:
+                    oldest = min(self.records.items(), key=lambda x: x[1].lastTime)[0]
+                    del self.records[oldest]
+                record = self.records[key] = AlertRecord(what, stack, location)
+                self.wakeUp.set() # 新的错误尽快发出
+            record.pending += 1
+            record.total += 1
+            record.lastTime = time.time()
+            self._ensureThread()
+
+    def _ensureThread(self)->None:
+        if self.thread == None or not self.thread.is_alive():
+            self.thread = Thread(target=self._worker, daemon=True)
+            self.thread.start()
+
+    def _worker(self)->None:
+        while True:
+            self.wakeUp.wait(self.flushInterval)
+            self.wakeUp.clear()
+            try:
+                self.flush()
+            except BaseException as e:
+                self.logger.info('[alert] flush failed: %s', e)
+
+    def collect(self, now: float)->List[Tuple[AlertRecord, int]]:
+        """取出到期需要发送的指纹, 并重置其计数"""
+        due = []
+        with self.lock:
+            for record in self.records.values():
+                if record.pending > 0 and now - record.lastSent >= self.window:
+                    due.append((record, record.pending))
+                    record.pending = 0
+                    record.lastSent = now
+        return due
+
+    def flush(self)->None:
+        due = self.collect(time.time())
+        if len(due) == 0:
+            return
+        parts = []
+        for record, count in due:
+            text = '[warning] x%d (total %d)\n%s\n[location] %s'%(count, record.total, record.what, record.location)
+            if count == record.total and record.stack:
+                # 首次发送时附带完整堆栈
+                text += '\n' + record.stack
+            parts.append(text)
+        try:
+            self.sendFunc('\n\n'.join(parts))
+        except BaseException as e:
+            self.logger.info('[alert] send failed: %s', e)
@@ -1,8 +1,9 @@
 #-*- coding:utf-8 -*-    --------------Ashare 股票行情数据双核心版( https://github.com/mpquant/Ashare ) 
-import json,requests,datetime;      import pandas as pd  #
+import json,requests,datetime                                 #pandas 在函数内按需导入, 避免导入本模块时就加载pandas
 
 #腾讯日线
 def get_price_day_tx(code, end_date='', count=10, frequency='1d'):     #日线获取  
+    import pandas as pd
     unit='week' if frequency in '1w' else 'month' if frequency in '1M' else 'day'     #判断日线，周线，月线
     if end_date:  end_date=end_date.strftime('%Y-%m-%d') if isinstance(end_date,datetime.date) else end_date.split(' ')[0]
     end_date='' if end_date==datetime.datetime.now().strftime('%Y-%m-%d') else end_date   #如果日期今天就变成空    
@@ -15,6 +16,7 @@ def get_price_day_tx(code, end_date='', count=10, frequency='1d'):     #日线
 
 #腾讯分钟线
 def get_price_min_tx(code, end_date=None, count=10, frequency='1d'):    #分钟线获取 
+    import pandas as pd
     ts=int(frequency[:-1]) if frequency[:-1].isdigit() else 1           #解析K线周期数
     if end_date: end_date=end_date.strftime('%Y-%m-%d') if isinstance(end_date,datetime.date) else end_date.split(' ')[0]        
     URL=f'http://ifzq.gtimg.cn/appstock/app/kline/mkline?param={code},m{ts},,{count}' 
@@ -29,6 +31,7 @@ def get_price_min_tx(code, end_date=None, count=10, frequency='1d'):    #分钟
 
 #sina新浪全周期获取函数，分钟线 5m,15m,30m,60m  日线1d=240m   周线1w=1200m  1月=7200m
 def get_price_sina(code, end_date='', count=10, frequency='60m'):    #新浪全周期获取函数    
+    import pandas as pd
     frequency=frequency.replace('1d','240m').replace('1w','1200m').replace('1M','7200m');   mcount=count
     ts=int(frequency[:-1]) if frequency[:-1].isdigit() else 1       #解析K线周期数
     if (end_date!='') & (frequency in ['240m','1200m','7200m']): 
@@ -0,0 +1,179 @@
+import asyncio
+from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock
+from typing import Union, Any, List, Tuple, Callable
+from utils.standardPlugin import StandardPlugin, TriggerMatch
+from utils.basicEvent import warning
+from utils.basicConfigs import sqlConfig, ASYNC_SYNC_WORKERS, ASYNC_MYSQL_POOL_SIZE
+from utils.pluginMetrics import pluginMetrics
+from utils.messageParser import parseMessage
+"""
+asyncio 插件接口与异步分发
+- 所有异步插件共用一个常驻事件循环 (getLoop), 以及其上的 httpx.AsyncClient 与 aiomysql 连接池
+- AsyncStandardPlugin: judgeTrigger 仍为同步 (只允许做字符串判断等轻量操作), 执行逻辑写在 executeEventAsync 中
+  同步的 executeEvent 会把协程提交到事件循环并等待, 因此异步插件也可以放进原有的插件列表和 PluginGroupManager
+- AsyncDispatcher: 在事件循环中分发事件, 异步插件直接 await, 连续的同步插件打包交给线程池执行,
+  在途请求只占用协程而不是线程; 插件组中匹配到的是异步插件时, 匹配在线程池中完成, 执行回到事件循环中 await
+"""
+
+_loop: Union[asyncio.AbstractEventLoop, None] = None
+_loopLock = Lock()
+_httpClient = None
+_mysqlPool = None
+
+def getLoop()->asyncio.AbstractEventLoop:
+    """获取共享事件循环, 首次调用时在后台线程中启动"""
+    global _loop
+    with _loopLock:
+        if _loop == None:
+            _loop = asyncio.new_event_loop()
+            Thread(target=_loop.run_forever, daemon=True).start()
+        return _loop
+
+def getHttpClient():
+    """共享的 httpx.AsyncClient, 只能在共享事件循环中使用"""
+    global _httpClient
+    if _httpClient == None:
+        import httpx
+        _httpClient = httpx.AsyncClient(timeout=15, follow_redirects=True,
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50))
+    return _httpClient
+
+async def getMysqlPool():
+    """共享的 aiomysql 连接池, 只能在共享事件循环中使用
+    用法:
+        pool = await getMysqlPool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("select ...", (arg, ))
+    """
+    global _mysqlPool
+    if _mysqlPool == None:
+        import aiomysql
+        config = dict(sqlConfig)
+        if 'passwd' in config.keys():
+            config['password'] = config.pop('passwd')
+        _mysqlPool = await aiomysql.create_pool(minsize=1, maxsize=ASYNC_MYSQL_POOL_SIZE,
+            autocommit=True, **config)
+    return _mysqlPool
+
+def runAsync(coro, timeout: Union[float, None]=None)->Any:
+    """在同步代码中运行协程并等待结果, 不能在共享事件循环线程中调用"""
+    loop = getLoop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError('runAsync called inside the shared event loop, use await instead')
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+class AsyncStandardPlugin(StandardPlugin):
+    @abstractmethod
+    async def executeEventAsync(self, msg:str, data:Any) -> Union[None, str]:
+        """
+        @msg: message text
+        @data: all the message data, including group_id or user_id
+        @return: 同 StandardPlugin.executeEvent
+        在共享事件循环中运行, 不要调用阻塞的网络或数据库接口
+        """
+        raise NotImplementedError
+
+    async def executeMatchAsync(self, match:TriggerMatch, msg:str, data:Any) -> Union[None, str]:
+        """需要复用匹配结果的异步插件可以重写本方法, 默认调用 executeEventAsync"""
+        return await self.executeEventAsync(msg, data)
+
+    def executeEvent(self, msg:str, data:Any) -> Union[None, str]:
+        return runAsync(self.executeEventAsync(msg, data))
+
+    def executeMatch(self, match:TriggerMatch, msg:str, data:Any) -> Union[None, str]:
+        return runAsync(self.executeMatchAsync(match, msg, data))
+
+class AsyncDispatcher():
+    """在共享事件循环中分发上报事件
+    @route:    根据事件返回需要遍历的插件列表, 返回None表示该事件交给fallback处理
+    @fallback: 同步处理函数 (如 main.dispatchEvent), 在线程池中执行
+    """
+    def __init__(self, route: Callable[[dict], Union[List[StandardPlugin], None]],
+                 fallback: Callable[[dict], Any], workers: int=ASYNC_SYNC_WORKERS) -> None:
+        self.route = route
+        self.fallback = fallback
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def submit(self, data: dict)->None:
+        """提交事件后立即返回, 可在任意线程中调用"""
+        asyncio.run_coroutine_threadsafe(self.dispatch(data), getLoop())
+
+    async def dispatch(self, data: dict)->Union[None, str]:
+        loop = asyncio.get_running_loop()
+        try:
+            plugins = self.route(data)
+            if plugins == None:
+                return await loop.run_in_executor(self.executor, self.fallback, data)
+            msg = parseMessage(data['message'].strip())
+            i = 0
+            while i < len(plugins):
+                if isinstance(plugins[i], AsyncStandardPlugin):
+                    ret = await self._runAsyncPlugin(plugins[i], msg, data)
+                    i += 1
+                else:
+                    j = i
+                    while j < len(plugins) and not isinstance(plugins[j], AsyncStandardPlugin):
+                        j += 1
+                    ret, pending = await loop.run_in_executor(self.executor, self._runSyncPlugins, plugins[i:j], msg, data)
+                    if pending != None:
+                        k, match = pending
+                        ret = await self._executeAsync(plugins[i + k], match, msg, data)
+                        i += k + 1
+                    else:
+                        i = j
+                if ret != None:
+                    return ret
+        except BaseException as e:
+            warning("exception in AsyncDispatcher: {}".format(e))
+        return None
+
+    async def _runAsyncPlugin(self, plugin: AsyncStandardPlugin, msg: str, data: Any)->Union[None, str]:
+        try:
+            match = pluginMetrics.timedMatch(plugin, msg, data)
+        except TypeError as e:
+            warning("type error in AsyncDispatcher: {}\n\n{}".format(e, plugin))
+            return None
+        if match == None:
+            return None
+        return await self._executeAsync(plugin, match, msg, data)
+
+    async def _executeAsync(self, plugin: StandardPlugin, match: TriggerMatch, msg: str, data: Any)->Union[None, str]:
+        try:
+            return await pluginMetrics.timedExecuteAsync(plugin, match, msg, data)
+        except TypeError as e:
+            warning("type error in AsyncDispatcher: {}\n\n{}".format(e, plugin))
+        return None
+
+    def _runSyncPlugins(self, plugins: List[StandardPlugin], msg: str, data: Any)->Tuple[Union[None, str], Union[Tuple[int, TriggerMatch], None]]:
+        """在线程池中依次匹配并执行同步插件
+        @return: (执行结果, None) 或 (None, (插件下标, 匹配结果)), 后者表示插件组匹配到了异步插件, 交回事件循环执行
+        """
+        for k, plugin in enumerate(plugins):
+            try:
+                match = pluginMetrics.timedMatch(plugin, msg, data)
+                if match == None:
+                    continue
+                if isAsyncMatch(match):
+                    return None, (k, match)
+                ret = pluginMetrics.timedExecute(plugin, match, msg, data)
+                if ret != None:
+                    return ret, None
+            except TypeError as e:
+                warning("type error in AsyncDispatcher: {}\n\n{}".format(e, plugin))
+        return None, None
+
+def isAsyncMatch(match: TriggerMatch)->bool:
+    """插件组的匹配结果最终指向异步插件"""
+    if match.inner == None:
+        return False
+    while match.inner != None:
+        match = match.inner
+    return isinstance(match.plugin, AsyncStandardPlugin)
@@ -3,6 +3,19 @@ import os
 
 HTTP_URL="http://127.0.0.1:5700" #go-cqhttp
 
+# 与 go-cqhttp 的通信方式: 'http' 为 HTTP 上报 + HTTP API (默认);
+# 'ws' 为正向 WebSocket, 事件与 API 共用一条长连接, 需安装 websocket-client
+CQ_TRANSPORT = 'http'
+WS_URL = "ws://127.0.0.1:6700"
+WS_ACCESS_TOKEN = ''
+WS_API_TIMEOUT = 30
+
+# 异步分发: 事件在共享事件循环中处理, 同步插件在线程池中执行 (见 utils/asyncPlugin.py)
+# 异步 MySQL 连接池需安装 aiomysql
+ASYNC_DISPATCH = False
+ASYNC_SYNC_WORKERS = 32
+ASYNC_MYSQL_POOL_SIZE = 10
+
 APPLY_GROUP_ID=[
     # apply group id list
 ]
@@ -12,6 +25,17 @@ JAC_COOKIE = ''
 
 ROOT_ADMIN_ID=[] # root admins
 
+# 管理员告警: 同一错误在窗口期(秒)内只发送一次汇总, 全部告警写入本地日志
+ALERT_WINDOW = 600
+ALERT_FLUSH_INTERVAL = 10
+ALERT_LOG_PATH = 'data/log/warning.log'
+
+# 发送限流 (每秒令牌数, 桶容量): 全局与每个群/私聊
+# 多进程模式 (--workers N) 下每个 worker 的全局限额为 SEND_RATE_GLOBAL 的 1/N
+SEND_RATE_GLOBAL = (5, 10)
+SEND_RATE_PER_TARGET = (1, 5)
+SEND_API_TIMEOUT = 10 # send_msg 调用的超时(秒), 超时视为网络错误并重试
+
 BOT_SELF_QQ=0 # TODO:
 
 VERSION_TXT="""version：开源1.0.1版本
@@ -23,6 +47,43 @@ sqlConfig = { # configs for connecting to mysql server
     'passwd': ''
 }
 
+# B站直播间开播提醒, 新增直播间只需在这里添加一项
+# name: 插件名, 也用于推送去重; commands: 查询指令; notifyGroups: 开播时提醒的群 (需开启 sjmc 插件组)
+BILIBILI_LIVE_ROOMS = [
+    {
+        'name': 'sjmclive',
+        'roomId': 25567444,
+        'description': '交大MC社B站直播间状态',
+        'commands': ['-mclive', '-sjmclive'],
+        'title': 'sjmc直播间状态',
+        'notice': '检测到MC社B站开播，SJMC社直播地址： https://live.bilibili.com/%d',
+        'notifyGroups': [712514518],
+    },
+    {
+        'name': 'fdmclive',
+        'roomId': 24716629,
+        'description': '基岩社B站直播间状态',
+        'commands': ['-fdmclive'],
+        'title': '基岩社直播间状态',
+        'notice': '检测到基岩社B站开播，基岩社直播地址： https://live.bilibili.com/%d',
+        'notifyGroups': [712514518],
+    },
+]
+
+# canvas ddl提醒: 在截止前多少秒私聊提醒, 以及批量刷新所有馈送的间隔(秒)
+CANVAS_REMIND_OFFSETS = [24*3600, 3*3600]
+CANVAS_REMIND_REFRESH = 1800
+
+# 群聊记录归档 (见 utils/messageArchive.py): 早于 MESSAGE_ARCHIVE_DAYS 天的记录按群、按月移出 messageRecord,
+# 写入 MESSAGE_ARCHIVE_PATH 下的压缩 jsonl 文件; MESSAGE_RETENTION_DAYS 为各群的保留天数 {群号: 天数},
+# 超过保留期的记录 (含归档文件) 会被删除, 未列出的群永久保留
+MESSAGE_ARCHIVE_DAYS = 180
+MESSAGE_ARCHIVE_PATH = 'data/archive/messageRecord'
+MESSAGE_RETENTION_DAYS = {}
+
+# 是否在启动后于后台预加载所有懒加载插件 (False时只预加载含定时轮询的插件)
+WARM_UP_ALL_PLUGINS = False
+
 TXT_PERMISSION_DENIED = ""
 TXT_PERMISSION_DENIED_2 = "您没有权限修改配置喔TAT"
 
@@ -6,9 +6,23 @@ from PIL import Image, ImageDraw, ImageFont
 from utils.basicConfigs import *
 import time
 import random
-from typing import Dict, List, Union, Tuple, Any
+from typing import Dict, List, Union, Tuple, Any, Callable
 from pymysql.converters import escape_string
 import traceback
+from utils.pluginMetrics import pluginMetrics
+from utils.alertPipeline import AlertPipeline
+from utils.messageQueue import OutboundQueue, PRIORITY_REPLY, PRIORITY_BROADCAST
+from utils.cqTransport import createTransport, TRANSPORT_ERRORS, NotSentError
+
+cqTransport = createTransport(CQ_TRANSPORT, HTTP_URL, WS_URL, WS_ACCESS_TOKEN, WS_API_TIMEOUT)
+
+def callApi(action: str, params: Union[dict, None]=None, timeout: Union[float, None]=None)->dict:
+    """调用 go-cqhttp API, 返回原始响应 {'status', 'retcode', 'data', ...}
+    @timeout: 超时秒数, None 为传输层的默认值
+    网络错误或超时时抛出异常 (requests.RequestException / ConnectionError / TimeoutError), 确定请求没有发出时为 NotSentError
+    参考链接： https://docs.go-cqhttp.org/api/
+    """
+    return cqTransport.callApi(action, params, timeout)
 
 def get_avatar_pic(id: int)->Union[None, bytes]:
     """获取QQ头像
@@ -30,42 +44,61 @@ def get_login_info()->dict:
         'user_id':  QQ号
     }
     """
-    url = HTTP_URL+"/get_login_info"
     try:
-        loginInfo = requests.get(url).json()
+        loginInfo = callApi('get_login_info')
         if loginInfo['status'] != 'ok':
             warning("get_login_info requests not return ok")
             return []
         return loginInfo['data']
     except requests.JSONDecodeError as e:
         warning("error in get_login_info: {}".format(e))
+    except TRANSPORT_ERRORS as e:
+        warning("transport error in get_login_info: {}".format(e))
     except KeyError as e:
         warning("key error in get_login_info: {}".format(e))
     return 0, ''
 
-def send(id: int, message: str, type:str='group')->None:
+def send(id: int, message: str, type:str='group', priority:int=PRIORITY_REPLY,
+         callback:Union[Callable[[bool], None], None]=None)->None:
     """发送消息
     id: 群号或者私聊对象qq号
     message: 消息
     type: Union['group', 'private'], 默认 'group'
+    priority: Union[PRIORITY_REPLY, PRIORITY_BROADCAST], 默认交互回复, 轮询推送请使用 PRIORITY_BROADCAST
+    callback: 最终发送成功或放弃重试后在发送线程中调用, 参数为是否成功
+    消息进入发送队列后立即返回, 由后台线程限流、合并后发送
     """
-    url = HTTP_URL+"/send_msg"
-    if type=='group':
-        params = {
-            "message_type": type,
-            "group_id": id,
-            "message": message
-        }
-        print(params)
-        requests.get(url, params=params)
-    elif type=='private':
-        params = {
-            "message_type": type,
-            "user_id": id,
-            "message": message
-        }
-        print(params)
-        requests.get(url, params=params)
+    if type not in ['group', 'private']:
+        return
+    print({"message_type": type, "group_id" if type=='group' else "user_id": id, "message": message})
+    _outboundQueue.put(type, id, message, priority, callback)
+
+def _postMessage(type: str, id: int, message: str)->bool:
+    """调用send_msg接口并记录耗时, 返回是否发送成功
+    go-cqhttp 异步受理时 status 为 'async', 同样视为成功; 网络错误时抛出异常,
+    发送队列只重试 NotSentError (请求确定没有发出), 读超时等错误不重试, 避免重复发送
+    """
+    params = {
+        "message_type": type,
+        "group_id" if type=='group' else "user_id": id,
+        "message": message
+    }
+    startTime = time.perf_counter()
+    ok = False
+    try:
+        res = callApi('send_msg', params, SEND_API_TIMEOUT)
+        ok = res.get('status') in ('ok', 'async')
+        if not ok:
+            print('[send_msg] {} {} failed: {}'.format(type, id, res))
+    finally:
+        pluginMetrics.observeSend(time.perf_counter() - startTime, ok)
+    return ok
+
+_outboundQueue = OutboundQueue(_postMessage, SEND_RATE_GLOBAL, SEND_RATE_PER_TARGET, (NotSentError, ))
+
+def setGlobalSendRate(rate: float, burst: float)->None:
+    """修改全局发送限流, 多进程模式下每个 worker 只分得 SEND_RATE_GLOBAL 的一部分"""
+    _outboundQueue.setGlobalRate(rate, burst)
 
 def get_group_list()->list:
     """获取群聊列表
@@ -83,9 +116,8 @@ def get_group_list()->list:
         ]
     参考链接： https://docs.go-cqhttp.org/api/#%E8%8E%B7%E5%8F%96%E7%BE%A4%E5%88%97%E8%A1%A8
     """
-    url = HTTP_URL+"/get_group_list"
     try:
-        groupList = json.loads(requests.get(url).text)
+        groupList = callApi('get_group_list')
         if groupList['status'] != 'ok':
             warning("get_group_list requests not return ok")
             return []
@@ -103,7 +135,6 @@ def get_group_msg_history(group_id: int, message_seq: Union[int, None]=None)->li
     @return: 从起始序号开始的前19条消息
     参考链接： https://docs.go-cqhttp.org/api/#%E8%8E%B7%E5%8F%96%E7%BE%A4%E6%B6%88%E6%81%AF%E5%8E%86%E5%8F%B2%E8%AE%B0%E5%BD%95
     """
-    url = HTTP_URL+"/get_group_msg_history"
     try:
         params = {
             "group_id": group_id
@@ -111,7 +142,7 @@ def get_group_msg_history(group_id: int, message_seq: Union[int, None]=None)->li
         if message_seq != None:
             params["message_seq"] = message_seq
             
-        messageHistory = requests.get(url, params=params).json()
+        messageHistory = callApi('get_group_msg_history', params)
         if messageHistory['status'] != 'ok':
             if messageHistory['msg'] == 'MESSAGES_API_ERROR' or messageHistory['msg'] == 'GROUP_INFO_API_ERROR':
                 print("group {} meet '{}' error".format(group_id, messageHistory['msg']))
@@ -130,12 +161,11 @@ def get_essence_msg_list(group_id: int)->list:
     @group_id:  群号
     @return:    精华消息列表
     """
-    url = HTTP_URL+"/get_essence_msg_list"
     try:
         params = {
             "group_id": group_id
         }
-        essenceMsgs = requests.get(url, params=params).json()
+        essenceMsgs = callApi('get_essence_msg_list', params)
         if essenceMsgs['status'] != 'ok':
             warning("get_essence_msg_list requests not return ok")
             return []
@@ -147,12 +177,14 @@ def get_essence_msg_list(group_id: int)->list:
     return []
 def set_friend_add_request(flag, approve=True)->None:
     """处理加好友"""
-    url = HTTP_URL+"/set_friend_add_request"
     params = {
         "flag": flag,
         "approve": approve
     }
-    requests.get(url, params=params)
+    try:
+        callApi('set_friend_add_request', params)
+    except TRANSPORT_ERRORS as e:
+        warning("transport error in set_friend_add_request: {}".format(e))
     
 def get_group_file_system_info(group_id: int)->dict:
     """获取群文件系统信息
@@ -165,12 +197,11 @@ def get_group_file_system_info(group_id: int)->dict:
     }
     参考链接： https://docs.go-cqhttp.org/api/#%E8%8E%B7%E5%8F%96%E7%BE%A4%E6%96%87%E4%BB%B6%E7%B3%BB%E7%BB%9F%E4%BF%A1%E6%81%AF
     """
-    url = HTTP_URL+"/get_group_file_system_info"
     params = {
         "group_id": group_id,
     }
     try:
-        info = requests.get(url, params=params).json()
+        info = callApi('get_group_file_system_info', params)
         if info['retcode'] != 0:
             warning("get_group_file_system_info requests not return ok")
             return {}
@@ -190,12 +221,11 @@ def get_group_root_files(group_id: int)->dict:
     }
     参考链接: https://docs.go-cqhttp.org/api/#%E8%8E%B7%E5%8F%96%E7%BE%A4%E6%A0%B9%E7%9B%AE%E5%BD%95%E6%96%87%E4%BB%B6%E5%88%97%E8%A1%A8
     """
-    url = HTTP_URL+"/get_group_root_files"
     params = {
         "group_id": group_id,
     }
     try:
-        info = requests.get(url, params=params).json()
+        info = callApi('get_group_root_files', params)
         if info['retcode'] != 0:
             warning("get_group_root_files requests not return ok")
             return {}
@@ -216,12 +246,11 @@ def get_group_files_by_folder(group_id: int, folder_id: str)->dict:
     }
     参考链接: https://docs.go-cqhttp.org/api/#%E8%8E%B7%E5%8F%96%E7%BE%A4%E5%AD%90%E7%9B%AE%E5%BD%95%E6%96%87%E4%BB%B6%E5%88%97%E8%A1%A8
     """
-    url = HTTP_URL+"/get_group_files_by_folder"
     params = {
         "group_id": group_id,
     }
     try:
-        info = requests.get(url, params=params).json()
+        info = callApi('get_group_files_by_folder', params)
         if info['retcode'] != 0:
             warning("get_group_files_by_folder requests not return ok")
             return {}
@@ -239,12 +268,11 @@ def get_group_file_url(group_id: int, file_id: str, busid: int)-> Union[str, Non
     @busid: 文件类型
     参考链接： https://docs.go-cqhttp.org/api/#%E8%8E%B7%E5%8F%96%E7%BE%A4%E6%96%87%E4%BB%B6%E8%B5%84%E6%BA%90%E9%93%BE%E6%8E%A5
     """
-    url = HTTP_URL+"/get_group_file_url"
     params = {
         "group_id": group_id,
     }
     try:
-        info = requests.get(url, params=params).json()
+        info = callApi('get_group_file_url', params)
         if info['retcode'] != 0:
             warning("get_group_file_url requests not return ok")
             return {}
@@ -255,11 +283,7 @@ def get_group_file_url(group_id: int, file_id: str, busid: int)-> Union[str, Non
         warning("base exception in get_group_file_url: {}".format(e))
     return None
     
-def warning(what:str)->None:
-    """warning to admins"""
-    stack = traceback.format_exc()
-    what = '[warning]\n' + what 
-    what += '\n\n[location]\n' + stack
+def _sendToAdmins(what: str)->None:
     admin_users = ROOT_ADMIN_ID
     admin_groups = []
     for admin in admin_users:
@@ -267,12 +291,17 @@ def warning(what:str)->None:
     for admin in admin_groups:
         send(admin, what, 'group')
 
+_alertPipeline = AlertPipeline(_sendToAdmins, ALERT_LOG_PATH, ALERT_WINDOW, ALERT_FLUSH_INTERVAL)
+
+def warning(what:str)->None:
+    """warning to admins
+    写入本地日志并交给后台线程按指纹聚合、限流后发送, 不会阻塞调用方
+    """
+    _alertPipeline.report(what)
+
 def startswith_in(msg, checklist)->bool:
     """判断字符串是否以checkList中的内容开头"""
-    for i in checklist:
-        if msg.startswith(i):
-            return True
-    return False
+    return msg.startswith(tuple(checklist))
 
 # 画图相关
 def draw_rounded_rectangle(img, x1, y1, x2, y2, fill, r=7): 
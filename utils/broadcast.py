@@ -0,0 +1,192 @@
+import mysql.connector
+import os, re, json, time, shutil, hashlib
+from threading import Lock
+from typing import Dict, List, Tuple, Union, Any
+from utils.basicConfigs import sqlConfig, ROOT_PATH
+from utils.basicEvent import send, warning, PRIORITY_BROADCAST
+'''
+BOT_DATA.broadcasts 轮询推送的群发任务
++--------------+-------------+------+-----+---------+-------+
+| Field        | Type        | Null | Key | Default | Extra |
++--------------+-------------+------+-----+---------+-------+
+| broadcast_id | char(40)    | NO   | PRI | NULL    |       |
+| source       | varchar(20) | NO   |     | NULL    |       |
+| messages     | json        | NO   |     | NULL    |       |
+| create_time  | double      | NO   | MUL | NULL    |       |
++--------------+-------------+------+-----+---------+-------+
+BOT_DATA.broadcastDelivery 每个群的投递状态, status in ('pending', 'sent', 'failed')
++--------------+-------------+------+-----+---------+-------+
+| broadcast_id | char(40)    | NO   | PRI | NULL    |       |
+| group_id     | bigint      | NO   | PRI | NULL    |       |
+| status       | varchar(10) | NO   | MUL | NULL    |       |
++--------------+-------------+------+-----+---------+-------+
+'''
+BROADCAST_CACHE_DIR = 'data/broadcast'
+BROADCAST_RESUME_SECONDS = 24*3600 # 重启后只续发这段时间内创建的群发
+_imagePattern = re.compile(r'(\[CQ:image,file=files://)([^,\]]+)')
+
+def createBroadcastSql():
+    """创建群发任务sql表"""
+    try:
+        mydb = mysql.connector.connect(**sqlConfig)
+        mydb.autocommit = True
+        mycursor = mydb.cursor()
+        mycursor.execute("""
+            create table if not exists `BOT_DATA`.`broadcasts` (
+                `broadcast_id` char(40) not null,
+                `source` varchar(20) not null,
+                `messages` json not null,
+                `create_time` double not null,
+                primary key (`broadcast_id`),
+                key (`create_time`)
+            );""")
+        mycursor.execute("""
+            create table if not exists `BOT_DATA`.`broadcastDelivery` (
+                `broadcast_id` char(40) not null,
+                `group_id` bigint not null,
+                `status` varchar(10) not null,
+                primary key (`broadcast_id`, `group_id`),
+                key (`status`)
+            );""")
+    except mysql.connector.Error as e:
+        warning("mysql error in createBroadcastSql: {}".format(e))
+
+class BroadcastEngine():
+    """把一份渲染好的推送发给多个群
+    - 同一 (source, key) 只会群发一次
+    - 图片复制到按内容寻址的缓存目录, 之后的临时文件覆盖不影响续发
+    - 消息交给发送队列以 PRIORITY_BROADCAST 并发投递, 每个群的投递结果写回数据库
+    - 重启后 resume() 续发未完成的群
+    """
+    def __init__(self) -> None:
+        self.lock = Lock()
+        # (broadcast_id, group_id) -> [尚未确认的消息数, 是否有失败]
+        self.remaining: Dict[Tuple[str, int], List] = {}
+        self.sqlCreated = False
+
+    def _createSql(self)->None:
+        if not self.sqlCreated:
+            createBroadcastSql()
+            self.sqlCreated = True
+
+    @staticmethod
+    def cacheImage(path: str)->str:
+        """把图片复制到缓存目录, 返回缓存后的绝对路径"""
+        path = path if os.path.isabs(path) else os.path.join(ROOT_PATH, path)
+        if not os.path.isfile(path):
+            return path
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        cacheDir = os.path.join(ROOT_PATH, BROADCAST_CACHE_DIR)
+        os.makedirs(cacheDir, exist_ok=True)
+        cachePath = os.path.join(cacheDir, digest + os.path.splitext(path)[1])
+        if not os.path.isfile(cachePath):
+            shutil.copyfile(path, cachePath)
+        return cachePath
+
+    def broadcast(self, source: str, key: str, messages: List[str], groups: List[int])->Union[str, None]:
+        """
+        @source:   推送来源, eg: 'jwc'
+        @key:      推送内容的唯一标识, eg: 通知链接
+        @messages: 每个群依次发送的消息, 图片请使用 [CQ:image,file=files://...]
+        @groups:   目标群号
+        @return:   broadcast_id, 若该推送已群发过则返回None
+        """
+        broadcastId = hashlib.sha1((source + '\n' + key).encode('utf-8')).hexdigest()
+        messages = [_imagePattern.sub(lambda m: m.group(1) + self.cacheImage(m.group(2)), msg) for msg in messages]
+        groups = list(dict.fromkeys(groups))
+        self._createSql()
+        try:
+            mydb = mysql.connector.connect(**sqlConfig)
+            mydb.autocommit = False
+            mycursor = mydb.cursor()
+            mycursor.execute("""
+                insert ignore into `BOT_DATA`.`broadcasts` (`broadcast_id`, `source`, `messages`, `create_time`)
+                values (%s, %s, %s, %s)""", (broadcastId, source, json.dumps(messages), time.time()))
+            if mycursor.rowcount == 0:
+                mydb.rollback()
+                return None
+            if len(groups) > 0:
+                mycursor.executemany("""
+                    insert into `BOT_DATA`.`broadcastDelivery` (`broadcast_id`, `group_id`, `status`)
+                    values (%s, %s, 'pending')""", [(broadcastId, groupId) for groupId in groups])
+            mydb.commit()
+        except mysql.connector.Error as e:
+            warning("mysql error in BroadcastEngine.broadcast: {}".format(e))
+        self._dispatch(broadcastId, messages, groups)
+        return broadcastId
+
+    def _dispatch(self, broadcastId: str, messages: List[str], groups: List[int])->None:
+        for groupId in groups:
+            with self.lock:
+                if (broadcastId, groupId) in self.remaining:
+                    continue
+                self.remaining[(broadcastId, groupId)] = [len(messages), False]
+            for msg in messages:
+                send(groupId, msg, 'group', PRIORITY_BROADCAST,
+                     lambda ok, groupId=groupId: self._onDelivered(broadcastId, groupId, ok))
+
+    def _onDelivered(self, broadcastId: str, groupId: int, ok: bool)->None:
+        with self.lock:
+            state = self.remaining.get((broadcastId, groupId))
+            if state == None:
+                return
+            state[0] -= 1
+            state[1] = state[1] or not ok
+            if state[0] > 0:
+                return
+            del self.remaining[(broadcastId, groupId)]
+            failed = state[1]
+        self._setStatus(broadcastId, groupId, 'failed' if failed else 'sent')
+
+    def _setStatus(self, broadcastId: str, groupId: int, status: str)->None:
+        try:
+            mydb = mysql.connector.connect(**sqlConfig)
+            mydb.autocommit = True
+            mycursor = mydb.cursor()
+            mycursor.execute("""
+                update `BOT_DATA`.`broadcastDelivery` set `status` = %s
+                where `broadcast_id` = %s and `group_id` = %s""", (status, broadcastId, groupId))
+        except mysql.connector.Error as e:
+            warning("mysql error in BroadcastEngine._setStatus: {}".format(e))
+
+    def resume(self)->int:
+        """续发重启前未完成的群发, 返回续发的群数"""
+        self._createSql()
+        try:
+            mydb = mysql.connector.connect(**sqlConfig)
+            mycursor = mydb.cursor()
+            mycursor.execute("""
+                select b.`broadcast_id`, b.`messages`, d.`group_id`
+                from `BOT_DATA`.`broadcasts` b join `BOT_DATA`.`broadcastDelivery` d
+                on b.`broadcast_id` = d.`broadcast_id`
+                where d.`status` = 'pending' and b.`create_time` > %s""", (time.time() - BROADCAST_RESUME_SECONDS, ))
+            rows = list(mycursor)
+        except mysql.connector.Error as e:
+            warning("mysql error in BroadcastEngine.resume: {}".format(e))
+            return 0
+        pending: Dict[str, Tuple[List[str], List[int]]] = {}
+        for broadcastId, messages, groupId in rows:
+            if broadcastId not in pending:
+                pending[broadcastId] = (json.loads(messages), [])
+            pending[broadcastId][1].append(groupId)
+        for broadcastId, (messages, groups) in pending.items():
+            self._dispatch(broadcastId, messages, groups)
+        return len(rows)
+
+    def status(self, broadcastId: str)->Dict[str, int]:
+        """@return: {'pending': int, 'sent': int, 'failed': int}"""
+        result = {'pending': 0, 'sent': 0, 'failed': 0}
+        try:
+            mydb = mysql.connector.connect(**sqlConfig)
+            mycursor = mydb.cursor()
+            mycursor.execute("""
+                select `status`, count(*) from `BOT_DATA`.`broadcastDelivery`
+                where `broadcast_id` = %s group by `status`""", (broadcastId, ))
+            for status, count in mycursor:
+                result[status] = count
+        except mysql.connector.Error as e:
+            warning("mysql error in BroadcastEngine.status: {}".format(e))
+        return result
+
+broadcaster = BroadcastEngine()
@@ -0,0 +1,147 @@
+import json, time, itertools, requests
+from urllib3.exceptions import NewConnectionError
+import concurrent.futures
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Thread, Lock, Event
+from typing import Dict, Union, Any, Callable
+"""
+与 go-cqhttp 通信的传输层
+- HttpTransport: 事件由 go-cqhttp POST 到 Flask, API 调用为 HTTP_URL 上的独立请求 (默认)
+- WebSocketTransport: 连接 go-cqhttp 的正向 WebSocket, 事件与 API 调用共用一条长连接,
+  每个请求带唯一 echo, 按 echo 匹配响应, 多个请求可以同时在途
+两者的 callApi(action, params) 都返回 go-cqhttp 的响应 {'status', 'retcode', 'data', ...},
+网络错误或超时时抛出 TRANSPORT_ERRORS 中的异常; 能确定请求没有发出 (连接失败/连接超时/ws未连接) 时
+抛出其中的 NotSentError, 只有这种情况可以安全地重试非幂等的 send_msg, 读超时时 go-cqhttp 可能已经发出消息
+本模块不要导入 utils.basicEvent (会循环导入), 出错时只打印
+"""
+WS_RECONNECT_DELAY = 3 # 断线重连间隔(秒)
+WS_EVENT_WORKERS = 8 # 处理上报事件的线程数, 避免慢插件阻塞收包
+HTTP_API_TIMEOUT = 30 # HTTP API 调用的默认超时(秒)
+
+class NotSentError(ConnectionError):
+    """请求确定没有到达 go-cqhttp"""
+    pass
+
+TRANSPORT_ERRORS = (requests.RequestException, ConnectionError, TimeoutError, concurrent.futures.TimeoutError)
+
+def _notSent(e: requests.RequestException)->bool:
+    """连接阶段失败的请求一定没有发出, 连接建立之后的错误 (读超时/连接被重置) 无法确定"""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    if isinstance(e, requests.ConnectionError) and len(e.args) > 0:
+        return isinstance(getattr(e.args[0], 'reason', None), NewConnectionError)
+    return False
+
+class HttpTransport():
+    def __init__(self, httpUrl: str, timeout: float=HTTP_API_TIMEOUT) -> None:
+        self.httpUrl = httpUrl
+        self.timeout = timeout
+        self.session = requests.Session() # 复用连接
+
+    def callApi(self, action: str, params: Union[dict, None]=None, timeout: Union[float, None]=None)->dict:
+        timeout = self.timeout if timeout == None else timeout
+        try:
+            res = self.session.get(self.httpUrl + '/' + action, params=params, timeout=timeout)
+        except requests.RequestException as e:
+            if _notSent(e):
+                raise NotSentError('{} not sent: {}'.format(action, e)) from e
+            raise
+        if res.status_code != requests.codes.ok:
+            return {'status': 'failed', 'retcode': res.status_code, 'data': None, 'msg': 'HTTP_ERROR'}
+        return res.json()
+
+class WebSocketTransport():
+    def __init__(self, wsUrl: str, accessToken: str='', timeout: float=30) -> None:
+        self.wsUrl = wsUrl
+        self.accessToken = accessToken
+        self.timeout = timeout
+        self.ws = None
+        self.connected = Event()
+        self.sendLock = Lock()
+        self.pendingLock = Lock()
+        self.pending: Dict[str, Future] = {}
+        self.echoCounter = itertools.count(1)
+        self.eventHandler: Union[Callable[[dict], Any], None] = None
+        self.executor = ThreadPoolExecutor(max_workers=WS_EVENT_WORKERS)
+        self.thread: Union[Thread, None] = None
+
+    def setEventHandler(self, handler: Callable[[dict], Any])->None:
+        """设置上报事件的处理函数, 在线程池中调用"""
+        self.eventHandler = handler
+
+    def start(self)->None:
+        if self.thread == None or not self.thread.is_alive():
+            self.thread = Thread(target=self._recvLoop, daemon=True)
+            self.thread.start()
+
+    def _connect(self):
+        import websocket # websocket-client, 只有启用 ws 传输时才需要
+        header = ['Authorization: Bearer ' + self.accessToken] if self.accessToken != '' else None
+        return websocket.create_connection(self.wsUrl, header=header, timeout=None)
+
+    def _recvLoop(self)->None:
+        while True:
+            try:
+                self.ws = self._connect()
+                self.connected.set()
+                print('[cqTransport] connected to {}'.format(self.wsUrl))
+                while True:
+                    raw = self.ws.recv()
+                    if not raw:
+                        raise ConnectionError('connection closed')
+                    self._onMessage(json.loads(raw))
+            except BaseException as e:
+                print('[cqTransport] websocket error: {}'.format(e))
+            self.connected.clear()
+            self._failPending(ConnectionError('websocket disconnected'))
+            try:
+                if self.ws != None:
+                    self.ws.close()
+            except BaseException:
+                pass
+            time.sleep(WS_RECONNECT_DELAY)
+
+    def _onMessage(self, message: dict)->None:
+        if 'post_type' in message.keys():
+            if message['post_type'] != 'meta_event' and self.eventHandler != None:
+                self.executor.submit(self._handleEvent, message)
+            return
+        echo = message.get('echo')
+        with self.pendingLock:
+            future = self.pending.pop(echo, None)
+        if future != None:
+            future.set_result(message)
+
+    def _handleEvent(self, data: dict)->None:
+        try:
+            self.eventHandler(data)
+        except BaseException as e:
+            print('[cqTransport] event handler exception: {}'.format(e))
+
+    def _failPending(self, e: BaseException)->None:
+        with self.pendingLock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_exception(e)
+
+    def callApi(self, action: str, params: Union[dict, None]=None, timeout: Union[float, None]=None)->dict:
+        timeout = self.timeout if timeout == None else timeout
+        self.start()
+        if not self.connected.wait(timeout):
+            raise NotSentError('websocket not connected: {}'.format(self.wsUrl))
+        echo = str(next(self.echoCounter))
+        future = Future()
+        with self.pendingLock:
+            self.pending[echo] = future
+        try:
+            with self.sendLock:
+                self.ws.send(json.dumps({'action': action, 'params': params if params != None else {}, 'echo': echo}))
+            return future.result(timeout)
+        finally:
+            with self.pendingLock:
+                self.pending.pop(echo, None)
+
+def createTransport(kind: str, httpUrl: str, wsUrl: str, accessToken: str='', timeout: float=30)->Union[HttpTransport, WebSocketTransport]:
+    if kind == 'ws':
+        return WebSocketTransport(wsUrl, accessToken, timeout)
+    return HttpTransport(httpUrl, timeout)
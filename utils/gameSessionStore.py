@@ -0,0 +1,125 @@
+import mysql.connector
+import json, time
+from threading import Thread, Lock
+from typing import Dict, List, Tuple, Union, Any, Callable
+from pymysql.converters import escape_string
+from utils.basicConfigs import sqlConfig
+from utils.basicEvent import warning
+from utils.workerPool import ownsGroup
+'''
+BOT_DATA.gameSessions 群聊游戏对局快照
++----------+-------------+------+-----+---------+-------+
+| Field    | Type        | Null | Key | Default | Extra |
++----------+-------------+------+-----+---------+-------+
+| game     | varchar(20) | NO   | PRI | NULL    |       |
+| group_id | bigint      | NO   | PRI | NULL    |       |
+| snapshot | json        | NO   |     | NULL    |       |
+| deadline | double      | YES  |     | NULL    |       |
++----------+-------------+------+-----+---------+-------+
+deadline 为超时结算的unix时间戳, NULL表示当前没有计时
+'''
+def createGameSessionSql():
+    """创建对局快照sql表"""
+    try:
+        mydb = mysql.connector.connect(**sqlConfig)
+        mydb.autocommit = True
+        mycursor = mydb.cursor()
+        mycursor.execute("""
+            create table if not exists `BOT_DATA`.`gameSessions` (
+                `game` varchar(20) not null,
+                `group_id` bigint not null,
+                `snapshot` json not null,
+                `deadline` double,
+                primary key (`game`, `group_id`)
+            );""")
+    except mysql.connector.Error as e:
+        warning("mysql error in createGameSessionSql: {}".format(e))
+
+class GameSessionStore():
+    """某种群聊游戏的对局快照存储, 进程内只保留进行中的对局"""
+    def __init__(self, gameName: str) -> None:
+        self.gameName = escape_string(gameName)
+        createGameSessionSql()
+
+    def save(self, groupId: int, snapshot: dict, deadline: Union[float, None])->None:
+        try:
+            mydb = mysql.connector.connect(**sqlConfig)
+            mydb.autocommit = True
+            mycursor = mydb.cursor()
+            mycursor.execute("""
+                replace into `BOT_DATA`.`gameSessions` (`game`, `group_id`, `snapshot`, `deadline`)
+                values ('%s', %d, '%s', %s)"""%(self.gameName, groupId,
+                    escape_string(json.dumps(snapshot)), 'null' if deadline == None else '%f'%deadline))
+        except mysql.connector.Error as e:
+            warning("mysql error in GameSessionStore.save: {}".format(e))
+
+    def load(self, groupId: int)->Union[dict, None]:
+        try:
+            mydb = mysql.connector.connect(**sqlConfig)
+            mycursor = mydb.cursor()
+            mycursor.execute("""
+                select `snapshot` from `BOT_DATA`.`gameSessions`
+                where `game` = '%s' and `group_id` = %d"""%(self.gameName, groupId))
+            result = list(mycursor)
+            if len(result) == 0:
+                return None
+            return json.loads(result[0][0])
+        except mysql.connector.Error as e:
+            warning("mysql error in GameSessionStore.load: {}".format(e))
+            return None
+
+    def delete(self, groupId: int)->None:
+        try:
+            mydb = mysql.connector.connect(**sqlConfig)
+            mydb.autocommit = True
+            mycursor = mydb.cursor()
+            mycursor.execute("""
+                delete from `BOT_DATA`.`gameSessions`
+                where `game` = '%s' and `group_id` = %d"""%(self.gameName, groupId))
+        except mysql.connector.Error as e:
+            warning("mysql error in GameSessionStore.delete: {}".format(e))
+
+    def loadDeadlines(self)->Dict[int, Union[float, None]]:
+        """获取所有未结束对局的群号及其超时时间, 不读取快照本身
+        多进程模式下只返回当前 worker 负责的群, 其余群由所属 worker 恢复与结算
+        """
+        try:
+            mydb = mysql.connector.connect(**sqlConfig)
+            mycursor = mydb.cursor()
+            mycursor.execute("""
+                select `group_id`, `deadline` from `BOT_DATA`.`gameSessions`
+                where `game` = '%s'"""%self.gameName)
+            return {groupId: deadline for groupId, deadline in list(mycursor) if ownsGroup(groupId)}
+        except mysql.connector.Error as e:
+            warning("mysql error in GameSessionStore.loadDeadlines: {}".format(e))
+            return {}
+
+class GameTimeoutSweeper():
+    """所有群聊游戏共用的超时扫描线程, 取代每局一个threading.Timer"""
+    def __init__(self, interval: float=1) -> None:
+        self.interval = interval
+        self.callbacks: List[Callable[[float], None]] = []
+        self.lock = Lock()
+        self.thread = None
+
+    def register(self, callback: Callable[[float], None])->None:
+        """注册扫描回调, 每次扫描时以当前时间戳调用 callback(now)"""
+        with self.lock:
+            self.callbacks.append(callback)
+            if self.thread == None:
+                self.thread = Thread(target=self._loop, daemon=True)
+                self.thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.time()
+            with self.lock:
+                callbacks = list(self.callbacks)
+            for callback in callbacks:
+                try:
+                    callback(now)
+                except BaseException as e:
+                    warning("exception in GameTimeoutSweeper: {}".format(e))
+
+gameTimeoutSweeper = GameTimeoutSweeper()
@@ -0,0 +1,276 @@
+import os, random, time
+from typing import List, Tuple, Union, Any, Callable
+from threading import Thread, Lock
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from utils.goBangGame import *
+
+# 棋形分值
+SCORE_FIVE = 1000000
+SCORE_OPEN_FOUR = 100000
+SCORE_FOUR = 10000
+SCORE_OPEN_THREE = 5000
+SCORE_WINDOW = [0, 1, 10, 100, 1000, 0] # 五格窗口内己方棋子数对应的分值
+DEFENSE_WEIGHT = 0.9
+
+BOT_TIME_BUDGET = 2.0 # 每步搜索时间预算(秒)
+BOT_MAX_DEPTH = 8
+BOT_BRANCH = 10 # 每层只展开分值最高的若干候选点
+BOT_WORKERS = max(1, (os.cpu_count() or 1) - 1) # 搜索进程数, 留一个核给主进程
+BOT_DEADLINE_SLACK = 30 # bot回合的超时在时间预算之外留出的余量(秒), 覆盖排队与子进程重启
+BOT_SUBMIT_RETRIES = 1 # 进程池损坏 (子进程崩溃或被杀) 时重建进程池并重新提交的次数
+
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2
+LINE_CACHE_SIZE = 200000
+_lineScoreCache = {}
+_zobrist = None
+
+def getZobrist()->List[List[int]]:
+    global _zobrist
+    if _zobrist == None:
+        rng = random.Random(20221024)
+        _zobrist = [[0] * (BOARD_STRIDE * NROWS) for _ in range(3)]
+        for piece in [GoBangPiece.BLACK, GoBangPiece.WHITE]:
+            _zobrist[piece] = [rng.getrandbits(64) for _ in range(BOARD_STRIDE * NROWS)]
+    return _zobrist
+
+class SearchTimeout(Exception):
+    pass
+
+class GoBangBot():
+    """五子棋AI: 迭代加深 + alpha-beta + 置换表"""
+    def __init__(self, game: GoBangGame, timeBudget: float=BOT_TIME_BUDGET, maxDepth: int=BOT_MAX_DEPTH):
+        self.game = game
+        self.timeBudget = timeBudget
+        self.maxDepth = maxDepth
+        self.zobrist = getZobrist()
+        self.hash = 0
+        for idx, pos in enumerate(game.pieceOrder):
+            self.hash ^= self.zobrist[GoBangPiece.BLACK if idx % 2 == 0 else GoBangPiece.WHITE][posToBit(pos)]
+        self.table = {}
+        self.deadline = 0
+        self.nodes = 0
+
+    def _candidates(self)->List[Tuple]:
+        """已有棋子周围两格内的空位, 由位棋盘膨胀得到"""
+        stones = self.game.bitboards[GoBangPiece.BLACK] | self.game.bitboards[GoBangPiece.WHITE]
+        if stones == 0:
+            return [(NROWS // 2, NCOLS // 2)]
+        near = stones
+        for _ in range(2):
+            grown = near
+            for shift in goBangShift:
+                grown |= (near << shift) | (near >> shift)
+            near = grown & BOARD_MASK
+        near &= self.game.emptyBits()
+        result = []
+        while near:
+            low = near & -near
+            idx = low.bit_length() - 1
+            near ^= low
+            result.append((idx // BOARD_STRIDE, idx % BOARD_STRIDE))
+        return result
+
+    def _lineScore(self, piece: GoBangPiece, line: List[int])->int:
+        """单条线段的棋形分值, 按线段内容缓存"""
+        game = self.game
+        key = (piece == GoBangPiece.BLACK and game.forbidRule, tuple(line))
+        score = _lineScoreCache.get(key)
+        if score != None:
+            return score
+        if game._isFive(piece, game._runLength(line, LINE_RADIUS)):
+            score = SCORE_FIVE
+        else:
+            fours, openFour = game._countFour(piece, line)
+            if openFour:
+                score = SCORE_OPEN_FOUR
+            elif fours > 0:
+                score = SCORE_FOUR * fours
+            elif game._hasOpenThree(piece, line):
+                score = SCORE_OPEN_THREE
+            else:
+                best = 0
+                for start in range(LINE_RADIUS - 4, LINE_RADIUS + 1):
+                    window = line[start:start + 5]
+                    if LINE_BLOCK not in window:
+                        best = max(best, window.count(LINE_OWN))
+                score = SCORE_WINDOW[best]
+        if len(_lineScoreCache) >= LINE_CACHE_SIZE:
+            _lineScoreCache.clear()
+        _lineScoreCache[key] = score
+        return score
+
+    def _shapeScore(self, piece: GoBangPiece, pos: Tuple)->int:
+        """假设piece落在pos, 统计经过pos的四个方向上的棋形分值"""
+        game = self.game
+        bit = 1 << posToBit(pos)
+        game.bitboards[piece] |= bit
+        score = 0
+        for direction in GoBangDirection:
+            score += self._lineScore(piece, game._getLine(piece, pos, direction))
+        game.bitboards[piece] &= ~bit
+        return score
+
+    def _orderedMoves(self, piece: GoBangPiece, ttMove: Union[Tuple, None])->List[Tuple[int, Tuple]]:
+        opponent = GoBangPiece.BLACKWHITE - piece
+        scored = []
+        for pos in self._candidates():
+            if self.game.forbidRule and self.game.checkForbid(piece, pos):
+                continue
+            attack = self._shapeScore(piece, pos)
+            defense = self._shapeScore(opponent, pos)
+            scored.append((attack + int(defense * DEFENSE_WEIGHT), attack, pos))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        scored = scored[:BOT_BRANCH]
+        if ttMove != None:
+            for idx, item in enumerate(scored):
+                if item[2] == ttMove:
+                    scored.insert(0, scored.pop(idx))
+                    break
+        return [(attack, pos) for _, attack, pos in scored]
+
+    def _play(self, pos: Tuple):
+        self.hash ^= self.zobrist[self.game.currentPiece][posToBit(pos)]
+        self.game.act(pos)
+
+    def _unplay(self):
+        pos = self.game.pieceOrder[-1]
+        self.game.undo()
+        self.hash ^= self.zobrist[self.game.currentPiece][posToBit(pos)]
+
+    def _negamax(self, depth: int, alpha: float, beta: float)->float:
+        """返回当前行棋方在depth层内的增量分值"""
+        self.nodes += 1
+        if self.nodes & 15 == 0 and time.time() > self.deadline:
+            raise SearchTimeout()
+        piece = self.game.currentPiece
+        if depth == 0:
+            # 叶子节点: 以行棋方下一手能取得的最大棋形分值作为静态评估
+            return max([self._shapeScore(piece, pos) for pos in self._candidates()], default=0)
+        alphaOrig = alpha
+        entry = self.table.get(self.hash)
+        ttMove = None
+        if entry != None:
+            entryDepth, entryValue, entryFlag, ttMove = entry
+            if entryDepth >= depth:
+                if entryFlag == TT_EXACT:
+                    return entryValue
+                if entryFlag == TT_LOWER:
+                    alpha = max(alpha, entryValue)
+                elif entryFlag == TT_UPPER:
+                    beta = min(beta, entryValue)
+                if alpha >= beta:
+                    return entryValue
+        moves = self._orderedMoves(piece, ttMove)
+        if len(moves) == 0:
+            return 0
+        bestValue, bestMove = -float('inf'), moves[0][1]
+        for attack, pos in moves:
+            self._play(pos)
+            if self.game.done():
+                value = SCORE_FIVE * (depth + 1)
+            else:
+                value = attack - self._negamax(depth - 1, -(beta - attack), -(alpha - attack))
+            self._unplay()
+            if value > bestValue:
+                bestValue, bestMove = value, pos
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+        if bestValue <= alphaOrig:
+            flag = TT_UPPER
+        elif bestValue >= beta:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        self.table[self.hash] = (depth, bestValue, flag, bestMove)
+        return bestValue
+
+    def search(self)->Union[Tuple, None]:
+        """在时间预算内迭代加深搜索, 返回最佳落子点"""
+        self.deadline = time.time() + self.timeBudget
+        rootLength = len(self.game.pieceOrder)
+        moves = self._orderedMoves(self.game.currentPiece, None)
+        if len(moves) == 0:
+            return None
+        bestMove = moves[0][1]
+        # 能直接成五或必须堵对方四时不再搜索
+        if moves[0][0] >= SCORE_FIVE or len(moves) == 1:
+            return bestMove
+        try:
+            for depth in range(1, self.maxDepth + 1):
+                self._negamax(depth, -float('inf'), float('inf'))
+                bestMove = self.table[self.hash][3]
+        except SearchTimeout:
+            # 中断时撤销搜索中落下的棋子
+            while len(self.game.pieceOrder) > rootLength:
+                self._unplay()
+        return bestMove
+
+def _searchWorker(pieceOrder: List[Tuple], forbidRule: bool, timeBudget: float)->Union[Tuple, None]:
+    """在子进程内重建局面并搜索"""
+    game = GoBangGame(forbidRule)
+    for pos in pieceOrder:
+        game.act(pos)
+    return GoBangBot(game, timeBudget).search()
+
+_executor = None
+_executorLock = Lock()
+def getBotExecutor()->ProcessPoolExecutor:
+    """所有对局共享的搜索进程池, 首次使用或损坏后重建
+    同时进行的 bot 对局不超过 BOT_WORKERS 个时互不等待, 更多的对局排队搜索
+    """
+    global _executor
+    with _executorLock:
+        if _executor == None:
+            _executor = ProcessPoolExecutor(max_workers=BOT_WORKERS)
+        return _executor
+
+def _resetBotExecutor(broken: ProcessPoolExecutor)->None:
+    """丢弃已损坏的进程池, 下次 getBotExecutor 时重建"""
+    global _executor
+    with _executorLock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+def _submitSearch(args: tuple, callback: Callable[[Union[Tuple, None]], None], retries: int)->None:
+    def finish(pos: Union[Tuple, None]):
+        Thread(target=callback, args=(pos, ), daemon=True).start()
+    executor = getBotExecutor()
+    try:
+        future = executor.submit(_searchWorker, *args)
+    except BrokenProcessPool as e:
+        warning("gobang bot process pool is broken: {}".format(e))
+        _resetBotExecutor(executor)
+        if retries > 0:
+            _submitSearch(args, callback, retries - 1)
+        else:
+            finish(None)
+        return
+    except BaseException as e:
+        warning("exception when submitting gobang bot search: {}".format(e))
+        finish(None)
+        return
+    def onDone(future: Future):
+        try:
+            pos = future.result()
+        except BrokenProcessPool as e:
+            warning("gobang bot search process died: {}".format(e))
+            _resetBotExecutor(executor)
+            if retries > 0:
+                _submitSearch(args, callback, retries - 1)
+                return
+            pos = None
+        except BaseException as e:
+            warning("exception in gobang bot search: {}".format(e))
+            pos = None
+        finish(pos)
+    future.add_done_callback(onDone)
+
+def searchAsync(game: GoBangGame, callback: Callable[[Union[Tuple, None]], None],
+                timeBudget: float=BOT_TIME_BUDGET)->None:
+    """把搜索提交到子进程, 不会抛出异常
+    结束后在新线程中调用 callback(pos), 搜索失败时 pos 为 None; 调用方可以在持有对局锁时提交
+    """
+    _submitSearch((list(game.pieceOrder), game.forbidRule, timeBudget), callback, BOT_SUBMIT_RETRIES)
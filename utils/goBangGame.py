@@ -1,6 +1,7 @@
 from typing import List, Tuple, Union, Any
 from enum import IntEnum
 from utils.basicEvent import *
+import time
 NROWS = NCOLS = 17
 class GoBangPiece(IntEnum):
     NOTHING = 0
@@ -8,111 +9,254 @@ class GoBangPiece(IntEnum):
     WHITE = 2
     BLACKWHITE = 3
 class GoBangDirection(IntEnum):
-    UP = 0
-    UPRIGHT = 1
-    RIGHT = 2
-    RIGHTDOWN = 3
-    DOWN = 4
-    DOWNLEFT = 5
-    LEFT = 6
-    LEFTUP = 7
-def negativeDirection(direction: GoBangDirection):
-    return (4 + direction) % 8
-goBangMovement = [(-1, 0), (-1, 1), (0, 1), (1, 1,), (1, 0), (1, -1), (0, -1), (-1, -1)]
+    RIGHT = 0
+    DOWN = 1
+    RIGHTDOWN = 2
+    DOWNLEFT = 3
+# 位棋盘: 每行多留一列空白作为边界, 使横向/斜向的移位不会跨行
+BOARD_STRIDE = NCOLS + 1
+goBangShift = [1, BOARD_STRIDE, BOARD_STRIDE + 1, BOARD_STRIDE - 1]
+goBangMovement = [(0, 1), (1, 0), (1, 1), (1, -1)]
+BOARD_MASK = 0
+for _row in range(NROWS):
+    BOARD_MASK |= ((1 << NCOLS) - 1) << (_row * BOARD_STRIDE)
+del _row
+# 线形扫描时在落子点两侧各取的格数
+LINE_RADIUS = 6
+LINE_EMPTY, LINE_OWN, LINE_BLOCK = 0, 1, 2
+
+def posToBit(pos: Tuple)->int:
+    return pos[0] * BOARD_STRIDE + pos[1]
+
 class GoBangGame():
-    """五子棋逻辑"""
-    def __init__(self):
+    """五子棋逻辑 (位棋盘实现)
+    pos 为 (行, 列), 下标从0开始
+    """
+    def __init__(self, forbidRule: bool=False):
         self.ROWS = NROWS
         self.COLS = NCOLS
-        self.checkerboard = [[GoBangPiece.NOTHING for _ in range(self.COLS)] for _ in range(self.ROWS)]
-        # buffer: [row, col, direction]: [piece, 黑棋在direction方向上有连续几颗棋子, 白棋在direction方向上有连续几颗棋子]
-        self.buffer = [[[[GoBangPiece.NOTHING, 0, 0] for _ in range(8)] for _ in range(self.COLS)] for _ in range(self.ROWS)]
-        self.pieceOrder = []
-        self.currentPiece = GoBangPiece.BLACK
-        self.doneFlag = False
-    def _step(self, startPoint: Tuple, direction: GoBangDirection, dist:int=1):
-        """从初始点向某方向行走dist格, 如果越界就返回None"""
-        move = goBangMovement[direction]
-        endPointX = startPoint[0] + move[0] * dist
-        endPointY = startPoint[1] + move[1] * dist
-        if endPointX < 0 or endPointX >= self.COLS:
-            return None
-        if endPointY < 0 or endPointY >= self.ROWS:
-            return None
-        return endPointX, endPointY
+        self.forbidRule = forbidRule # 是否对黑棋启用禁手规则
+        self.refresh()
 
     def refresh(self):
         """更新游戏"""
-        self.checkerboard = [[GoBangPiece.NOTHING for _ in range(self.COLS)] for _ in range(self.ROWS)]
-        self.buffer = [[[[GoBangPiece.NOTHING, 0, 0] for _ in range(8)] for _ in range(self.COLS)] for _ in range(self.ROWS)]
+        # bitboards[piece]: 对应颜色棋子的位棋盘
+        self.bitboards = [0, 0, 0]
         self.currentPiece = GoBangPiece.BLACK
         self.pieceOrder = []
         self.doneFlag = False
 
+    def inBoard(self, pos: Tuple)->bool:
+        return 0 <= pos[0] < self.ROWS and 0 <= pos[1] < self.COLS
+
+    def getPiece(self, pos: Tuple)->GoBangPiece:
+        bit = 1 << posToBit(pos)
+        if self.bitboards[GoBangPiece.BLACK] & bit:
+            return GoBangPiece.BLACK
+        if self.bitboards[GoBangPiece.WHITE] & bit:
+            return GoBangPiece.WHITE
+        return GoBangPiece.NOTHING
+
+    def emptyBits(self)->int:
+        return BOARD_MASK & ~(self.bitboards[GoBangPiece.BLACK] | self.bitboards[GoBangPiece.WHITE])
+
+    def _getLine(self, piece: GoBangPiece, pos: Tuple, direction: GoBangDirection)->List[int]:
+        """取出经过pos的某方向线段, 假设pos处已经落下piece
+        @return: 长度为 2*LINE_RADIUS+1 的列表, 中心为pos,
+            元素为 LINE_EMPTY / LINE_OWN / LINE_BLOCK (对方棋子或棋盘边界)
+        """
+        own = self.bitboards[piece]
+        empty = self.emptyBits()
+        dx, dy = goBangMovement[direction]
+        line = [LINE_BLOCK] * (2 * LINE_RADIUS + 1)
+        line[LINE_RADIUS] = LINE_OWN
+        for sign in (1, -1):
+            x, y = pos
+            for k in range(1, LINE_RADIUS + 1):
+                x += sign * dx
+                y += sign * dy
+                if not (0 <= x < self.ROWS and 0 <= y < self.COLS):
+                    break
+                bit = 1 << (x * BOARD_STRIDE + y)
+                if own & bit:
+                    line[LINE_RADIUS + sign * k] = LINE_OWN
+                elif empty & bit:
+                    line[LINE_RADIUS + sign * k] = LINE_EMPTY
+                else:
+                    break
+        return line
+
+    @staticmethod
+    def _runLength(line: List[int], center: int)->int:
+        """line中经过center的己方连续棋子数"""
+        left = center
+        while left > 0 and line[left - 1] == LINE_OWN:
+            left -= 1
+        right = center
+        while right < len(line) - 1 and line[right + 1] == LINE_OWN:
+            right += 1
+        return right - left + 1
+
+    def _isFive(self, piece: GoBangPiece, length: int)->bool:
+        if piece == GoBangPiece.BLACK and self.forbidRule:
+            return length == 5
+        return length >= 5
+
+    def _fivePoints(self, piece: GoBangPiece, line: List[int])->List[int]:
+        """在line上补一子即可与中心点构成五连的空位下标"""
+        result = []
+        for idx in range(LINE_RADIUS - 4, LINE_RADIUS + 5):
+            if line[idx] != LINE_EMPTY: continue
+            line[idx] = LINE_OWN
+            if self._isFive(piece, self._runLength(line, LINE_RADIUS)):
+                result.append(idx)
+            line[idx] = LINE_EMPTY
+        return result
+
+    def _countFour(self, piece: GoBangPiece, line: List[int])->Tuple[int, bool]:
+        """统计line上经过中心点的 `四` 的个数
+        @return: (四的个数, 是否为活四)
+        """
+        points = self._fivePoints(piece, line)
+        if len(points) == 2 and points[1] - points[0] == 5:
+            return 1, True
+        return len(points), False
+
+    def _hasOpenThree(self, piece: GoBangPiece, line: List[int])->bool:
+        """line上经过中心点是否存在 `活三` (再补一子即可形成活四)
+        注: 未递归判断补子点自身是否为禁手
+        """
+        for idx in range(LINE_RADIUS - 4, LINE_RADIUS + 5):
+            if line[idx] != LINE_EMPTY: continue
+            line[idx] = LINE_OWN
+            isFive = self._isFive(piece, self._runLength(line, LINE_RADIUS))
+            _, openFour = self._countFour(piece, line) if not isFive else (0, False)
+            line[idx] = LINE_EMPTY
+            if openFour:
+                return True
+        return False
+
+    def _runLengthBits(self, piece: GoBangPiece, pos: Tuple, direction: GoBangDirection)->int:
+        """直接在位棋盘上统计经过pos的某方向己方连续棋子数"""
+        own = self.bitboards[piece]
+        shift = goBangShift[direction]
+        idx = posToBit(pos)
+        length = 1
+        k = idx + shift
+        while own >> k & 1:
+            length += 1
+            k += shift
+        k = idx - shift
+        while k >= 0 and own >> k & 1:
+            length += 1
+            k -= shift
+        return length
+
     def _checkFive(self, piece: GoBangPiece, pos: Tuple)->bool:
-        """判断是否为 `五子连珠`"""
-        bufferAtPos = self.buffer[pos[0]][pos[1]]
-        for direction in range(4):
-            anotherDirection = negativeDirection(direction)
-            dist = bufferAtPos[direction][piece] + bufferAtPos[direction][piece]
-            if dist == 4:
+        """判断在pos落子后是否为 `五子连珠`"""
+        for direction in GoBangDirection:
+            if self._isFive(piece, self._runLengthBits(piece, pos, direction)):
                 return True
         return False
 
     def _checkChangLian(self, piece: GoBangPiece, pos: Tuple)->bool:
-        """判断是否为 `长连`"""
-        bufferAtPos = self.buffer[pos[0]][pos[1]]
-        for direction in range(4):
-            anotherDirection = negativeDirection(direction)
-            dist = bufferAtPos[direction][piece] + bufferAtPos[direction][piece]
-            if dist > 4:
+        """判断在pos落子后是否为 `长连`"""
+        for direction in GoBangDirection:
+            if self._runLengthBits(piece, pos, direction) > 5:
                 return True
         return False
-    def _checkMian(self, piece: GoBangPiece, pos: Tuple) -> bool:
-        """判断是否为 `眠n`"""
+
+    def _checkDouble4(self, piece: GoBangPiece, pos: Tuple)->bool:
+        """判断在pos落子后是否为 `双四` (含同一条线上的两个四)"""
+        fours = 0
+        for direction in GoBangDirection:
+            fours += self._countFour(piece, self._getLine(piece, pos, direction))[0]
+        return fours >= 2
+
     def _checkDouble3(self, piece: GoBangPiece, pos: Tuple)->bool:
-        """判断是否为 `双三`"""
-        bufferAtPos = self.buffer[pos[0]][pos[1]]
-        for dir1 in range(4):
-            dir2 = negativeDirection(dir1)
-            # TODO:
-        return False
-    def checkForbid(self, piece: GoBangPiece, pos: Tuple)->bool:
-        """判断是否为 `禁手`"""
-        if self._checkFive(piece, pos): return False
-        if self._checkChangLian(piece, pos): return True
-        if self._checkDouble3(piece, pos): return True
-        return False
-    def updateBuffer(self, pos: Tuple, piece: GoBangPiece):
-        """更新缓存"""
-        bufferAtPos = self.buffer[pos[0]][pos[1]]
-        for direction in range(8):
-            bufferAtPos[direction][0] = piece
-            dist = bufferAtPos[direction][piece] + 1
-            targetPos = self._step(pos, direction, dist)
-            if targetPos == None: continue
-            if self.checkerboard[targetPos[0]][targetPos[1]] != GoBangPiece.NOTHING:
+        """判断在pos落子后是否为 `双三`"""
+        threes = 0
+        for direction in GoBangDirection:
+            line = self._getLine(piece, pos, direction)
+            if self._countFour(piece, line)[0] > 0:
                 continue
-            targetBuffer = self.buffer[targetPos[0]][targetPos[1]]
-            targetLen = dist + bufferAtPos[negativeDirection(direction)][piece]
-            targetBuffer[negativeDirection(direction)][piece] = targetLen
-            if targetLen == 5:
-                self.doneFlag = True
+            if self._hasOpenThree(piece, line):
+                threes += 1
+        return threes >= 2
+
+    def checkForbid(self, piece: GoBangPiece, pos: Tuple)->bool:
+        """判断在pos落子是否为 `禁手`, 仅对黑棋生效"""
+        if piece != GoBangPiece.BLACK:
+            return False
+        if self.getPiece(pos) != GoBangPiece.NOTHING:
+            return False
+        bit = 1 << posToBit(pos)
+        self.bitboards[piece] |= bit
+        try:
+            if self._checkFive(piece, pos): return False
+            if self._checkChangLian(piece, pos): return True
+            if self._checkDouble4(piece, pos): return True
+            if self._checkDouble3(piece, pos): return True
+            return False
+        finally:
+            self.bitboards[piece] &= ~bit
+
     def done(self)->bool:
         return self.doneFlag
+
     def act(self, pos: Tuple)->bool:
-        """落子"""
+        """落子
+        @return: 是否落子成功 (越界、已有棋子、启用禁手规则时的黑棋禁手均失败)
+        """
         piece = self.currentPiece
-        if self.checkerboard[pos[0]][pos[1]] != GoBangPiece.NOTHING:
+        if not self.inBoard(pos) or self.getPiece(pos) != GoBangPiece.NOTHING:
+            return False
+        if self.forbidRule and self.checkForbid(piece, pos):
+            return False
+        self.bitboards[piece] |= 1 << posToBit(pos)
+        self.pieceOrder.append(pos)
+        self.doneFlag = self._checkFive(piece, pos)
+        self.currentPiece = GoBangPiece.BLACKWHITE - self.currentPiece
+        return True
+
+    def undo(self)->bool:
+        """悔棋, 撤销最后一手"""
+        if len(self.pieceOrder) == 0:
             return False
-        else:
-            self.checkerboard[pos[0]][pos[1]] = piece
-            self.pieceOrder.append(pos)
-        self.updateBuffer(pos, piece)
+        pos = self.pieceOrder.pop()
         self.currentPiece = GoBangPiece.BLACKWHITE - self.currentPiece
+        self.bitboards[self.currentPiece] &= ~(1 << posToBit(pos))
+        self.doneFlag = False
         return True
+
+    def legalMoves(self)->List[Tuple]:
+        """当前行棋方所有可落子的位置"""
+        result = []
+        empty = self.emptyBits()
+        while empty:
+            low = empty & -empty
+            idx = low.bit_length() - 1
+            empty ^= low
+            pos = (idx // BOARD_STRIDE, idx % BOARD_STRIDE)
+            if self.forbidRule and self.checkForbid(self.currentPiece, pos):
+                continue
+            result.append(pos)
+        return result
+
     def getPieceLocs(self)->List:
         return self.pieceOrder[::2], self.pieceOrder[1::2]
+
+def perft(game: GoBangGame, depth: int)->int:
+    """统计从当前局面出发搜索depth层的叶子节点数, 用于性能测试"""
+    if depth == 0 or game.done():
+        return 1
+    nodes = 0
+    for pos in game.legalMoves():
+        game.act(pos)
+        nodes += perft(game, depth - 1)
+        game.undo()
+    return nodes
+
 def drawGoBangPIC(black, white, groupId=''):
     global NROWS, NCOLS
     COLOR_BLACK = (0, 0, 0, 255)
@@ -167,3 +311,14 @@ def drawGoBangPIC(black, white, groupId=''):
     save_path=(f'{SAVE_TMP_PATH}/gobang-{groupId}.png')
     img.save(save_path)
     return save_path
+
+if __name__ == '__main__':
+    for forbidRule in [False, True]:
+        game = GoBangGame(forbidRule)
+        for pos in [(8, 8), (8, 9), (7, 7), (9, 9), (7, 9), (6, 6)]:
+            game.act(pos)
+        for depth in [1, 2]:
+            startTime = time.time()
+            nodes = perft(game, depth)
+            print('forbidRule = {}, depth = {}, nodes = {}, time = {:.3f}s'.format(
+                forbidRule, depth, nodes, time.time() - startTime))
@@ -0,0 +1,153 @@
+import time, bisect, requests
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock
+from typing import Dict, List, Tuple, Union, Any
+from icalendar import Calendar
+from utils.basicEvent import warning
+"""
+Canvas ICS 日历馈送缓存
+- 每个馈送链接保存 ETag / Last-Modified, 使用条件请求, 未变化时不重新下载和解析
+- 解析结果只保存一次, 按截止时间排序, 查询时二分跳过已过期的事件
+- 经常被查询的馈送由后台线程定期刷新
+"""
+FEED_MIN_REFRESH = 60 # 两次向服务器确认的最小间隔(秒)
+FEED_REFRESH_INTERVAL = 300 # 后台刷新热门馈送的间隔(秒)
+FEED_POPULAR_HITS = 2 # 一天内查询次数达到该值视为热门馈送
+FEED_EVICT_SECONDS = 3*24*3600 # 超过该时间未被查询的馈送从缓存移除
+FEED_REQUEST_TIMEOUT = 15
+FEED_REFRESH_WORKERS = 4
+
+class IcsEvent():
+    def __init__(self, deadline: float, summary: str, description: Union[str, None], deadlineStr: str, uid: str) -> None:
+        self.deadline = deadline # unix时间戳
+        self.summary = summary
+        self.description = description
+        self.deadlineStr = deadlineStr # eg: '2022-12-31 23:59'
+        self.uid = uid
+
+def parseIcs(content: bytes)->List[IcsEvent]:
+    """解析ics文件, 返回按截止时间排序的事件"""
+    events = []
+    for component in Calendar.from_ical(content).walk():
+        if component.name != "VEVENT" or component.get('dtend') == None:
+            continue
+        ddl_time = component.get('dtend').dt
+        if not isinstance(ddl_time, datetime):
+            ddl_time = datetime(ddl_time.year, ddl_time.month, ddl_time.day, 23, 59, 59)
+        else:
+            # canvas 给出的是UTC时间, 转为北京时间
+            ddl_time = ddl_time.replace(tzinfo=None) + timedelta(hours=8)
+        summary = component.get('summary')
+        description = component.get('description')
+        events.append(IcsEvent(time.mktime(ddl_time.timetuple()),
+            str(summary) if summary != None else '',
+            str(description) if description != None else None,
+            ddl_time.strftime("%Y-%m-%d %H:%M"),
+            str(component.get('uid', ''))))
+    events.sort(key=lambda e: e.deadline)
+    return events
+
+class FeedEntry():
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.etag: Union[str, None] = None
+        self.lastModified: Union[str, None] = None
+        self.events: List[IcsEvent] = []
+        self.deadlines: List[float] = []
+        self.checkTime = 0.0 # 上次向服务器确认的时间
+        self.loaded = False
+        self.hits: List[float] = [] # 最近一天的查询时间
+        self.lastUsed = time.time()
+        self.lock = Lock()
+
+class IcsFeedCache():
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.feeds: Dict[str, FeedEntry] = {}
+        self.refresher: Union[Thread, None] = None
+
+    def _entry(self, url: str)->FeedEntry:
+        with self.lock:
+            entry = self.feeds.get(url)
+            if entry == None:
+                entry = self.feeds[url] = FeedEntry(url)
+            return entry
+
+    def refresh(self, url: str, force: bool=False)->FeedEntry:
+        """必要时用条件请求刷新馈送, 失败时若已有缓存则沿用旧数据
+        @force: 忽略 FEED_MIN_REFRESH 立即向服务器确认
+        """
+        entry = self._entry(url)
+        entry.lastUsed = time.time()
+        with entry.lock:
+            if entry.loaded and not force and time.time() - entry.checkTime < FEED_MIN_REFRESH:
+                return entry
+            headers = {}
+            if entry.loaded and entry.etag != None:
+                headers['If-None-Match'] = entry.etag
+            if entry.loaded and entry.lastModified != None:
+                headers['If-Modified-Since'] = entry.lastModified
+            try:
+                ret = requests.get(url, headers=headers, timeout=FEED_REQUEST_TIMEOUT)
+                if ret.status_code == 304:
+                    entry.checkTime = time.time()
+                    return entry
+                if ret.status_code != requests.codes.ok:
+                    raise RuntimeError('status code {}'.format(ret.status_code))
+                events = parseIcs(ret.content)
+            except BaseException:
+                if entry.loaded:
+                    return entry
+                raise
+            entry.events = events
+            entry.deadlines = [e.deadline for e in events]
+            entry.etag = ret.headers.get('ETag')
+            entry.lastModified = ret.headers.get('Last-Modified')
+            entry.checkTime = time.time()
+            entry.loaded = True
+            return entry
+
+    def getEvents(self, url: str, after: Union[float, None]=None, countHit: bool=True)->List[IcsEvent]:
+        """获取截止时间晚于after(默认当前时间)的事件, 按截止时间排序
+        @countHit: 是否计入查询次数 (用于判断热门馈送), 后台任务应传False
+        """
+        now = time.time()
+        if countHit:
+            entry = self._entry(url)
+            entry.hits = [t for t in entry.hits if now - t < 24*3600] + [now]
+            self._ensureRefresher()
+        entry = self.refresh(url)
+        after = now if after == None else after
+        return entry.events[bisect.bisect_right(entry.deadlines, after):]
+
+    def _ensureRefresher(self)->None:
+        with self.lock:
+            if self.refresher == None or not self.refresher.is_alive():
+                self.refresher = Thread(target=self._refreshLoop, daemon=True)
+                self.refresher.start()
+
+    def _refreshLoop(self)->None:
+        while True:
+            time.sleep(FEED_REFRESH_INTERVAL)
+            now = time.time()
+            with self.lock:
+                for url in [url for url, entry in self.feeds.items() if now - entry.lastUsed > FEED_EVICT_SECONDS]:
+                    del self.feeds[url]
+                popular = [url for url, entry in self.feeds.items()
+                           if len([t for t in entry.hits if now - t < 24*3600]) >= FEED_POPULAR_HITS]
+            self.refreshMany(popular)
+
+    def refreshMany(self, urls: List[str], workers: int=FEED_REFRESH_WORKERS)->Dict[str, bool]:
+        """以有限并发刷新多个馈送, 返回 {url: 是否成功}"""
+        def work(url: str)->bool:
+            try:
+                self.refresh(url, force=True)
+                return True
+            except BaseException as e:
+                print('refresh ics feed failed: {}'.format(e))
+                return False
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(urls, executor.map(work, urls)))
+
+icsFeedCache = IcsFeedCache()
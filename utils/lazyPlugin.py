@@ -0,0 +1,88 @@
+import importlib, time
+from threading import Thread, Lock
+from typing import Union, Tuple, Any, List, Callable
+from utils.standardPlugin import StandardPlugin, TriggerMatch
+from utils.basicEvent import warning
+
+class LazyPlugin(StandardPlugin):
+    """插件的轻量描述, 真正的插件模块在首次触发或后台预热时才导入
+
+    @moduleName: 插件所在模块, eg: 'plugins.chatWithNLP'
+    @className:  插件类名, eg: 'ChatWithNLP'
+    @pluginInfo: 加载前用于help与插件组的插件信息, 格式同getPluginInfo()
+    @trigger:    轻量的触发预判, 必须覆盖真实插件的全部触发条件
+    @warmUp:     是否在后台预热时加载 (如含有定时轮询的插件)
+    @args:       构造插件时传入的参数
+    """
+    _registry: List['LazyPlugin'] = []
+    def __init__(self, moduleName: str, className: str, pluginInfo: dict,
+                 trigger: Callable[[str, Any], bool], warmUp: bool=False, args: tuple=()) -> None:
+        self.moduleName = moduleName
+        self.className = className
+        self.pluginInfo = pluginInfo
+        self.trigger = trigger
+        self.warmUp = warmUp
+        self.args = args
+        self.plugin: Union[StandardPlugin, None] = None
+        self.lock = Lock()
+        LazyPlugin._registry.append(self)
+
+    def load(self)->StandardPlugin:
+        if self.plugin != None:
+            return self.plugin
+        with self.lock:
+            if self.plugin == None:
+                module = importlib.import_module(self.moduleName)
+                self.plugin = getattr(module, self.className)(*self.args)
+        return self.plugin
+
+    def loaded(self)->bool:
+        return self.plugin != None
+
+    def judgeTrigger(self, msg: str, data: Any) -> bool:
+        if self.plugin != None:
+            return self.plugin.judgeTrigger(msg, data)
+        if not self.trigger(msg, data):
+            return False
+        return self.load().judgeTrigger(msg, data)
+
+    def executeEvent(self, msg: str, data: Any) -> Union[None, str]:
+        return self.load().executeEvent(msg, data)
+
+    def matchTrigger(self, msg: str, data: Any) -> Union[TriggerMatch, None]:
+        if self.plugin != None:
+            return self.plugin.matchTrigger(msg, data)
+        if not self.trigger(msg, data):
+            return None
+        return self.load().matchTrigger(msg, data)
+
+    def executeMatch(self, match: TriggerMatch, msg: str, data: Any) -> Union[None, str]:
+        return self.load().executeMatch(match, msg, data)
+
+    def getPluginInfo(self) -> dict:
+        if self.plugin != None:
+            return self.plugin.getPluginInfo()
+        return self.pluginInfo
+
+def loadLazyPlugins(warmUpAll: bool=False)->None:
+    """在当前线程中依次加载需要预热的懒加载插件
+    @warmUpAll: 若为True, 则加载所有懒加载插件
+    """
+    for plugin in list(LazyPlugin._registry):
+        if not (warmUpAll or plugin.warmUp):
+            continue
+        try:
+            plugin.load()
+        except BaseException as e:
+            warning("exception when warming up plugin [{}]: {}".format(plugin.className, e))
+
+def warmUpLazyPlugins(warmUpAll: bool=False, delay: float=0)->Thread:
+    """在后台线程中执行 loadLazyPlugins
+    @delay:     开始预热前等待的秒数
+    """
+    def worker():
+        time.sleep(delay)
+        loadLazyPlugins(warmUpAll)
+    thread = Thread(target=worker, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,111 @@
+import os, json, time, asyncio
+from threading import Thread, Lock
+from typing import Dict, List, Tuple, Union, Any, Callable
+from bilibili_api.live import LiveRoom
+from utils.basicEvent import warning
+"""
+B站直播间监控服务
+- 所有直播间在同一个常驻asyncio事件循环中轮询, 每轮并发请求全部直播间
+- 开播状态保存在内存中, 定期快照到 LIVE_SNAPSHOT_PATH, 重启后据此判断是否需要提醒
+- 状态变化时在线程池中调用订阅者回调 callback(roomId, isLive, roomInfo)
+"""
+LIVE_POLL_INTERVAL = 60 # 轮询间隔(秒)
+LIVE_REQUEST_TIMEOUT = 10
+LIVE_SNAPSHOT_INTERVAL = 300 # 状态快照间隔(秒)
+LIVE_SNAPSHOT_PATH = 'data/liveRooms.json'
+
+class LiveRoomMonitor():
+    def __init__(self, snapshotPath: str=LIVE_SNAPSHOT_PATH, interval: float=LIVE_POLL_INTERVAL) -> None:
+        self.snapshotPath = snapshotPath
+        self.interval = interval
+        self.lock = Lock()
+        self.rooms: Dict[int, LiveRoom] = {}
+        self.subscribers: Dict[int, Dict[str, Callable[[int, bool, dict], None]]] = {}
+        self.status: Dict[int, bool] = self._loadSnapshot()
+        self.roomInfo: Dict[int, Tuple[float, dict]] = {}
+        self.dirty = False
+        self.snapshotTime = time.time()
+        self.loop: Union[asyncio.AbstractEventLoop, None] = None
+
+    def _loadSnapshot(self)->Dict[int, bool]:
+        try:
+            with open(self.snapshotPath, 'r') as f:
+                return {int(k): v for k, v in json.load(f).items()}
+        except (OSError, json.JSONDecodeError, ValueError):
+            return {}
+
+    def _dumpSnapshot(self)->None:
+        try:
+            with open(self.snapshotPath, 'w') as f:
+                json.dump({str(k): v for k, v in self.status.items()}, f)
+            self.dirty = False
+            self.snapshotTime = time.time()
+        except OSError as e:
+            warning("error when dumping live room snapshot: {}".format(e))
+
+    def _ensureLoop(self)->asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop == None:
+                self.loop = asyncio.new_event_loop()
+                Thread(target=self.loop.run_forever, daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self._pollLoop(), self.loop)
+            return self.loop
+
+    def _room(self, roomId: int)->LiveRoom:
+        with self.lock:
+            if roomId not in self.rooms:
+                self.rooms[roomId] = LiveRoom(roomId)
+            return self.rooms[roomId]
+
+    def subscribe(self, roomId: int, name: str, callback: Callable[[int, bool, dict], None])->None:
+        """订阅直播间的开播/下播事件, 同名订阅会被替换"""
+        self._room(roomId)
+        with self.lock:
+            self.subscribers.setdefault(roomId, {})[name] = callback
+        self._ensureLoop()
+
+    async def _pollLoop(self)->None:
+        await asyncio.sleep(5)
+        while True:
+            try:
+                await self.pollOnce()
+            except BaseException as e:
+                warning("exception in live room monitor: {}".format(e))
+            if self.dirty and time.time() - self.snapshotTime >= LIVE_SNAPSHOT_INTERVAL:
+                self._dumpSnapshot()
+            await asyncio.sleep(self.interval)
+
+    async def pollOnce(self)->None:
+        with self.lock:
+            roomIds = [roomId for roomId in self.rooms.keys() if roomId in self.subscribers]
+        results = await asyncio.gather(*[asyncio.wait_for(self.rooms[roomId].get_room_info(), LIVE_REQUEST_TIMEOUT)
+                                         for roomId in roomIds], return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        for roomId, result in zip(roomIds, results):
+            if isinstance(result, BaseException):
+                warning("bilibili api exception for live room {}: {}".format(roomId, result))
+                continue
+            roomInfo = result['room_info']
+            self.roomInfo[roomId] = (time.time(), roomInfo)
+            isLive = roomInfo['live_status'] == 1
+            if self.status.get(roomId, False) == isLive:
+                continue
+            self.status[roomId] = isLive
+            self.dirty = True
+            with self.lock:
+                callbacks = list(self.subscribers.get(roomId, {}).values())
+            for callback in callbacks:
+                # 回调中会渲染图片等, 不能阻塞事件循环
+                loop.run_in_executor(None, callback, roomId, isLive, roomInfo)
+
+    def getRoomInfo(self, roomId: int, maxAge: float=LIVE_POLL_INTERVAL)->dict:
+        """获取直播间信息, 优先使用轮询得到的结果"""
+        cached = self.roomInfo.get(roomId)
+        if cached != None and time.time() - cached[0] < maxAge:
+            return cached[1]
+        future = asyncio.run_coroutine_threadsafe(self._room(roomId).get_room_info(), self._ensureLoop())
+        roomInfo = future.result(LIVE_REQUEST_TIMEOUT)['room_info']
+        self.roomInfo[roomId] = (time.time(), roomInfo)
+        return roomInfo
+
+liveRoomMonitor = LiveRoomMonitor()
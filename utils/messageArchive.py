@@ -0,0 +1,209 @@
+import os, io, sys, time, json, gzip
+from datetime import datetime
+from typing import Dict, List, Tuple, Union, Any
+import mysql.connector
+from utils.basicConfigs import sqlConfig, MESSAGE_ARCHIVE_DAYS, MESSAGE_ARCHIVE_PATH, MESSAGE_RETENTION_DAYS
+from utils.basicEvent import warning
+from utils.messageRecordIndex import hasIndex, addIndex
+try:
+    import zstandard
+except ImportError:
+    zstandard = None # 未安装zstandard时归档为 .jsonl.gz
+"""
+群聊记录的冷归档与保留期
+- messageRecord 的主键 (group_id, message_seq) 不含 time, 且表上有 FULLTEXT 索引, InnoDB 无法按月分区,
+  这里用滚动归档代替分区: 早于 MESSAGE_ARCHIVE_DAYS 天的记录按 (group_id, time) 索引逐群分批读出,
+  追加到 MESSAGE_ARCHIVE_PATH/<群号>/<YYYY-MM>.jsonl.zst (未安装 zstandard 时为 .jsonl.gz), 写入后再从表中删除
+- MESSAGE_RETENTION_DAYS 中列出的群, 超过保留期的记录从表中删除, 归档文件中过期的部分一并清除
+- 每批先追加文件再删除行, 中途退出时至多产生重复记录, 读取时按 message_seq 去重
+- queryMessages 合并归档与表中的记录, 供命令行查询与导出
+已有的 messageRecord 表需先运行一次 (耗时较长, 不在 bot 启动时执行):
+    python -m utils.messageArchive index
+之后建议每天由 cron 运行一次:
+    python -m utils.messageArchive run
+    python -m utils.messageArchive query 群号 2023-01-01 [2023-02-01] [关键词]
+"""
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_FIELDS = ('group_id', 'message_seq', 'message_id', 'time', 'user_id', 'nickname', 'card', 'message', 'recall')
+ARCHIVE_SUFFIXES = ('.jsonl.zst', '.jsonl.gz')
+ARCHIVE_INDEX = ('idx_group_time', '`group_id`, `time`')
+
+def monthOf(timestamp: float)->str:
+    return time.strftime('%Y-%m', time.localtime(timestamp))
+
+def monthRange(month: str)->Tuple[float, float]:
+    """某月的 [起始, 结束) 时间戳"""
+    start = datetime.strptime(month, '%Y-%m')
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return time.mktime(start.timetuple()), time.mktime(end.timetuple())
+
+def archiveFiles(groupId: int)->Dict[str, str]:
+    """{月份: 归档文件路径}"""
+    result = {}
+    groupDir = os.path.join(MESSAGE_ARCHIVE_PATH, str(groupId))
+    if not os.path.isdir(groupDir):
+        return result
+    for fileName in sorted(os.listdir(groupDir)):
+        for suffix in ARCHIVE_SUFFIXES:
+            if fileName.endswith(suffix):
+                result[fileName[:-len(suffix)]] = os.path.join(groupDir, fileName)
+    return result
+
+def appendArchive(groupId: int, month: str, rows: List[Dict[str, Any]])->None:
+    """追加一批记录, zstd 与 gzip 都支持多帧拼接, 追加不需要重写原文件"""
+    path = archiveFiles(groupId).get(month)
+    if path == None:
+        suffix = ARCHIVE_SUFFIXES[0] if zstandard != None else ARCHIVE_SUFFIXES[1]
+        path = os.path.join(MESSAGE_ARCHIVE_PATH, str(groupId), month + suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+    if path.endswith('.zst'):
+        if zstandard == None:
+            raise RuntimeError('zstandard is required to append to {}'.format(path))
+        data = zstandard.ZstdCompressor().compress(data)
+    else:
+        data = gzip.compress(data)
+    with open(path, 'ab') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+def readArchive(path: str)->List[Dict[str, Any]]:
+    with open(path, 'rb') as f:
+        if path.endswith('.zst'):
+            if zstandard == None:
+                raise RuntimeError('zstandard is required to read {}'.format(path))
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            text = io.TextIOWrapper(reader, encoding='utf-8').read()
+        else:
+            text = gzip.decompress(f.read()).decode('utf-8')
+    return [json.loads(line) for line in text.splitlines() if line != '']
+
+def rewriteArchive(path: str, rows: List[Dict[str, Any]])->None:
+    tmpPath = path + '.tmp'
+    data = ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+    if path.endswith('.zst'):
+        if zstandard == None:
+            raise RuntimeError('zstandard is required to rewrite {}'.format(path))
+        data = zstandard.ZstdCompressor().compress(data)
+    else:
+        data = gzip.compress(data)
+    with open(tmpPath, 'wb') as f:
+        f.write(data)
+    os.replace(tmpPath, path)
+
+def archiveMessages(archiveDays: int=MESSAGE_ARCHIVE_DAYS)->int:
+    """把早于 archiveDays 天的记录移入归档文件, 返回归档条数"""
+    cutoff = int(time.time() - archiveDays * 24 * 3600)
+    mydb = mysql.connector.connect(charset='utf8mb4', **sqlConfig)
+    mydb.autocommit = True
+    mycursor = mydb.cursor()
+    mycursor.execute("select distinct `group_id` from `BOT_DATA`.`messageRecord`")
+    groupIds = [groupId for groupId, in list(mycursor)]
+    total = 0
+    for groupId in groupIds:
+        while True:
+            mycursor.execute("""
+                select `group_id`, `message_seq`, `message_id`, unix_timestamp(`time`), `user_id`,
+                `nickname`, `card`, `message`, `recall` from `BOT_DATA`.`messageRecord`
+                where `group_id` = %s and `time` < from_unixtime(%s) order by `time` limit %s""",
+                (groupId, cutoff, ARCHIVE_BATCH_SIZE))
+            rows = [dict(zip(ARCHIVE_FIELDS, row)) for row in mycursor]
+            if len(rows) == 0:
+                break
+            buckets: Dict[str, List[Dict[str, Any]]] = {}
+            for row in rows:
+                row['time'] = int(row['time'])
+                row['recall'] = bool(row['recall'])
+                buckets.setdefault(monthOf(row['time']), []).append(row)
+            for month, bucket in buckets.items():
+                appendArchive(groupId, month, bucket)
+            mycursor.execute("""
+                delete from `BOT_DATA`.`messageRecord` where `group_id` = %s and `message_seq` in ({})
+                """.format(', '.join(['%s'] * len(rows))), (groupId, *[row['message_seq'] for row in rows]))
+            total += len(rows)
+    return total
+
+def enforceRetention(retentionDays: Dict[int, int]=MESSAGE_RETENTION_DAYS)->int:
+    """删除各群超过保留期的记录与归档, 返回删除的表中记录条数"""
+    mydb = mysql.connector.connect(charset='utf8mb4', **sqlConfig)
+    mydb.autocommit = True
+    mycursor = mydb.cursor()
+    total = 0
+    for groupId, days in retentionDays.items():
+        cutoff = time.time() - days * 24 * 3600
+        while True:
+            mycursor.execute("""
+                delete from `BOT_DATA`.`messageRecord`
+                where `group_id` = %s and `time` < from_unixtime(%s) limit %s""", (groupId, int(cutoff), ARCHIVE_BATCH_SIZE))
+            total += mycursor.rowcount
+            if mycursor.rowcount < ARCHIVE_BATCH_SIZE:
+                break
+        for month, path in archiveFiles(groupId).items():
+            monthStart, monthEnd = monthRange(month)
+            if monthEnd <= cutoff:
+                os.remove(path)
+            elif monthStart < cutoff:
+                rewriteArchive(path, [row for row in readArchive(path) if row['time'] >= cutoff])
+    return total
+
+def queryMessages(groupId: int, since: float, until: Union[float, None]=None, keyword: Union[str, None]=None)->List[Dict[str, Any]]:
+    """合并归档文件与 messageRecord 表, 按时间顺序返回 [since, until) 内的记录"""
+    if until == None:
+        until = time.time()
+    result: Dict[int, Dict[str, Any]] = {}
+    for month, path in archiveFiles(groupId).items():
+        monthStart, monthEnd = monthRange(month)
+        if monthEnd <= since or monthStart >= until:
+            continue
+        for row in readArchive(path):
+            if since <= row['time'] < until and (keyword == None or keyword in row['message']):
+                result[row['message_seq']] = row
+    mydb = mysql.connector.connect(charset='utf8mb4', **sqlConfig)
+    mycursor = mydb.cursor()
+    conditions = "`group_id` = %s and `time` >= from_unixtime(%s) and `time` < from_unixtime(%s)"
+    params: List[Any] = [groupId, int(since), int(until)]
+    if keyword != None:
+        conditions += " and instr(`message`, %s) > 0"
+        params.append(keyword)
+    mycursor.execute("""
+        select `group_id`, `message_seq`, `message_id`, unix_timestamp(`time`), `user_id`,
+        `nickname`, `card`, `message`, `recall` from `BOT_DATA`.`messageRecord`
+        where {}""".format(conditions), tuple(params))
+    for row in mycursor:
+        row = dict(zip(ARCHIVE_FIELDS, row))
+        row['time'] = int(row['time'])
+        row['recall'] = bool(row['recall'])
+        result[row['message_seq']] = row
+    return sorted(result.values(), key=lambda row: (row['time'], row['message_seq']))
+
+def parseDate(text: str)->float:
+    return time.mktime(datetime.strptime(text, '%Y-%m-%d').timetuple())
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == 'index':
+        startTime = time.time()
+        if addIndex(*ARCHIVE_INDEX):
+            print('index {} created in {:.1f}s'.format(ARCHIVE_INDEX[0], time.time() - startTime))
+        else:
+            print('index {} already exists'.format(ARCHIVE_INDEX[0]))
+    elif len(sys.argv) >= 2 and sys.argv[1] == 'run':
+        try:
+            if not hasIndex(ARCHIVE_INDEX[0]):
+                print('index {} is missing, run "python -m utils.messageArchive index" first'.format(ARCHIVE_INDEX[0]))
+                exit(1)
+            print('retention: deleted {} records'.format(enforceRetention()))
+            print('archive: moved {} records'.format(archiveMessages()))
+        except mysql.connector.Error as e:
+            warning("mysql error in messageArchive: {}".format(e))
+            exit(1)
+    elif len(sys.argv) >= 4 and sys.argv[1] == 'query':
+        until = parseDate(sys.argv[4]) if len(sys.argv) >= 5 else None
+        keyword = sys.argv[5] if len(sys.argv) >= 6 else None
+        for row in queryMessages(int(sys.argv[2]), parseDate(sys.argv[3]), until, keyword):
+            print(json.dumps(row, ensure_ascii=False))
+    else:
+        print('usage: python -m utils.messageArchive index')
+        print('       python -m utils.messageArchive run')
+        print('       python -m utils.messageArchive query <group_id> <since YYYY-MM-DD> [until YYYY-MM-DD] [keyword]')
+        exit(1)
@@ -0,0 +1,103 @@
+import re
+from functools import cached_property
+from typing import Dict, List, Tuple, Union
+"""
+消息解析
+分发前把消息文本包装成 ParsedMessage 再交给全部插件. ParsedMessage 是 str 的子类,
+原有按字符串处理 msg 的插件无需修改; CQ码分段、纯文本、@列表、回复id、参数等在首次访问时解析并缓存,
+同一条消息被多个插件使用时只解析一次
+参考链接： https://docs.go-cqhttp.org/cqcode/
+"""
+CQ_PATTERN = re.compile(r'\[CQ:([^,\]]+)((?:,[^,\]]*)*)\]')
+
+def unescapeCq(text: str)->str:
+    """CQ码参数与纯文本中的转义字符"""
+    if '&' not in text:
+        return text
+    return text.replace('&#44;', ',').replace('&#91;', '[').replace('&#93;', ']').replace('&amp;', '&')
+
+class CqSegment():
+    """消息段
+    @type: 'text' 或 CQ码类型, 如 'at', 'reply', 'image', 'face'
+    @data: CQ码参数, 文本段为 {'text': 文本}
+    @raw:  原始字符串
+    """
+    __slots__ = ('type', 'data', 'raw')
+    def __init__(self, type: str, data: Dict[str, str], raw: str) -> None:
+        self.type = type
+        self.data = data
+        self.raw = raw
+    def __repr__(self) -> str:
+        return 'CqSegment({}, {})'.format(self.type, self.data)
+
+class ParsedMessage(str):
+    """不可变的消息对象, 字符串内容即原消息 (已 strip)"""
+    @cached_property
+    def segments(self)->Tuple[CqSegment, ...]:
+        segments = []
+        pos = 0
+        for result in CQ_PATTERN.finditer(self):
+            if result.start() > pos:
+                raw = self[pos:result.start()]
+                segments.append(CqSegment('text', {'text': unescapeCq(raw)}, raw))
+            params = {}
+            for item in result.group(2).split(',')[1:]:
+                key, _, value = item.partition('=')
+                params[key] = unescapeCq(value)
+            segments.append(CqSegment(result.group(1), params, result.group(0)))
+            pos = result.end()
+        if pos < len(self):
+            raw = self[pos:]
+            segments.append(CqSegment('text', {'text': unescapeCq(raw)}, raw))
+        return tuple(segments)
+
+    @cached_property
+    def hasCq(self)->bool:
+        return '[CQ:' in self
+
+    @cached_property
+    def text(self)->str:
+        """去掉CQ码后的纯文本"""
+        if not self.hasCq:
+            return unescapeCq(str(self))
+        return ''.join(seg.data['text'] for seg in self.segments if seg.type == 'text').strip()
+
+    @cached_property
+    def mentions(self)->Tuple[int, ...]:
+        """被@的qq号, 按出现顺序, 不含@全体成员"""
+        if not self.hasCq:
+            return ()
+        return tuple(int(seg.data['qq']) for seg in self.segments
+                     if seg.type == 'at' and seg.data.get('qq', '').isdigit())
+
+    @cached_property
+    def replyId(self)->Union[int, None]:
+        """回复的消息id"""
+        if not self.hasCq:
+            return None
+        for seg in self.segments:
+            if seg.type == 'reply':
+                try:
+                    return int(seg.data.get('id', ''))
+                except ValueError:
+                    return None
+        return None
+
+    @cached_property
+    def args(self)->Tuple[str, ...]:
+        """按空白切分的参数, 等同于 msg.split()"""
+        return tuple(self.split())
+
+    @cached_property
+    def command(self)->str:
+        """第一个参数, 空消息为 ''"""
+        return self.args[0] if len(self.args) > 0 else ''
+
+    def startswithAny(self, prefixes: Union[List[str], Tuple[str, ...]])->bool:
+        return self.startswith(tuple(prefixes))
+
+def parseMessage(msg: str)->ParsedMessage:
+    """包装消息文本, 已经是 ParsedMessage 时原样返回以复用缓存"""
+    if isinstance(msg, ParsedMessage):
+        return msg
+    return ParsedMessage(msg)
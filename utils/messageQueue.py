@@ -0,0 +1,178 @@
+import time
+from collections import deque, OrderedDict
+from threading import Thread, Condition
+from typing import Dict, List, Tuple, Union, Any, Callable, Deque
+"""
+发送消息队列 (utils.basicEvent.send 的后端)
+- 全局与每个目标(群/私聊)各有一个令牌桶, 避免触发QQ风控
+- 优先级: 交互回复先于轮询推送, 同一优先级内各目标轮流发送
+- 同一目标连续的纯文本消息会合并为一条
+- send_msg 不是幂等的, 只有发送函数抛出 retryErrors 中的异常 (确定请求没有发出) 时才延迟后重试;
+  其他异常 (如读超时, go-cqhttp 可能已经发出消息) 与返回失败 (go-cqhttp 明确拒绝) 都不重试
+本模块只依赖标准库, 不要在这里导入 utils.basicEvent (会循环导入)
+"""
+PRIORITY_REPLY = 0      # 交互回复
+PRIORITY_BROADCAST = 1  # 轮询推送/群发
+
+MERGE_LIMIT = 1500 # 合并后消息的最大长度
+MAX_RETRY = 3
+RETRY_DELAY = 2.0
+
+class TokenBucket():
+    """@rate: 每秒补充的令牌数; @burst: 桶容量"""
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updateTime = time.time()
+
+    def _refill(self, now: float)->None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updateTime) * self.rate)
+        self.updateTime = now
+
+    def waitTime(self, now: float)->float:
+        """距离有可用令牌还需等待的秒数, 0表示当前可用"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float)->None:
+        self._refill(now)
+        self.tokens -= 1
+
+class OutMessage():
+    def __init__(self, type: str, id: int, message: str, priority: int,
+                 callbacks: Union[List[Callable[[bool], None]], None]=None) -> None:
+        self.type = type
+        self.id = id
+        self.message = message
+        self.priority = priority
+        self.callbacks = callbacks if callbacks != None else [] # 最终发送成功或放弃后调用, 参数为是否成功
+        self.attempts = 0
+        self.notBefore = 0.0
+
+    def mergeable(self)->bool:
+        return '[CQ:' not in self.message
+
+class OutboundQueue():
+    """
+    @sendFunc:    实际发送函数 sendFunc(type, id, message)->bool, 返回是否成功, 网络错误时抛出异常
+    @globalRate:  全局令牌桶 (rate, burst)
+    @targetRate:  每个目标的令牌桶 (rate, burst)
+    @retryErrors: 表示消息确定没有发出、可以重试的异常类型
+    """
+    def __init__(self, sendFunc: Callable[[str, int, str], bool],
+                 globalRate: Tuple[float, float], targetRate: Tuple[float, float],
+                 retryErrors: Tuple[type, ...]=()) -> None:
+        self.sendFunc = sendFunc
+        self.retryErrors = retryErrors
+        self.globalBucket = TokenBucket(*globalRate)
+        self.targetRate = targetRate
+        self.buckets: Dict[Tuple[str, int], TokenBucket] = {}
+        # priority -> target -> 消息队列, OrderedDict 用于各目标轮流发送
+        self.queues: Dict[int, OrderedDict] = {PRIORITY_REPLY: OrderedDict(), PRIORITY_BROADCAST: OrderedDict()}
+        self.cond = Condition()
+        self.thread: Union[Thread, None] = None
+
+    def put(self, type: str, id: int, message: str, priority: int=PRIORITY_REPLY,
+            callback: Union[Callable[[bool], None], None]=None)->None:
+        msg = OutMessage(type, id, message, priority, [] if callback == None else [callback])
+        with self.cond:
+            queue = self.queues[priority].get((type, id))
+            if queue == None:
+                queue = self.queues[priority][(type, id)] = deque()
+            queue.append(msg)
+            if self.thread == None or not self.thread.is_alive():
+                self.thread = Thread(target=self._worker, daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def setGlobalRate(self, rate: float, burst: float)->None:
+        with self.cond:
+            self.globalBucket = TokenBucket(rate, burst)
+            self.cond.notify()
+
+    def pending(self)->int:
+        with self.cond:
+            return sum(len(q) for queues in self.queues.values() for q in queues.values())
+
+    def _bucket(self, target: Tuple[str, int])->TokenBucket:
+        bucket = self.buckets.get(target)
+        if bucket == None:
+            bucket = self.buckets[target] = TokenBucket(*self.targetRate)
+        return bucket
+
+    def _pick(self, now: float)->Tuple[Union[List[OutMessage], None], float]:
+        """在持有锁时调用, 返回 (待发送的消息, 无可发送时的等待秒数)"""
+        wait = self.globalBucket.waitTime(now)
+        if wait > 0:
+            return None, wait
+        wait = 60.0
+        for priority in sorted(self.queues.keys()):
+            queues: OrderedDict = self.queues[priority]
+            for target in list(queues.keys()):
+                queue: Deque[OutMessage] = queues[target]
+                if len(queue) == 0:
+                    del queues[target]
+                    continue
+                if queue[0].notBefore > now:
+                    wait = min(wait, queue[0].notBefore - now)
+                    continue
+                bucketWait = self._bucket(target).waitTime(now)
+                if bucketWait > 0:
+                    wait = min(wait, bucketWait)
+                    continue
+                batch = [queue.popleft()]
+                if batch[0].mergeable():
+                    length = len(batch[0].message)
+                    while len(queue) > 0 and queue[0].mergeable() and length + len(queue[0].message) < MERGE_LIMIT:
+                        length += len(queue[0].message) + 1
+                        batch.append(queue.popleft())
+                if len(queue) == 0:
+                    del queues[target]
+                else:
+                    queues.move_to_end(target)
+                self.globalBucket.take(now)
+                self._bucket(target).take(now)
+                return batch, 0
+        return None, wait
+
+    def _worker(self)->None:
+        while True:
+            with self.cond:
+                while True:
+                    batch, wait = self._pick(time.time())
+                    if batch != None:
+                        break
+                    self.cond.wait(wait)
+            head = batch[0]
+            message = '\n'.join(msg.message for msg in batch)
+            retry = False
+            try:
+                ok = self.sendFunc(head.type, head.id, message)
+            except BaseException as e:
+                print('[messageQueue] send exception: {}'.format(e))
+                ok, retry = False, isinstance(e, self.retryErrors)
+            callbacks = [cb for msg in batch for cb in msg.callbacks]
+            if retry and head.attempts < MAX_RETRY:
+                self._retry(head, message, callbacks)
+                continue
+            if retry:
+                print('[messageQueue] drop message to {} {} after {} retries'.format(head.type, head.id, head.attempts))
+            for callback in callbacks:
+                try:
+                    callback(ok)
+                except BaseException as e:
+                    print('[messageQueue] callback exception: {}'.format(e))
+
+    def _retry(self, head: OutMessage, message: str, callbacks: List[Callable[[bool], None]])->None:
+        msg = OutMessage(head.type, head.id, message, head.priority, callbacks)
+        msg.attempts = head.attempts + 1
+        msg.notBefore = time.time() + RETRY_DELAY * msg.attempts
+        with self.cond:
+            queue = self.queues[msg.priority].get((msg.type, msg.id))
+            if queue == None:
+                queue = self.queues[msg.priority][(msg.type, msg.id)] = deque()
+            queue.appendleft(msg)
+            self.cond.notify()
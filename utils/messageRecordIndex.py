@@ -0,0 +1,40 @@
+import sys, time
+import mysql.connector
+from utils.basicConfigs import sqlConfig
+"""
+BOT_DATA.messageRecord 的二级索引
+- 新建的表在建表语句中自带这些索引; 已有的大表加索引耗时较长, 不在 bot 启动时执行, 需停机或低峰期运行一次:
+    python -m utils.messageRecordIndex
+- bot 启动时只用 hasIndex 检查, 缺少索引时告警, 功能仍可用但会退化为扫描
+"""
+MESSAGE_RECORD_INDEXES = {
+    'idx_message_id': '`group_id`, `message_id`', # 撤回时按 message_id 定位, 不再扫描整个群的记录
+}
+
+def hasIndex(indexName: str)->bool:
+    mydb = mysql.connector.connect(**sqlConfig)
+    mycursor = mydb.cursor()
+    mycursor.execute("""
+        select count(*) from information_schema.statistics
+        where table_schema = 'BOT_DATA' and table_name = 'messageRecord' and index_name = %s""", (indexName, ))
+    return list(mycursor)[0][0] > 0
+
+def addIndex(indexName: str, columns: str)->bool:
+    """缺少索引时创建, 返回是否新建了索引"""
+    if hasIndex(indexName):
+        return False
+    mydb = mysql.connector.connect(**sqlConfig)
+    mydb.autocommit = True
+    mycursor = mydb.cursor()
+    mycursor.execute("""
+        alter table `BOT_DATA`.`messageRecord`
+        add index `%s` (%s)"""%(indexName, columns))
+    return True
+
+if __name__ == '__main__':
+    for indexName, columns in MESSAGE_RECORD_INDEXES.items():
+        startTime = time.time()
+        if addIndex(indexName, columns):
+            print('index {} created in {:.1f}s'.format(indexName, time.time() - startTime))
+        else:
+            print('index {} already exists'.format(indexName))
@@ -0,0 +1,83 @@
+import sys, time
+from typing import List, Tuple, Union, Any
+import mysql.connector
+from utils.basicConfigs import sqlConfig
+from utils.basicEvent import warning
+"""
+群聊记录全文检索
+- 在 BOT_DATA.messageRecord.message 上建立 MySQL ngram FULLTEXT 索引 (ft_message), 插入时由 InnoDB 增量维护
+- 新建的 messageRecord 表自带该索引, 已有的表需运行一次:
+    python -m utils.messageSearch reindex           # 缺少索引时创建
+    python -m utils.messageSearch reindex --rebuild # 删除并重建 (大量删除/归档后整理索引)
+- 关键词长度需不小于 ngram_token_size (默认为2)
+"""
+FULLTEXT_INDEX = 'ft_message'
+SEARCH_PAGE_SIZE = 10
+SEARCH_MIN_KEYWORD = 2
+
+def hasFulltextIndex()->bool:
+    try:
+        mydb = mysql.connector.connect(**sqlConfig)
+        mycursor = mydb.cursor()
+        mycursor.execute("""
+            select count(*) from information_schema.statistics
+            where table_schema = 'BOT_DATA' and table_name = 'messageRecord' and index_name = %s""", (FULLTEXT_INDEX, ))
+        return list(mycursor)[0][0] > 0
+    except mysql.connector.Error as e:
+        warning("mysql error in hasFulltextIndex: {}".format(e))
+        return False
+
+def createFulltextIndex(rebuild: bool=False)->None:
+    """创建 ngram 全文索引, 大表上耗时较长, 不要在 bot 运行时调用"""
+    mydb = mysql.connector.connect(**sqlConfig)
+    mydb.autocommit = True
+    mycursor = mydb.cursor()
+    if hasFulltextIndex():
+        if not rebuild:
+            return
+        mycursor.execute("alter table `BOT_DATA`.`messageRecord` drop index `%s`"%FULLTEXT_INDEX)
+    mycursor.execute("""
+        alter table `BOT_DATA`.`messageRecord`
+        add fulltext index `%s` (`message`) with parser ngram"""%FULLTEXT_INDEX)
+
+def buildBooleanQuery(keywords: List[str])->str:
+    """每个关键词作为必须出现的短语"""
+    terms = []
+    for keyword in keywords:
+        keyword = keyword.replace('"', ' ').strip()
+        if keyword != '':
+            terms.append('+"%s"'%keyword)
+    return ' '.join(terms)
+
+def searchMessages(groupId: int, keywords: List[str], since: Union[float, None]=None, until: Union[float, None]=None,
+                   page: int=1, pageSize: int=SEARCH_PAGE_SIZE)->Tuple[List[Tuple[int, Any, int, str, str, str]], bool]:
+    """在群聊记录中检索, 按时间倒序分页
+    @since / until: unix时间戳, None表示不限
+    @return: ([(message_seq, time, user_id, nickname, card, message)], 是否还有下一页)
+    """
+    conditions = ["`group_id` = %s", "`recall` = false",
+                  "match(`message`) against (%s in boolean mode)"]
+    params: List[Any] = [groupId, buildBooleanQuery(keywords)]
+    if since != None:
+        conditions.append("`time` >= from_unixtime(%s)")
+        params.append(int(since))
+    if until != None:
+        conditions.append("`time` < from_unixtime(%s)")
+        params.append(int(until))
+    params.extend([pageSize + 1, (page - 1) * pageSize])
+    mydb = mysql.connector.connect(charset='utf8mb4', **sqlConfig)
+    mycursor = mydb.cursor()
+    mycursor.execute("""
+        select `message_seq`, `time`, `user_id`, `nickname`, `card`, `message`
+        from `BOT_DATA`.`messageRecord` where {}
+        order by `time` desc limit %s offset %s""".format(' and '.join(conditions)), tuple(params))
+    rows = list(mycursor)
+    return rows[:pageSize], len(rows) > pageSize
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'reindex':
+        print('usage: python -m utils.messageSearch reindex [--rebuild]')
+        exit(1)
+    startTime = time.time()
+    createFulltextIndex('--rebuild' in sys.argv)
+    print('fulltext index ready in {:.1f}s'.format(time.time() - startTime))
@@ -0,0 +1,200 @@
+import time, math
+from threading import Lock
+from typing import Dict, List, Tuple, Any
+"""
+插件分发的耗时与异常统计
+- 每个插件的 judgeTrigger / executeEvent 耗时直方图、命中次数、异常次数
+  插件组 (PluginGroupManager) 以组名统计整体耗时, 组内插件以各自的插件名另行统计, 耗时与异常使用同一名称
+- 发送消息 (send) 的耗时直方图
+- renderPrometheus() 输出 Prometheus 文本格式, 由 main.py 的 /metrics 提供
+本模块只依赖标准库, 不要在这里导入 utils.basicEvent (会循环导入)
+"""
+LATENCY_BUCKETS = [0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf]
+
+class Histogram():
+    """固定桶的耗时直方图, 调用方负责加锁"""
+    def __init__(self, buckets: List[float]=LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float)->None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def mean(self)->float:
+        return self.sum / self.count if self.count > 0 else 0.0
+
+    def quantile(self, q: float)->float:
+        """按桶上界估计分位数"""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        acc = 0
+        for bound, c in zip(self.buckets, self.counts):
+            acc += c
+            if acc >= target:
+                return bound if bound != math.inf else self.buckets[-2]
+        return self.buckets[-2]
+
+    def state(self)->Tuple[List[int], float, int]:
+        return list(self.counts), self.sum, self.count
+
+    def merge(self, state: Tuple[List[int], float, int])->None:
+        counts, total, count = state
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.sum += total
+        self.count += count
+
+    def render(self, name: str, labels: str)->List[str]:
+        lines = []
+        acc = 0
+        for bound, c in zip(self.buckets, self.counts):
+            acc += c
+            le = '+Inf' if bound == math.inf else repr(bound)
+            lines.append('%s_bucket{%sle="%s"} %d'%(name, labels + ',' if labels else '', le, acc))
+        suffix = '{%s}'%labels if labels else ''
+        lines.append('%s_sum%s %f'%(name, suffix, self.sum))
+        lines.append('%s_count%s %d'%(name, suffix, self.count))
+        return lines
+
+class PluginStat():
+    def __init__(self) -> None:
+        self.trigger = Histogram()
+        self.execute = Histogram()
+        self.hits = 0
+        self.errors = 0
+
+class PluginMetrics():
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.startTime = time.time()
+        self.stats: Dict[str, PluginStat] = {}
+        self.send = Histogram()
+        self.sendErrors = 0
+        self._names: Dict[int, str] = {}
+
+    def pluginName(self, plugin: Any)->str:
+        name = self._names.get(id(plugin))
+        if name == None:
+            try:
+                name = plugin.getPluginInfo()['name']
+            except BaseException:
+                name = type(plugin).__name__
+            self._names[id(plugin)] = name
+        return name
+
+    def _stat(self, name: str)->PluginStat:
+        stat = self.stats.get(name)
+        if stat == None:
+            stat = self.stats[name] = PluginStat()
+        return stat
+
+    def observeTrigger(self, name: str, elapsed: float, hit: bool)->None:
+        with self.lock:
+            stat = self._stat(name)
+            stat.trigger.observe(elapsed)
+            if hit: stat.hits += 1
+
+    def observeExecute(self, name: str, elapsed: float)->None:
+        with self.lock:
+            self._stat(name).execute.observe(elapsed)
+
+    def observeError(self, name: str)->None:
+        with self.lock:
+            self._stat(name).errors += 1
+
+    def observeSend(self, elapsed: float, ok: bool=True)->None:
+        with self.lock:
+            self.send.observe(elapsed)
+            if not ok: self.sendErrors += 1
+
+    def timedMatch(self, plugin: Any, msg: str, data: Any)->Any:
+        """计时调用 plugin.matchTrigger, 返回匹配结果, 异常计数后继续抛出"""
+        name = self.pluginName(plugin)
+        startTime = time.perf_counter()
+        try:
+            match = plugin.matchTrigger(msg, data)
+        except BaseException:
+            self.observeError(name)
+            raise
+        self.observeTrigger(name, time.perf_counter() - startTime, match != None)
+        return match
+
+    def timedExecute(self, plugin: Any, match: Any, msg: str, data: Any)->Any:
+        """计时调用 plugin.executeMatch, 异常计数后继续抛出"""
+        name = self.pluginName(plugin)
+        startTime = time.perf_counter()
+        try:
+            return plugin.executeMatch(match, msg, data)
+        except BaseException:
+            self.observeError(name)
+            raise
+        finally:
+            self.observeExecute(name, time.perf_counter() - startTime)
+
+    async def timedExecuteAsync(self, plugin: Any, match: Any, msg: str, data: Any)->Any:
+        """计时 await plugin.executeMatchAsync, 异常计数后继续抛出"""
+        name = self.pluginName(plugin)
+        startTime = time.perf_counter()
+        try:
+            return await plugin.executeMatchAsync(match, msg, data)
+        except BaseException:
+            self.observeError(name)
+            raise
+        finally:
+            self.observeExecute(name, time.perf_counter() - startTime)
+
+    def exportState(self)->Dict[str, Any]:
+        """可 pickle 的统计数据, 多进程模式下由 supervisor 汇总各 worker"""
+        with self.lock:
+            return {
+                'stats': {name: (stat.trigger.state(), stat.execute.state(), stat.hits, stat.errors)
+                          for name, stat in self.stats.items()},
+                'send': self.send.state(),
+                'sendErrors': self.sendErrors,
+            }
+
+    def mergeState(self, state: Dict[str, Any])->None:
+        with self.lock:
+            for name, (trigger, execute, hits, errors) in state['stats'].items():
+                stat = self._stat(name)
+                stat.trigger.merge(trigger)
+                stat.execute.merge(execute)
+                stat.hits += hits
+                stat.errors += errors
+            self.send.merge(state['send'])
+            self.sendErrors += state['sendErrors']
+
+    def summary(self, top: int=8)->List[Tuple[str, PluginStat]]:
+        """按executeEvent总耗时排序的插件统计"""
+        with self.lock:
+            items = list(self.stats.items())
+        items.sort(key=lambda x: x[1].execute.sum + x[1].trigger.sum, reverse=True)
+        return items[:top]
+
+    def renderPrometheus(self)->str:
+        lines = ['# TYPE bot_uptime_seconds gauge', 'bot_uptime_seconds %f'%(time.time() - self.startTime)]
+        with self.lock:
+            items = sorted(self.stats.items())
+            lines += ['# TYPE bot_plugin_trigger_seconds histogram']
+            for name, stat in items:
+                lines += stat.trigger.render('bot_plugin_trigger_seconds', 'plugin="%s"'%name)
+            lines += ['# TYPE bot_plugin_execute_seconds histogram']
+            for name, stat in items:
+                lines += stat.execute.render('bot_plugin_execute_seconds', 'plugin="%s"'%name)
+            lines += ['# TYPE bot_plugin_hits_total counter']
+            lines += ['bot_plugin_hits_total{plugin="%s"} %d'%(name, stat.hits) for name, stat in items]
+            lines += ['# TYPE bot_plugin_errors_total counter']
+            lines += ['bot_plugin_errors_total{plugin="%s"} %d'%(name, stat.errors) for name, stat in items]
+            lines += ['# TYPE bot_send_seconds histogram']
+            lines += self.send.render('bot_send_seconds', '')
+            lines += ['# TYPE bot_send_errors_total counter', 'bot_send_errors_total %d'%self.sendErrors]
+        return '\n'.join(lines) + '\n'
+
+pluginMetrics = PluginMetrics()
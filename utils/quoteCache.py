@@ -0,0 +1,215 @@
+import requests, json, time
+from threading import Lock
+from concurrent.futures import Future
+from typing import Dict, List, Tuple, Union, Any, Callable
+from utils.basicEvent import warning
+"""
+股票行情缓存层 (包装 utils.ashareAPI 所用的新浪/腾讯接口)
+- K线按 (code, frequency, count) 缓存, 有效期对齐到交易时段内下一根K线的结束时间
+- 同一key的并发请求只会向上游发起一次
+- 实时报价支持一次请求批量获取多只股票
+- 返回普通的list/dict, 不依赖pandas
+"""
+SINA_KLINE_URL = 'http://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData'
+TX_MIN_KLINE_URL = 'http://ifzq.gtimg.cn/appstock/app/kline/mkline'
+TX_DAY_KLINE_URL = 'http://web.ifzq.gtimg.cn/appstock/app/fqkline/get'
+TX_QUOTE_URL = 'http://qt.gtimg.cn/q='
+
+DAY_KLINE_TTL = 600 # 日/周/月线的缓存时间(秒)
+QUOTE_TTL = 5 # 实时报价的缓存时间(秒)
+REQUEST_TIMEOUT = 5
+KLINE_FIELDS = ['time', 'open', 'close', 'high', 'low', 'volume']
+TRADING_SESSIONS = [(9*60+30, 11*60+30), (13*60, 15*60)] # 北京时间的交易时段, 当日分钟数
+BEIJING_UTC_OFFSET = 8 * 3600
+
+class CoalescingCache():
+    """带过期时间的缓存, 同一key同时只有一个请求在路上"""
+    def __init__(self, maxSize: int=2048) -> None:
+        self.maxSize = maxSize
+        self.cache: Dict[Any, Tuple[float, Any]] = {}
+        self.inflight: Dict[Any, Future] = {}
+        self.lock = Lock()
+
+    def get(self, key: Any, fetch: Callable[[], Any], expireAt: Callable[[], float])->Any:
+        """
+        @key:      缓存key
+        @fetch:    缓存未命中时调用, 异常会抛给所有等待者
+        @expireAt: fetch成功后调用, 返回该结果的过期时间戳
+        """
+        with self.lock:
+            item = self.cache.get(key)
+            if item != None and item[0] > time.time():
+                return item[1]
+            future = self.inflight.get(key)
+            owner = future == None
+            if owner:
+                future = Future()
+                self.inflight[key] = future
+        if not owner:
+            return future.result()
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self.lock:
+                del self.inflight[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            if len(self.cache) >= self.maxSize:
+                now = time.time()
+                self.cache = {k: v for k, v in self.cache.items() if v[0] > now}
+                if len(self.cache) >= self.maxSize:
+                    self.cache.clear()
+            self.cache[key] = (expireAt(), value)
+            del self.inflight[key]
+        future.set_result(value)
+        return value
+
+    def peek(self, key: Any)->Any:
+        with self.lock:
+            item = self.cache.get(key)
+            if item != None and item[0] > time.time():
+                return item[1]
+            return None
+
+    def put(self, key: Any, value: Any, expire: float)->None:
+        with self.lock:
+            self.cache[key] = (expire, value)
+
+_klineCache = CoalescingCache()
+_quoteCache = CoalescingCache()
+
+def normalizeCode(code: str)->str:
+    """统一为上游接口使用的小写代码, 如 'SZ300059' -> 'sz300059', '000001.XSHG' -> 'sh000001'
+    get_quotes 返回值的key即为该格式
+    """
+    code = code.strip()
+    xcode = code.replace('.XSHG','').replace('.XSHE','')
+    return 'sh'+xcode if 'XSHG' in code else 'sz'+xcode if 'XSHE' in code else code.lower()
+
+def _barMinutes(frequency: str)->Union[int, None]:
+    """分钟线的K线周期, 日线及以上返回None"""
+    if frequency in ['1m','5m','15m','30m','60m']:
+        return int(frequency[:-1])
+    return None
+
+def _nextBarTime(frequency: str)->float:
+    """下一根K线的结束时间, 分钟线按A股交易时段对齐 (如60分钟线在 10:30/11:30/14:00/15:00 结束)
+    非交易时段缓存到下一交易时段的第一根K线结束, 不区分周末与节假日
+    """
+    minutes = _barMinutes(frequency)
+    now = time.time()
+    if minutes == None:
+        return now + DAY_KLINE_TTL
+    local = now + BEIJING_UTC_OFFSET
+    dayStart = local // 86400 * 86400
+    minuteOfDay = (local - dayStart) / 60
+    for day in (0, 1):
+        for start, end in TRADING_SESSIONS:
+            # 各交易时段长120分钟, 能被所有分钟线周期整除
+            for boundary in range(start + minutes, end + 1, minutes):
+                if day * 1440 + boundary > minuteOfDay:
+                    return dayStart - BEIJING_UTC_OFFSET + (day * 1440 + boundary) * 60
+    return now + DAY_KLINE_TTL
+
+def _fetchSina(code: str, count: int, frequency: str)->Dict[str, list]:
+    scale = {'1d': 240, '1w': 1200, '1M': 7200}.get(frequency)
+    scale = scale if scale != None else _barMinutes(frequency)
+    params = {'symbol': code, 'scale': scale, 'ma': 5, 'datalen': count}
+    bars = json.loads(requests.get(SINA_KLINE_URL, params=params, timeout=REQUEST_TIMEOUT).content)
+    result = {field: [] for field in KLINE_FIELDS}
+    for bar in bars:
+        result['time'].append(bar['day'])
+        for field in KLINE_FIELDS[1:]:
+            result[field].append(float(bar[field]))
+    return result
+
+def _fetchTx(code: str, count: int, frequency: str)->Dict[str, list]:
+    minutes = _barMinutes(frequency)
+    if minutes != None:
+        url = f'{TX_MIN_KLINE_URL}?param={code},m{minutes},,{count}'
+        data = json.loads(requests.get(url, timeout=REQUEST_TIMEOUT).content)['data'][code]
+        bars = data['m%d'%minutes]
+    else:
+        unit = 'week' if frequency == '1w' else 'month' if frequency == '1M' else 'day'
+        url = f'{TX_DAY_KLINE_URL}?param={code},{unit},,,{count},qfq'
+        data = json.loads(requests.get(url, timeout=REQUEST_TIMEOUT).content)['data'][code]
+        bars = data['qfq'+unit] if 'qfq'+unit in data else data[unit]
+    result = {field: [] for field in KLINE_FIELDS}
+    for bar in bars:
+        result['time'].append(bar[0])
+        for i, field in enumerate(KLINE_FIELDS[1:]):
+            result[field].append(float(bar[i+1]))
+    return result
+
+def get_price_cached(code: str, count: int=10, frequency: str='1d')->Dict[str, list]:
+    """带缓存的K线获取
+    @code: 股票代码, 如 'sz300059' 或 '000001.XSHG'
+    @count: K线数量
+    @frequency: '1m','5m','15m','30m','60m','1d','1w','1M'
+    @return: {'time': [...], 'open': [...], 'close': [...], 'high': [...], 'low': [...], 'volume': [...]}
+    """
+    code = normalizeCode(code)
+    def fetch():
+        if frequency == '1m': # 1分钟线只有腾讯接口
+            return _fetchTx(code, count, frequency)
+        try:
+            return _fetchSina(code, count, frequency)
+        except BaseException:
+            return _fetchTx(code, count, frequency)
+    return _klineCache.get((code, frequency, count), fetch, lambda: _nextBarTime(frequency))
+
+def _parseTxQuote(line: str)->Union[Tuple[str, dict], None]:
+    """解析形如 v_sz300059="51~东方财富~300059~17.05~..."; 的报价"""
+    if '="' not in line:
+        return None
+    key, value = line.split('="', 1)
+    fields = value.rstrip('";').split('~')
+    if len(fields) < 35:
+        return None
+    return key.strip()[2:], {
+        'name': fields[1],
+        'price': float(fields[3]),
+        'prevClose': float(fields[4]),
+        'open': float(fields[5]),
+        'volume': float(fields[6]),
+        'time': fields[30],
+        'change': float(fields[31]),
+        'changePercent': float(fields[32]),
+        'high': float(fields[33]),
+        'low': float(fields[34]),
+    }
+
+def get_quotes(codes: List[str])->Dict[str, dict]:
+    """批量获取实时报价, 未命中缓存的股票合并为一次上游请求
+    @return: {normalizeCode(code): {'name', 'price', 'prevClose', 'open', 'volume', 'time', 'change', 'changePercent', 'high', 'low'}}
+    """
+    codes = [normalizeCode(code) for code in codes]
+    result = {}
+    missing = []
+    for code in codes:
+        quote = _quoteCache.peek(code)
+        if quote != None:
+            result[code] = quote
+        else:
+            missing.append(code)
+    if len(missing) == 0:
+        return result
+    def fetch():
+        res = requests.get(TX_QUOTE_URL + ','.join(missing), timeout=REQUEST_TIMEOUT)
+        quotes = {}
+        for line in res.content.decode('gbk', errors='ignore').split(';'):
+            parsed = _parseTxQuote(line.strip())
+            if parsed != None:
+                quotes[parsed[0]] = parsed[1]
+        return quotes
+    try:
+        quotes = _quoteCache.get(tuple(sorted(missing)), fetch, lambda: time.time() + QUOTE_TTL)
+    except BaseException as e:
+        warning("error in get_quotes: {}".format(e))
+        return result
+    expire = time.time() + QUOTE_TTL
+    for code, quote in quotes.items():
+        _quoteCache.put(code, quote, expire)
+        result[code] = quote
+    return result
@@ -0,0 +1,117 @@
+import os, json, time
+from threading import Thread, Lock
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, NamedTuple, Union
+import utils.basicConfigs as basicConfigs
+from utils.basicEvent import warning
+"""
+可热更新的运行时配置
+- 启动时以 basicConfigs 中的 APPLY_GROUP_ID / ROOT_ADMIN_ID / sqlConfig 为默认值,
+  若存在 RUNTIME_CONFIG_PATH 则用其中的同名字段覆盖, 例如:
+  {"APPLY_GROUP_ID": [123456], "ROOT_ADMIN_ID": [10001], "sqlConfig": {"host": "127.0.0.1", "user": "root", "passwd": ""}}
+- 后台线程定期检查文件修改时间, 变化后解析出新的不可变快照并整体替换, 读取方拿到的总是完整的一份配置;
+  文件格式错误时保留旧配置并告警
+- 每次替换 version 加一, 依赖配置的缓存可以比较版本号或用 onReload 注册回调
+- 为兼容直接使用 basicConfigs 常量的代码, 替换时会原地更新 APPLY_GROUP_ID / ROOT_ADMIN_ID 列表与 sqlConfig 字典
+"""
+RUNTIME_CONFIG_PATH = 'data/runtimeConfig.json'
+RUNTIME_CONFIG_WATCH_INTERVAL = 5 # 检查配置文件的间隔(秒)
+
+class ConfigSnapshot(NamedTuple):
+    version: int
+    applyGroupIds: FrozenSet[int]
+    rootAdminIds: FrozenSet[int]
+    sqlConfig: Mapping[str, Any]
+
+class RuntimeConfig():
+    def __init__(self, path: str=RUNTIME_CONFIG_PATH) -> None:
+        self.path = path
+        self.lock = Lock()
+        self.listeners: List[Callable[[ConfigSnapshot], None]] = []
+        self.defaults = {
+            'APPLY_GROUP_ID': list(basicConfigs.APPLY_GROUP_ID),
+            'ROOT_ADMIN_ID': list(basicConfigs.ROOT_ADMIN_ID),
+            'sqlConfig': dict(basicConfigs.sqlConfig),
+        }
+        self.mtime: Union[float, None] = None
+        self.snapshot = self._build(self.defaults, 0)
+        self.thread: Union[Thread, None] = None
+        self.reload()
+
+    def current(self)->ConfigSnapshot:
+        return self.snapshot
+
+    def onReload(self, callback: Callable[[ConfigSnapshot], None])->None:
+        """配置替换后调用 callback(新快照)"""
+        self.listeners.append(callback)
+
+    @staticmethod
+    def _build(values: Dict[str, Any], version: int)->ConfigSnapshot:
+        return ConfigSnapshot(version,
+            frozenset(int(x) for x in values['APPLY_GROUP_ID']),
+            frozenset(int(x) for x in values['ROOT_ADMIN_ID']),
+            MappingProxyType(dict(values['sqlConfig'])))
+
+    def _load(self)->Dict[str, Any]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+        if not isinstance(overrides, dict):
+            raise ValueError('runtime config must be a json object')
+        values = dict(self.defaults)
+        for key in values.keys():
+            if key not in overrides.keys():
+                continue
+            expected = dict if key == 'sqlConfig' else list
+            if not isinstance(overrides[key], expected):
+                raise ValueError('{} must be a {}'.format(key, expected.__name__))
+            values[key] = overrides[key]
+        return values
+
+    def reload(self)->bool:
+        """配置文件有变化时重新加载, 返回是否替换了配置"""
+        with self.lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                mtime = None
+            if mtime == self.mtime:
+                return False
+            try:
+                values = self._load() if mtime != None else self.defaults
+                snapshot = self._build(values, self.snapshot.version + 1)
+            except (OSError, ValueError, TypeError) as e:
+                warning("invalid runtime config {}, keep version {}: {}".format(self.path, self.snapshot.version, e))
+                self.mtime = mtime
+                return False
+            self.mtime = mtime
+            self.snapshot = snapshot
+            self._mirror(snapshot)
+        for callback in self.listeners:
+            try:
+                callback(snapshot)
+            except BaseException as e:
+                warning("exception in runtime config listener: {}".format(e))
+        return True
+
+    @staticmethod
+    def _mirror(snapshot: ConfigSnapshot)->None:
+        basicConfigs.APPLY_GROUP_ID[:] = sorted(snapshot.applyGroupIds)
+        basicConfigs.ROOT_ADMIN_ID[:] = sorted(snapshot.rootAdminIds)
+        sqlConfig = basicConfigs.sqlConfig
+        sqlConfig.update(snapshot.sqlConfig)
+        for key in [key for key in sqlConfig.keys() if key not in snapshot.sqlConfig]:
+            del sqlConfig[key]
+
+    def start(self)->None:
+        """启动后台线程监视配置文件"""
+        with self.lock:
+            if self.thread == None or not self.thread.is_alive():
+                self.thread = Thread(target=self._watchLoop, daemon=True)
+                self.thread.start()
+
+    def _watchLoop(self)->None:
+        while True:
+            time.sleep(RUNTIME_CONFIG_WATCH_INTERVAL)
+            self.reload()
+
+runtimeConfig = RuntimeConfig()
@@ -1,12 +1,38 @@
+import functools
 from abc import ABC, abstractmethod
 from typing import Union, Tuple, Any, List
 from utils.basicEvent import send, warning, readGlobalConfig, writeGlobalConfig, getGroupAdmins
+from utils.startupProfiler import startupProfiler
+from utils.pluginMetrics import pluginMetrics
+
+class TriggerMatch():
+    """judgeTrigger 的匹配结果, 由 matchTrigger 返回并原样传给 executeMatch
+    @plugin: 匹配到的插件
+    @args:   匹配时捕获的参数, 如正则分组, 避免执行时再匹配一次
+    @inner:  插件组中实际匹配到的子插件的匹配结果
+    """
+    def __init__(self, plugin: 'StandardPlugin', args: tuple=(), inner: Union['TriggerMatch', None]=None) -> None:
+        self.plugin = plugin
+        self.args = args
+        self.inner = inner
 
 class StandardPlugin(ABC):
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        # 启动分析模式下统计插件构造函数耗时
+        if startupProfiler.enabled and '__init__' in cls.__dict__:
+            init = cls.__init__
+            @functools.wraps(init)
+            def timedInit(self, *args, **kwargs):
+                with startupProfiler.pluginInit(type(self).__name__):
+                    init(self, *args, **kwargs)
+            cls.__init__ = timedInit
+
     @abstractmethod
     def judgeTrigger(self, msg:str, data:Any) -> bool:
         """
-        @msg: message text
+        @msg: message text, 分发时为 utils.messageParser.ParsedMessage (str 的子类),
+              可通过 msg.mentions / msg.replyId / msg.args 等使用缓存的解析结果
         @data: all the message data, including group_id or user_id
         @return: whether trigger this class
         """
@@ -23,6 +49,23 @@ class StandardPlugin(ABC):
         """
         raise NotImplementedError
 
+    def matchTrigger(self, msg:str, data:Any) -> Union[TriggerMatch, None]:
+        """
+        @return: 匹配结果, None表示不触发
+        分发时调用本方法代替 judgeTrigger, 匹配结果只在本次分发中传递, 不要保存在插件实例上
+        需要复用匹配过程 (如正则分组) 的插件可以重写本方法与 executeMatch
+        """
+        if self.judgeTrigger(msg, data):
+            return TriggerMatch(self)
+        return None
+
+    def executeMatch(self, match:TriggerMatch, msg:str, data:Any) -> Union[None, str]:
+        """
+        @match: matchTrigger 返回的匹配结果
+        @return: 同 executeEvent
+        """
+        return self.executeEvent(msg, data)
+
     @abstractmethod
     def getPluginInfo(self)->dict:
         """
@@ -55,7 +98,6 @@ class PluginGroupManager(StandardPlugin):
     def __init__(self, plugins:List[StandardPlugin], groupName: str, groupInfo:dict = {}) -> None:
         self.plugins = plugins
         self.groupName = groupName
-        self.readyPlugin = None
         self.enabledDict = readGlobalConfig(None, groupName+'.enable')
         self.defaultEnabled = False
         self.groupInfo = groupInfo
@@ -84,29 +126,24 @@ class PluginGroupManager(StandardPlugin):
             warning('all plugins should be able to use in group, error in {}'.format(self.groupName))
         self.groupInfo['usePlace'] = ['group']
 
-    def judgeTrigger(self, msg:str, data:Any)->bool:
+    def matchTrigger(self, msg:str, data:Any)->Union[TriggerMatch, None]:
+        # 匹配结果通过返回值传递, 不保存在实例上, 可被多个线程同时调用
         userId = data['user_id']
         groupId = data['group_id']
         if msg == '-grpcfg enable %s'%self.groupName and userId in getGroupAdmins(groupId):
-            self.readyPlugin = 'enable'
-            return True
+            return TriggerMatch(self, ('enable', ))
         if msg == '-grpcfg disable %s'%self.groupName and userId in getGroupAdmins(groupId):
-            self.readyPlugin = 'disable'
-            return True
+            return TriggerMatch(self, ('disable', ))
         if not self.queryEnabled(groupId):
-            return False
-        for plugin in self.plugins:
-            if plugin.judgeTrigger(msg, data):
-                self.readyPlugin = plugin
-                return True
-        return False
-    def executeEvent(self, msg:str, data:Any)->Union[None, str]:
-        if self.readyPlugin == None:
-            warning("logic error in PluginGroupManager: executeEvent self.readyPlugin == None")
             return None
-        if self.readyPlugin in ['enable', 'disable']:
-            enabled = self.readyPlugin == 'enable'
-            self.readyPlugin = None
+        for plugin in self.plugins:
+            match = pluginMetrics.timedMatch(plugin, msg, data)
+            if match != None:
+                return TriggerMatch(self, inner=match)
+        return None
+    def executeMatch(self, match:TriggerMatch, msg:str, data:Any)->Union[None, str]:
+        if match.inner == None:
+            enabled = match.args[0] == 'enable'
             groupId = data["group_id"]
             if self.queryEnabled(groupId) != enabled:
                 writeGlobalConfig(groupId, self.groupName + '.enable', enabled)
@@ -115,12 +152,26 @@ class PluginGroupManager(StandardPlugin):
             return "OK"
         else:
             try:
-                result = self.readyPlugin.executeEvent(msg, data)
-                self.readyPlugin = None
-                return result
+                return pluginMetrics.timedExecute(match.inner.plugin, match.inner, msg, data)
             except Exception as e:
                 warning("logic error in PluginGroupManager [{}]: {}".format(self.groupName, e))
                 return None
+    async def executeMatchAsync(self, match:TriggerMatch, msg:str, data:Any)->Union[None, str]:
+        # 组内插件为异步插件时, 由 AsyncDispatcher 在事件循环中直接 await, 不占用线程
+        try:
+            return await pluginMetrics.timedExecuteAsync(match.inner.plugin, match.inner, msg, data)
+        except Exception as e:
+            warning("logic error in PluginGroupManager [{}]: {}".format(self.groupName, e))
+            return None
+    def judgeTrigger(self, msg:str, data:Any)->bool:
+        return self.matchTrigger(msg, data) != None
+    def executeEvent(self, msg:str, data:Any)->Union[None, str]:
+        # 兼容直接调用 judgeTrigger/executeEvent 的代码, 重新匹配一次
+        match = self.matchTrigger(msg, data)
+        if match == None:
+            warning("logic error in PluginGroupManager [{}]: executeEvent without match".format(self.groupName))
+            return None
+        return self.executeMatch(match, msg, data)
     def getPluginInfo(self, )->dict:
         return self.groupInfo
     def queryEnabled(self, groupId: int)->bool:
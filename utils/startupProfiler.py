@@ -0,0 +1,140 @@
+"""
+启动耗时分析
+用法: python main.py --profile-startup [--profile-json <path>] [--startup-budget <seconds>]
+    统计每个模块的导入耗时、每个插件构造函数的耗时以及启动各阶段的耗时 (含同步加载全部懒加载插件),
+    打印表格(或写入json)后退出, 总耗时超过预算时以返回码1退出, 可用于CI
+本模块只依赖标准库, 需要在其它模块导入之前启用
+"""
+import sys, time, json, threading
+import importlib.abc
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+class _TimedLoader(importlib.abc.Loader):
+    """包装原loader, 统计exec_module耗时"""
+    def __init__(self, loader, profiler: 'StartupProfiler') -> None:
+        self.loader = loader
+        self.profiler = profiler
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+    def exec_module(self, module):
+        with self.profiler._timeImport(module.__name__):
+            self.loader.exec_module(module)
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+class _TimedFinder(importlib.abc.MetaPathFinder):
+    def __init__(self, profiler: 'StartupProfiler') -> None:
+        self.profiler = profiler
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec != None:
+                if spec.loader != None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self.profiler)
+                return spec
+        return None
+
+class StartupProfiler():
+    def __init__(self) -> None:
+        self.enabled = False
+        self.startTime = time.time()
+        self.imports: Dict[str, List[float]] = {} # module -> [inclusive, self]
+        self.plugins: List[Tuple[str, float]] = []
+        self.phases: List[Tuple[str, float]] = []
+        self._importStack: List[float] = []
+        self._phaseStack: List[Tuple[str, float]] = []
+        self._local = threading.local()
+
+    def enable(self)->None:
+        if self.enabled: return
+        self.enabled = True
+        self.startTime = time.time()
+        sys.meta_path.insert(0, _TimedFinder(self))
+
+    def disable(self)->None:
+        self.enabled = False
+        sys.meta_path[:] = [f for f in sys.meta_path if not isinstance(f, _TimedFinder)]
+
+    @contextmanager
+    def _timeImport(self, moduleName: str):
+        if threading.current_thread() is not threading.main_thread():
+            yield
+            return
+        self._importStack.append(0.0)
+        startTime = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - startTime
+            childTime = self._importStack.pop()
+            self.imports[moduleName] = [elapsed, elapsed - childTime]
+            if len(self._importStack) > 0:
+                self._importStack[-1] += elapsed
+
+    def beginPhase(self, name: str)->None:
+        self._phaseStack.append((name, time.time()))
+
+    def endPhase(self)->None:
+        name, startTime = self._phaseStack.pop()
+        if self.enabled:
+            self.phases.append((name, time.time() - startTime))
+
+    @contextmanager
+    def phase(self, name: str):
+        """统计一个启动阶段的耗时"""
+        self.beginPhase(name)
+        try:
+            yield
+        finally:
+            self.endPhase()
+
+    @contextmanager
+    def pluginInit(self, pluginName: str):
+        """统计插件构造函数的耗时, 只记录最外层的构造"""
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        startTime = time.time()
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if self.enabled and depth == 0:
+                self.plugins.append((pluginName, time.time() - startTime))
+
+    def report(self, top: int=30)->dict:
+        imports = sorted(self.imports.items(), key=lambda x: x[1][0], reverse=True)
+        return {
+            'total': time.time() - self.startTime,
+            'phases': [{'name': n, 'time': t} for n, t in self.phases],
+            'plugins': [{'name': n, 'time': t} for n, t in sorted(self.plugins, key=lambda x: x[1], reverse=True)],
+            'imports': [{'module': m, 'inclusive': t[0], 'self': t[1]} for m, t in imports[:top]],
+        }
+
+    def formatTable(self, report: dict)->str:
+        lines = ['[startup] total %.3fs'%report['total'], '', '%-40s %10s'%('phase', 'time(s)')]
+        lines += ['%-40s %10.3f'%(x['name'], x['time']) for x in report['phases']]
+        lines += ['', '%-40s %10s'%('plugin constructor', 'time(s)')]
+        lines += ['%-40s %10.3f'%(x['name'], x['time']) for x in report['plugins']]
+        lines += ['', '%-40s %10s %10s'%('module import', 'incl(s)', 'self(s)')]
+        lines += ['%-40s %10.3f %10.3f'%(x['module'], x['inclusive'], x['self']) for x in report['imports']]
+        return '\n'.join(lines)
+
+    def finish(self, argv: List[str])->None:
+        """输出报告并退出"""
+        report = self.report()
+        if '--profile-json' in argv:
+            with open(argv[argv.index('--profile-json') + 1], 'w') as f:
+                json.dump(report, f, indent=4, ensure_ascii=False)
+        else:
+            print(self.formatTable(report))
+        if '--startup-budget' in argv:
+            budget = float(argv[argv.index('--startup-budget') + 1])
+            if report['total'] > budget:
+                print('[startup] total {:.3f}s exceeds budget {:.3f}s'.format(report['total'], budget))
+                sys.exit(1)
+        sys.exit(0)
+
+startupProfiler = StartupProfiler()
@@ -0,0 +1,138 @@
+import mysql.connector
+import bisect, time
+from threading import Lock
+from typing import Dict, List, Set, Tuple, Union, Any
+from utils.basicConfigs import sqlConfig
+from utils.basicEvent import warning
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    lazy_pinyin = None # 未安装pypinyin时不支持拼音首字母检索
+
+STOCK_INDEX_TTL = 24 * 3600 # 股票代码表的重新加载周期(秒)
+
+# 排序优先级, 越小越靠前
+RANK_CODE_EXACT = 0
+RANK_CODE_PREFIX = 1
+RANK_NAME_EXACT = 2
+RANK_NAME_PREFIX = 3
+RANK_NAME_CONTAIN = 4
+RANK_FULLNAME_CONTAIN = 5
+RANK_PINYIN_PREFIX = 6
+RANK_PINYIN_CONTAIN = 7
+
+def _grams(text: str)->Set[str]:
+    """文本的一元与二元gram"""
+    result = set(text)
+    for i in range(len(text) - 1):
+        result.add(text[i:i+2])
+    return result
+
+def _pinyinInitials(text: str)->str:
+    if lazy_pinyin == None:
+        return ''
+    return ''.join(lazy_pinyin(text, style=Style.FIRST_LETTER, errors='default')).lower()
+
+class StockSymbolIndex():
+    """STOCKS.stockCode 的内存索引: 代码精确/前缀查找, 名称n-gram倒排, 拼音首字母检索"""
+    def __init__(self) -> None:
+        self.rows: List[Tuple[str, str, str, str]] = [] # (ashareCode, name, fullName, industry)
+        self.codeMap: Dict[str, int] = {}
+        self.sortedCodes: List[Tuple[str, int]] = [] # (code或去掉市场前缀的数字代码, row)
+        self.nameGrams: Dict[str, Set[int]] = {}
+        self.pinyinGrams: Dict[str, Set[int]] = {}
+        self.pinyins: List[str] = []
+        self.loadTime = 0
+        self.lock = Lock()
+
+    def _load(self):
+        mydb = mysql.connector.connect(**sqlConfig)
+        mycursor = mydb.cursor()
+        mycursor.execute("select ashareCode, name, fullName, industry from STOCKS.stockCode")
+        rows = [tuple('' if x == None else str(x) for x in r) for r in list(mycursor)]
+        codeMap, sortedCodes, nameGrams, pinyinGrams, pinyins = {}, [], {}, {}, []
+        for idx, (ashareCode, name, fullName, industry) in enumerate(rows):
+            code = ashareCode.lower()
+            codeMap[code] = idx
+            sortedCodes.append((code, idx))
+            digits = code.lstrip('abcdefghijklmnopqrstuvwxyz')
+            if digits != code:
+                sortedCodes.append((digits, idx))
+            for gram in _grams(name) | _grams(fullName):
+                nameGrams.setdefault(gram, set()).add(idx)
+            pinyin = _pinyinInitials(name)
+            pinyins.append(pinyin)
+            for gram in _grams(pinyin):
+                pinyinGrams.setdefault(gram, set()).add(idx)
+        sortedCodes.sort()
+        self.rows, self.codeMap, self.sortedCodes = rows, codeMap, sortedCodes
+        self.nameGrams, self.pinyinGrams, self.pinyins = nameGrams, pinyinGrams, pinyins
+        self.loadTime = time.time()
+
+    def _ensureLoaded(self):
+        with self.lock:
+            if time.time() - self.loadTime < STOCK_INDEX_TTL:
+                return
+            try:
+                self._load()
+            except mysql.connector.Error as e:
+                warning("mysql error in StockSymbolIndex: {}".format(e))
+
+    @staticmethod
+    def _lookupGrams(index: Dict[str, Set[int]], text: str)->Set[int]:
+        """通过n-gram倒排求候选集合, 候选仍需做子串校验"""
+        grams = [text[i:i+2] for i in range(len(text) - 1)] if len(text) > 1 else [text]
+        result = None
+        for gram in sorted(grams, key=lambda g: len(index.get(g, ()))):
+            candidates = index.get(gram)
+            if candidates == None:
+                return set()
+            result = set(candidates) if result == None else result & candidates
+            if len(result) == 0:
+                break
+        return result if result != None else set()
+
+    def getByCode(self, code: str)->Union[Tuple[str, str, str, str], None]:
+        self._ensureLoaded()
+        idx = self.codeMap.get(code.lower())
+        return None if idx == None else self.rows[idx]
+
+    def search(self, keyword: str)->List[Tuple[str, str, str, str]]:
+        """按相关度排序的检索结果"""
+        self._ensureLoaded()
+        keyword = keyword.strip()
+        if len(keyword) == 0:
+            return []
+        ranks: Dict[int, int] = {}
+        def hit(idx: int, rank: int):
+            if rank < ranks.get(idx, rank + 1):
+                ranks[idx] = rank
+        lowered = keyword.lower()
+        # 代码前缀
+        start = bisect.bisect_left(self.sortedCodes, (lowered, -1))
+        for code, idx in self.sortedCodes[start:]:
+            if not code.startswith(lowered): break
+            hit(idx, RANK_CODE_EXACT if code == lowered else RANK_CODE_PREFIX)
+        # 名称/全称
+        for idx in self._lookupGrams(self.nameGrams, keyword):
+            _, name, fullName, _ = self.rows[idx]
+            if name == keyword:
+                hit(idx, RANK_NAME_EXACT)
+            elif name.startswith(keyword):
+                hit(idx, RANK_NAME_PREFIX)
+            elif keyword in name:
+                hit(idx, RANK_NAME_CONTAIN)
+            elif keyword in fullName:
+                hit(idx, RANK_FULLNAME_CONTAIN)
+        # 拼音首字母
+        if lowered.isascii() and lowered.isalpha():
+            for idx in self._lookupGrams(self.pinyinGrams, lowered):
+                pinyin = self.pinyins[idx]
+                if pinyin.startswith(lowered):
+                    hit(idx, RANK_PINYIN_PREFIX)
+                elif lowered in pinyin:
+                    hit(idx, RANK_PINYIN_CONTAIN)
+        order = sorted(ranks.keys(), key=lambda idx: (ranks[idx], self.rows[idx][0]))
+        return [self.rows[idx] for idx in order]
+
+stockSymbolIndex = StockSymbolIndex()
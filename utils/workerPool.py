@@ -0,0 +1,212 @@
+import sys, time, queue, itertools, multiprocessing
+from multiprocessing.connection import wait
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock, Condition
+from typing import Dict, List, Union, Any, Callable
+"""
+多进程部署模式: python main.py --workers N
+- 主进程 (supervisor) 只负责接收上报事件, 按 group_id (私聊按 user_id) 取模分片, 投递到对应 worker 进程
+  同一个群的事件总在同一个 worker 中处理, 轮盘赌、五子棋、插件组开关等进程内状态保持一致
+- worker 进程导入 main 并构造全部插件, 各自持有独立的插件状态 (shared-nothing)
+- invalidate(topic) 会通知所有 worker 执行 onInvalidate 注册的回调, 用于跨进程使缓存失效
+- supervisor 定期检查 worker, 崩溃后自动重启, 期间的事件留在该分片的管道中
+- 从数据库恢复的对局 (GameSessionStore.loadDeadlines) 按同样的规则分片, 离线超时的对局只由所属 worker 结算一次
+- 建表、补录离线消息、续发推送与插件预热只在 0 号 worker 中执行; 其他 worker 按需加载的轮询插件会重复轮询,
+  推送由 broadcaster / ddl提醒日志在数据库中去重
+- 每个 worker 有独立的发送队列, 全局发送限流 SEND_RATE_GLOBAL 按 worker 数平分;
+  每个群/私聊的限流不变 (同一目标的交互回复总在同一个 worker 中发送)
+- supervisor 的 /metrics 向各 worker 收集插件统计并汇总输出
+每个 worker 与 supervisor 之间使用两条单向管道而不是共享队列, worker 崩溃时不会遗留被占用的锁,
+重启后的 worker 继承同一条管道, 未读取的事件不会丢失.
+supervisor 向管道投递经过有界队列与每个 worker 一个的投递线程, worker 卡死或重启期间管道写满时
+只会阻塞该分片的投递线程, 队列满后丢弃该分片的新事件, 不影响接收事件的线程与其他分片
+使用 fork 启动 worker, 仅支持 Linux; 本模块在 supervisor 中运行, 不要在模块级导入插件或 utils.basicEvent
+"""
+WORKER_THREADS = 8 # 每个 worker 处理事件的线程数, 与 Flask threaded 模式相当
+WORKER_CHECK_INTERVAL = 1 # 检查 worker 存活的间隔(秒)
+WORKER_RESTART_BACKOFF = 5 # worker 启动后很快崩溃时, 重启前等待的秒数
+WORKER_MIN_UPTIME = 10
+WORKER_QUEUE_SIZE = 1000 # 每个 worker 待投递消息的上限
+WORKER_METRICS_TIMEOUT = 2 # /metrics 等待各 worker 回复的秒数
+
+_shard: Union[int, None] = None # 当前进程的分片号, None 表示单进程模式或 supervisor
+_shardCount = 1
+_busConn = None
+_busLock = Lock()
+_invalidateHandlers: Dict[str, List[Callable[[], None]]] = {}
+
+def currentShard()->Union[int, None]:
+    return _shard
+
+def ownsGroup(groupId: int)->bool:
+    """该群的事件是否由当前进程处理, 从数据库恢复群状态 (如对局超时结算) 时用于过滤其他分片的群"""
+    return _shard == None or shardOf({'group_id': groupId}, _shardCount) == _shard
+
+def onInvalidate(topic: str, handler: Callable[[], None])->None:
+    """注册缓存失效回调, 任意 worker 调用 invalidate(topic) 时在所有 worker 中执行"""
+    _invalidateHandlers.setdefault(topic, []).append(handler)
+
+def invalidate(topic: str)->None:
+    _runHandlers(topic)
+    if _busConn != None:
+        with _busLock:
+            _busConn.send(('invalidate', topic))
+
+def _runHandlers(topic: str)->None:
+    for handler in _invalidateHandlers.get(topic, []):
+        try:
+            handler()
+        except BaseException as e:
+            print('[workerPool] invalidate handler exception on {}: {}'.format(topic, e))
+
+def shardOf(data: dict, count: int)->int:
+    key = data.get('group_id', data.get('user_id', 0))
+    try:
+        return int(key) % count
+    except (TypeError, ValueError):
+        return 0
+
+def _workerMain(shard: int, count: int, events, bus)->None:
+    global _shard, _shardCount, _busConn
+    _shard, _shardCount, _busConn = shard, count, bus
+    import main
+    from utils.lazyPlugin import warmUpLazyPlugins
+    from utils.basicConfigs import SEND_RATE_GLOBAL
+    from utils.basicEvent import setGlobalSendRate
+    from utils.pluginMetrics import pluginMetrics
+    setGlobalSendRate(SEND_RATE_GLOBAL[0] / count, max(1, SEND_RATE_GLOBAL[1] / count))
+    if shard == 0:
+        main.initialize()
+        warmUpLazyPlugins(main.WARM_UP_ALL_PLUGINS)
+    executor = ThreadPoolExecutor(max_workers=WORKER_THREADS)
+    def dispatch(data: dict)->None:
+        try:
+            main.dispatchEvent(data)
+        except BaseException as e:
+            print('[workerPool] worker {} dispatch exception: {}'.format(shard, e))
+    while True:
+        kind, payload = events.recv()
+        if kind == 'event':
+            if main.ASYNC_DISPATCH:
+                main.asyncDispatcher.submit(payload)
+            else:
+                executor.submit(dispatch, payload)
+        elif kind == 'invalidate':
+            _runHandlers(payload)
+        elif kind == 'metrics':
+            with _busLock:
+                bus.send(('metrics', payload, pluginMetrics.exportState()))
+
+class WorkerSupervisor():
+    def __init__(self, count: int) -> None:
+        self.count = count
+        self.ctx = multiprocessing.get_context('fork')
+        # events[i]: supervisor -> worker i, bus[i]: worker i -> supervisor
+        self.events = [self.ctx.Pipe(duplex=False) for _ in range(count)]
+        self.bus = [self.ctx.Pipe(duplex=False) for _ in range(count)]
+        self.outbox = [queue.Queue(WORKER_QUEUE_SIZE) for _ in range(count)]
+        self.dropped = [0] * count
+        self.procs: List[Any] = [None] * count
+        self.startTimes = [0.0] * count
+        self.metricsCond = Condition()
+        self.metricsReplies: Dict[int, List[dict]] = {}
+        self.metricsCounter = itertools.count(1)
+
+    def startWorker(self, shard: int)->None:
+        proc = self.ctx.Process(target=_workerMain, args=(shard, self.count, self.events[shard][0], self.bus[shard][1]),
+                                name='worker-%d'%shard, daemon=True)
+        proc.start()
+        self.procs[shard] = proc
+        self.startTimes[shard] = time.time()
+
+    def _send(self, shard: int, message: tuple)->None:
+        """不阻塞调用方, 该分片积压超过 WORKER_QUEUE_SIZE 时丢弃"""
+        try:
+            self.outbox[shard].put_nowait(message)
+        except queue.Full:
+            self.dropped[shard] += 1
+            if self.dropped[shard] % 1000 == 1:
+                print('[workerPool] worker {} is not consuming, dropped {} messages'.format(shard, self.dropped[shard]))
+
+    def _feedLoop(self, shard: int)->None:
+        while True:
+            message = self.outbox[shard].get()
+            self.events[shard][1].send(message)
+
+    def put(self, data: dict)->None:
+        self._send(shardOf(data, self.count), ('event', data))
+
+    def _busLoop(self)->None:
+        readers = {self.bus[shard][0]: shard for shard in range(self.count)}
+        while True:
+            for conn in wait(list(readers.keys())):
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    continue
+                if message[0] == 'invalidate':
+                    for shard in range(self.count):
+                        if shard != readers[conn]:
+                            self._send(shard, message)
+                elif message[0] == 'metrics':
+                    with self.metricsCond:
+                        if message[1] in self.metricsReplies.keys():
+                            self.metricsReplies[message[1]].append(message[2])
+                            self.metricsCond.notify_all()
+
+    def collectMetrics(self)->str:
+        """汇总各 worker 的插件统计, 超时未回复的 worker 不计入"""
+        from utils.pluginMetrics import PluginMetrics
+        requestId = next(self.metricsCounter)
+        with self.metricsCond:
+            self.metricsReplies[requestId] = []
+        for shard in range(self.count):
+            self._send(shard, ('metrics', requestId))
+        with self.metricsCond:
+            self.metricsCond.wait_for(lambda: len(self.metricsReplies[requestId]) >= self.count, WORKER_METRICS_TIMEOUT)
+            states = self.metricsReplies.pop(requestId)
+        merged = PluginMetrics()
+        for state in states:
+            merged.mergeState(state)
+        return merged.renderPrometheus()
+
+    def _watchLoop(self)->None:
+        while True:
+            time.sleep(WORKER_CHECK_INTERVAL)
+            for shard, proc in enumerate(self.procs):
+                if proc.is_alive():
+                    continue
+                print('[workerPool] worker {} exited with code {}, restarting'.format(shard, proc.exitcode))
+                if time.time() - self.startTimes[shard] < WORKER_MIN_UPTIME:
+                    time.sleep(WORKER_RESTART_BACKOFF)
+                self.startWorker(shard)
+
+    def start(self)->None:
+        for shard in range(self.count):
+            self.startWorker(shard)
+            Thread(target=self._feedLoop, args=(shard, ), daemon=True).start()
+        Thread(target=self._busLoop, daemon=True).start()
+        Thread(target=self._watchLoop, daemon=True).start()
+
+def runSupervisor(count: int)->None:
+    """启动 count 个 worker, 并在当前进程中接收上报事件, 不会返回"""
+    from flask import Flask, request, Response
+    from utils.basicConfigs import CQ_TRANSPORT, WS_URL, WS_ACCESS_TOKEN, WS_API_TIMEOUT
+    supervisor = WorkerSupervisor(count)
+    supervisor.start()
+    if CQ_TRANSPORT == 'ws':
+        # worker 各自连接 go-cqhttp 调用 API, 但只有 supervisor 处理上报事件
+        from utils.cqTransport import createTransport
+        transport = createTransport(CQ_TRANSPORT, '', WS_URL, WS_ACCESS_TOKEN, WS_API_TIMEOUT)
+        transport.setEventHandler(supervisor.put)
+        transport.start()
+    app = Flask(__name__)
+    @app.route('/', methods=["POST"])
+    def post_data():
+        supervisor.put(request.get_json())
+        return "OK"
+    @app.route('/metrics', methods=["GET"])
+    def get_metrics():
+        return Response(supervisor.collectMetrics(), mimetype='text/plain; version=0.0.4')
+    app.run(host="127.0.0.1", port=5986)
+    sys.exit(0)